@@ -13,6 +13,7 @@ from __future__ import division, print_function, absolute_import
 import os
 import sys
 import time
+import functools
 
 from ligmos.workers import connSetup, workerSetup
 from ligmos.utils import amq, classes, common
@@ -20,6 +21,107 @@ from ligmos.utils import amq, classes, common
 from dataservants import iago
 
 
+# What listener to use for each listenertype
+listenerClasses = {'ldt': iago.listener_LDT.LDTConsumer,
+                   'omspdu': iago.listener_OMSPDU.OMSPDUConsumer,
+                   'lois': iago.listener_LOIS.LOISConsumer,
+                   'mesa': iago.listener_Mesa.MesaConsumer,
+                   'marshill': iago.listener_MarsHill.MHConsumer}
+
+
+def startListener(name, conSect, topics, comm, idbs, args, routes=None):
+    """
+    Set up the listener for one topic section (or slice of one) and
+    connect it to its broker; returns the broker connection.
+    """
+    print("%s:" % (name))
+    # This means it's a valid topic section so pull out the listener
+    #   type that we need as well as the broker connection
+    print("listenerType: %s" % (conSect.listenertype))
+    print("brokerReference: %s" % (conSect.broker))
+    print("databaseReference: %s" % (conSect.database))
+
+    # Every section writing to the same database shares its
+    #   buffer, each with its own table
+    try:
+        bw = iago.batchwriter.getWriter(idbs[conSect.database],
+                                        conSect.database,
+                                        maxbatch=args.batchSize,
+                                        maxage=args.batchAge,
+                                        maxqueue=args.batchQueue,
+                                        lines=not args.noLineProtocol)
+        dbref = bw.table(conSect.tablename)
+    except KeyError:
+        print("Database %s not in config :(" % (conSect.database))
+        dbref = None
+
+    if routes is None:
+        routes = {}
+
+    ltype = conSect.listenertype.lower()
+    if ltype in routes:
+        # Any listenertype with a [routes-*] section works, even
+        #   without its own class
+        lclass = listenerClasses.get(ltype,
+                                     iago.listener_general.RoutedConsumer)
+        # Messages are handled off of stomp's receiver thread
+        queue = iago.ingest.getQueue(name,
+                                     nworkers=args.workers,
+                                     maxsize=args.queueSize,
+                                     policy=args.overflow,
+                                     spooldir=args.spoolDir)
+        prlistener = lclass(dbconn=dbref, routes=routes.get(ltype),
+                            queue=queue)
+    else:
+        print("WARNING: Unknown or no listenertype specified!")
+        print("Using no databases and switching to Parrot listener!")
+        prlistener = amq.ParrotSubscriber()
+
+    bkr = connSetup.connAMQ_simple(comm[conSect.broker],
+                                   topics,
+                                   listener=prlistener)
+
+    return bkr
+
+
+def shardLoop(config, comm, args, runner, sections, starter, pid):
+    """
+    Run every topic section, split into --shardParts slices, in its own
+    supervised child process until told to stop.
+    """
+    sup = iago.shards.Supervisor()
+    nparts = max(1, args.shardParts)
+    for eachSection in sections:
+        conSect = config[eachSection]
+        for part in range(nparts):
+            topics = iago.shards.partitionTopics(conSect.topics, nparts, part)
+            if topics == []:
+                continue
+            name = eachSection
+            if nparts > 1:
+                name = "%s-%d" % (eachSection, part)
+            sup.add(name, iago.shards.runShard,
+                    (name, conSect, topics, comm, args, starter))
+
+    sup.startAll()
+    while runner.halt is False:
+        sup.check()
+        sup.printStats()
+
+        # Sleep in small chunks to check abort
+        for _ in range(100):
+            time.sleep(0.1)
+            if runner.halt is True:
+                break
+
+    print("PID %d is now out of here!" % (pid))
+    sup.stopAll()
+
+    sys.stdout = sys.__stdout__
+    sys.stderr = sys.__stderr__
+    print("STDOUT and STDERR reset.")
+
+
 def main():
     """
     """
@@ -54,55 +156,40 @@ def main():
     #   (helpful to find starts/restarts when scanning thru logs)
     common.printPreamble(pid, config)
 
-    # Check to see if there are any connections/objects to establish
-    idbs = connSetup.connIDB(comm)
+    # Which parser handles which topic, for each listenertype; built once
+    #   here from the defaults plus any [routes-*] sections in the config
+    routes = iago.routing.loadRoutes(conf)
+    starter = functools.partial(startListener, routes=routes)
+
+    # Get the schemas ready before any listeners (or shards) need them,
+    #   so forked shards share this copy too
+    iago.schemas.registry.cachefile = args.schemaCache
+    iago.schemas.registry.get()
+
+    # Likewise the fast decoders for the simple packets
+    iago.parser_general.validateEvery = args.validateEvery
+    iago.fastdecode.buildAll(iago.schemas.registry.get())
 
     # Specify our custom listener(s) that will really do all the work
     #   They should be specified in a set of "topic-*" sections in the
     #   config file to define different listeners, to spread the load
-    topicTypes = {}
+    sections = [each for each in config.keys()
+                if each.lower().startswith("topic") is True]
+
+    if args.shard is True:
+        # Each section (or slice of one) in its own process; all we do
+        #   here is keep an eye on them
+        shardLoop(config, comm, args, runner, sections, starter, pid)
+        return
+
+    # Check to see if there are any connections/objects to establish
+    idbs = connSetup.connIDB(comm)
+
     brokerConns = {}
-    for eachSection in config.keys():
-        if eachSection.lower().startswith("topic") is True:
-            print("%s:" % (eachSection))
-            # This means it's a valid topic section so pull out the listener
-            #   type that we need as well as the broker connection
-            conSect = config[eachSection]
-
-            print("listenerType: %s" % (conSect.listenertype))
-            print("brokerReference: %s" % (conSect.broker))
-            print("databaseReference: %s" % (conSect.database))
-
-            try:
-                dbref = idbs[conSect.database]
-                dbref.tablename = conSect.tablename
-            except KeyError:
-                print("Database %s not in config :(" % (conSect.database))
-                dbref = None
-
-            # I admit in retrospect that this sucks
-            if conSect.listenertype.lower() == "ldt":
-                prlistener = iago.listener_LDT.LDTConsumer(dbconn=dbref)
-            elif conSect.listenertype.lower() == "omspdu":
-                prlistener = iago.listener_OMSPDU.OMSPDUConsumer(dbconn=dbref)
-            elif conSect.listenertype.lower() == "lois":
-                prlistener = iago.listener_LOIS.LOISConsumer(dbconn=dbref)
-            elif conSect.listenertype.lower() == "mesa":
-                prlistener = iago.listener_Mesa.MesaConsumer(dbconn=dbref)
-            elif conSect.listenertype.lower() == "marshill":
-                prlistener = iago.listener_MarsHill.MHConsumer(dbconn=dbref)
-            else:
-                print("WARNING: Unknown or no listenertype specified!")
-                print("Using no databases and switching to Parrot listener!")
-                prdb = None
-                prlistener = amq.ParrotSubscriber()
-
-            topicTypes.update({eachSection: [conSect, prlistener]})
-
-            bkr = connSetup.connAMQ_simple(comm[conSect.broker],
-                                           conSect.topics,
-                                           listener=prlistener)
-            brokerConns.update({eachSection: bkr})
+    for eachSection in sections:
+        conSect = config[eachSection]
+        bkr = starter(eachSection, conSect, conSect.topics, comm, idbs, args)
+        brokerConns.update({eachSection: bkr})
 
     # allTopics = amq.getAllTopics(config, comm)
 
@@ -116,7 +203,10 @@ def main():
 
         # There really isn't anything to actually *do* in here;
         #   all the real work happens in the listener, so we really
-        #   just spin our wheels here.
+        #   just spin our wheels here and say how the queues and
+        #   the writes are going.
+        iago.ingest.printStats()
+        iago.batchwriter.printStats()
 
         # Consider taking a big nap
         if runner.halt is False:
@@ -134,6 +224,11 @@ def main():
     for each in brokerConns:
         brokerConns[each][0].disconnect()
 
+    # Finish what's already been received, then write out anything
+    #   that's still waiting
+    iago.ingest.closeAll()
+    iago.batchwriter.closeAll()
+
     # The PID file will have already been either deleted/overwritten by
     #   another function/process by this point, so just give back the
     #   console and return STDOUT and STDERR to their system defaults
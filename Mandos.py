@@ -20,13 +20,13 @@ import sys
 import time
 
 from dataservants import mandos
-from dataservants import yvette
 from dataservants import wadsworth
+from dataservants import yvette
 from ligmos.workers import workerSetup
 from ligmos.utils import classes, common
 
 
-def defineActions():
+def defineActions(plan=False):
     """
     """
     # Renaming import to keep line length sensible
@@ -46,7 +46,13 @@ def defineActions():
                                      args=[],
                                      kwargs={})
 
-    act2 = common.processDescription(func=mandos.tasks.cleanRemote,
+    # With --plan, only work out what cleanRemote would have done
+    if plan is True:
+        judge = mandos.tasks.planCleanup
+    else:
+        judge = mandos.tasks.cleanRemote
+
+    act2 = common.processDescription(func=judge,
                                      name='CleanOldData',
                                      timedelay=3.,
                                      maxtime=600,
@@ -88,8 +94,8 @@ def main():
     passes = './config/passwords.conf'
     logfile = '/tmp/mandos.log'
     desc = 'Mandos: The Judge of Data'
-    # Not a typo! Underscoring that Mandos and Wadsworth are connected
-    eargs = wadsworth.parseargs.extraArguments
+    # Mandos' extra arguments build on Wadsworth's; they're connected!
+    eargs = mandos.parseargs.extraArguments
     conftype = classes.dataTarget
 
     # Note: We need to prepend the PATH setting here because some hosts
@@ -138,7 +144,7 @@ def main():
 
     # Actually define the function calls/references to functions
     print("Defining all base functions for each instrument...")
-    actions = defineActions()
+    actions = defineActions(plan=args.plan)
 
     # Semi-infinite loop
     while runner.halt is False:
@@ -146,11 +152,26 @@ def main():
         #   looping over each instrument.  We keep the main while
         #   loop out here, though, so we can do stuff with the
         #   results of the actions from all the instruments.
-        _ = common.instLooper(config, runner, args,
-                                actions, updateArguments,
-                                baseYcmd,
-                                db=None,
-                                alarmtime=alarmtime)
+        if args.hostWorkers > 1 and args.plan is False:
+            # Each host gets its own worker (and SSH session) so the slow
+            #   ones don't hold up the rest; one summary at the end
+            summary = mandos.hostpool.checkAllHosts(config, args,
+                                                    defineActions,
+                                                    updateArguments,
+                                                    baseYcmd, alarmtime,
+                                                    nworkers=args.hostWorkers)
+            mandos.hostpool.printSummary(summary)
+        else:
+            _ = common.instLooper(config, runner, args,
+                                  actions, updateArguments,
+                                  baseYcmd,
+                                  db=None,
+                                  alarmtime=alarmtime)
+
+        # One pass is all a plan needs
+        if args.plan is True:
+            wadsworth.planner.printTimeline(budget=args.verifyBudget)
+            break
 
         # After all the instruments are done, take a big nap
         if runner.halt is False:
@@ -162,6 +183,7 @@ def main():
                     break
 
     # The above loop is exited when someone sends wadsworth.py SIGTERM
+    mandos.hostpool.stopWorkers()
     print("PID %d is now out of here!" % (pid))
 
     # The PID file will have already been either deleted/overwritten by
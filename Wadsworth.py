@@ -17,10 +17,10 @@ import time
 from dataservants import yvette
 from dataservants import wadsworth
 from ligmos.utils import classes, common
-from ligmos.workers import workerSetup
+from ligmos.workers import connSetup, workerSetup
 
 
-def defineActions():
+def defineActions(plan=False):
     """
     """
     # Renaming import to keep line length sensible
@@ -40,7 +40,13 @@ def defineActions():
                                      args=[],
                                      kwargs={})
 
-    act2 = common.processDescription(func=wadsworth.tasks.buttleData,
+    # With --plan, only work out what buttleData would have done
+    if plan is True:
+        butler = wadsworth.tasks.planTransfers
+    else:
+        butler = wadsworth.tasks.buttleData
+
+    act2 = common.processDescription(func=butler,
                                      name='ButtleData',
                                      timedelay=3.,
                                      maxtime=600,
@@ -65,7 +71,7 @@ def updateArguments(actions, iobj, args, baseYcmd, db=None):
 
     # act2 == buttleData
     actions[1].args = [baseYcmd, args, iobj]
-    actions[1].kwargs = {}
+    actions[1].kwargs = {'db': db}
 
     return actions
 
@@ -120,6 +126,10 @@ def main():
     #   (helpful to find starts/restarts when scanning thru logs)
     common.printPreamble(pid, config)
 
+    # Check to see if there are any connections/objects to establish;
+    #   this is where the transfer telemetry will end up
+    idbs = connSetup.connIDB(comm)
+
     # Set up the desired actions in the main loop, using a helpful class
     #   to pass things to each function/process more clearly
     #   Note that we can update things per-instrument when inside the loop
@@ -127,7 +137,11 @@ def main():
 
     # Actually define the function calls/references to functions
     print("Defining all base functions for each instrument...")
-    actions = defineActions()
+    actions = defineActions(plan=args.plan)
+
+    # Nothing gets written anywhere when we're only planning
+    if args.plan is True:
+        idbs = None
 
     # Semi-infinite loop
     while runner.halt is False:
@@ -138,9 +152,14 @@ def main():
         _ = common.instLooper(config, runner, args,
                               actions, updateArguments,
                               baseYcmd,
-                              db=None,
+                              db=idbs,
                               alarmtime=alarmtime)
 
+        # One pass is all a plan needs
+        if args.plan is True:
+            wadsworth.planner.printTimeline(budget=args.budget)
+            break
+
         # After all the instruments are done, take a big nap
         if runner.halt is False:
             print("Starting a big sleep")
@@ -1,3 +1,4 @@
+from . import listener_general
 from . import listener_LDT
 from . import listener_LOIS
 from . import listener_Mesa
@@ -5,8 +6,15 @@ from . import listener_OMSPDU
 from . import listener_MarsHill
 
 from . import parseargs
+from . import routing
+from . import schemas
+from . import ingest
+from . import shards
+from . import batchwriter
+from . import lineprotocol
 
 from . import parser_LDT
 from . import parser_LOIS
 from . import parser_OMSPDU
-from . import parser_general
\ No newline at end of file
+from . import parser_general
+from . import fastdecode
\ No newline at end of file
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Buffered, batched InfluxDB writes for Iago's listeners.
+
+Every parser used to call db.singleCommit(packet, close=True) for every
+single message, which means a new connection, one tiny HTTP write and a
+disconnect each time; at the rate some of the LDT status topics come in
+that's most of what Iago spends its time doing. Instead, each database
+gets one :class:`BatchWriter` that collects the packets (per table and
+time precision, since those are per-write settings) and a thread that
+writes them in bulk whenever enough of them pile up or the oldest one has
+waited long enough, without closing the connection in between.
+
+The listeners are handed a :class:`BufferedTable` in place of the database
+object. It has the same tablename attribute and singleCommit() call that
+the parsers already use, so none of them need to change. Parsers that can
+also hand over ready-made line protocol (see
+:mod:`dataservants.iago.lineprotocol`) with commitLines(), and those lines
+are posted to the database as-is, without any packet dicts in between.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import time
+import threading
+from collections import OrderedDict, deque
+
+from . import lineprotocol
+
+# What's in a buffer; packet dicts for singleCommit, or line protocol
+POINTS = 'points'
+LINES = 'lines'
+
+
+class BufferedTable():
+    """
+    Stand-in for a database object, pointed at one table, that hands its
+    packets to a :class:`BatchWriter` instead of writing them right away.
+    """
+    def __init__(self, writer, tablename):
+        self.writer = writer
+        self.tablename = tablename
+
+    def singleCommit(self, packet, table=None, close=True, timeprec='s'):
+        """
+        Same call as the real thing; close is ignored, since the whole
+        point is to keep the connection around.
+        """
+        if table is None:
+            table = self.tablename
+
+        self.writer.add(packet, table, timeprec=timeprec)
+
+    @property
+    def lines(self):
+        """
+        Whether commitLines() can be used instead of singleCommit().
+        """
+        return self.writer.sender is not None
+
+    def commitLines(self, lines, table=None, timeprec='s'):
+        """
+        Like singleCommit, but for lines of line protocol.
+        """
+        if table is None:
+            table = self.tablename
+
+        self.writer.addLines(lines, table, timeprec=timeprec)
+
+
+class BatchWriter():
+    """
+    Write buffer and flush thread for a single database connection.
+    """
+    def __init__(self, dbconn, name=None, maxbatch=500, maxage=1.,
+                 maxqueue=50000, lines=True):
+        self.dbconn = dbconn
+        # For writing line protocol straight to the database
+        self.sender = None
+        if lines is True:
+            self.sender = lineprotocol.senderFor(dbconn)
+        self.name = name
+        # Flush once this many packets are waiting...
+        self.maxbatch = maxbatch
+        # ...or once the oldest has waited this long (seconds)
+        self.maxage = maxage
+        # Beyond this many waiting packets, the oldest are dropped
+        self.maxqueue = maxqueue
+
+        # (table, timeprec, POINTS or LINES): deque of packets or lines
+        self.buffers = OrderedDict()
+        # (table, timeprec, kind): time the oldest waiting one arrived
+        self.oldest = {}
+        self.lock = threading.Condition()
+        self.halt = False
+
+        self.metrics = {'queued': 0, 'written': 0, 'dropped': 0,
+                        'rejected': 0, 'flushes': 0, 'failures': 0,
+                        'maxdepth': 0,
+                        'lastflush': None, 'lastlatency': None}
+
+        self.thread = threading.Thread(target=self.flusher, daemon=True)
+        self.thread.start()
+
+    def table(self, tablename):
+        """
+        A database stand-in for the listeners, pointed at the given table.
+        """
+        return BufferedTable(self, tablename)
+
+    def depth(self):
+        """
+        Number of packets currently waiting to be written.
+        """
+        return sum([len(self.buffers[key]) for key in self.buffers])
+
+    def add(self, packet, table, timeprec='s'):
+        """
+        Queue up a packet (or list of packets, as from makeInfluxPacket).
+        Points without a time get stamped now (to the nanosecond, so fast
+        topics don't collapse onto one point per second), rather than
+        whenever the batch they end up in is finally written.
+        """
+        if isinstance(packet, dict):
+            packet = [packet]
+
+        stamped = []
+        given = []
+        for each in packet:
+            if isinstance(each, dict) and each.get('time', None) is None:
+                each['time'] = time.time_ns()
+                stamped.append(each)
+            else:
+                given.append(each)
+
+        if given != []:
+            self.enqueue((table, timeprec, POINTS), given)
+        if stamped != []:
+            self.enqueue((table, 'n', POINTS), stamped)
+
+    def addLines(self, lines, table, timeprec='s'):
+        """
+        Queue up lines of line protocol.
+        """
+        self.enqueue((table, timeprec, LINES), lines)
+
+    def enqueue(self, key, packet):
+        """
+        """
+        with self.lock:
+            if key not in self.buffers:
+                self.buffers[key] = deque()
+            if len(self.buffers[key]) == 0:
+                self.oldest[key] = time.time()
+            self.buffers[key].extend(packet)
+            self.metrics['queued'] += len(packet)
+
+            # Don't let an unreachable database eat all the memory; the
+            #   oldest data goes first, whichever buffer it's in
+            depth = self.depth()
+            while depth > self.maxqueue:
+                waiting = [each for each in self.buffers
+                           if len(self.buffers[each]) > 0]
+                victim = min(waiting, key=lambda k: self.oldest[k])
+                buf = self.buffers[victim]
+                ndrop = min(depth - self.maxqueue, len(buf))
+                for _ in range(ndrop):
+                    buf.popleft()
+                self.metrics['dropped'] += ndrop
+                depth -= ndrop
+                if len(buf) > 0:
+                    # Close enough; what's left arrived after this
+                    self.oldest[victim] = time.time()
+            self.metrics['maxdepth'] = max(self.metrics['maxdepth'], depth)
+
+            if len(self.buffers[key]) >= self.maxbatch:
+                self.lock.notify()
+
+    def due(self, now):
+        """
+        Keys of the buffers that should be written now.
+        """
+        ready = []
+        for key in self.buffers:
+            nwaiting = len(self.buffers[key])
+            if nwaiting == 0:
+                continue
+            if self.halt is True or nwaiting >= self.maxbatch or \
+               now - self.oldest[key] >= self.maxage:
+                ready.append(key)
+
+        return ready
+
+    def flusher(self):
+        """
+        Thread that writes out the buffers whenever they're due.
+        """
+        while True:
+            with self.lock:
+                ready = self.due(time.time())
+                while ready == [] and self.halt is False:
+                    self.lock.wait(timeout=self.maxage/4.)
+                    ready = self.due(time.time())
+                if ready == [] and self.halt is True:
+                    break
+
+                batches = []
+                for key in ready:
+                    batch = list(self.buffers[key])
+                    self.buffers[key].clear()
+                    batches.append((key, batch, self.oldest[key]))
+
+            for key, batch, since in batches:
+                good = self.write(key, batch, since)
+                if good is False and self.halt is True:
+                    # No point retrying forever on the way out
+                    print("--> Giving up on %d packets for %s" %
+                          (self.depth(), self.name))
+                    return
+
+        self.closeConnection()
+
+    def send(self, key, batch):
+        """
+        Write packets or lines over the (kept open) connection.
+        """
+        table, timeprec, kind = key
+        if kind == LINES:
+            self.sender.write(batch, table, timeprec=timeprec)
+        else:
+            self.dbconn.singleCommit(batch, table=table, close=False,
+                                     timeprec=timeprec)
+
+    def sendSplitting(self, key, batch):
+        """
+        Send a batch, splitting up any the database refuses (a 400 or
+        413; see :func:`dataservants.iago.lineprotocol.rejected`) to find
+        just the packets at fault and drop them, since sending them again
+        won't help.
+
+        Returns:
+            left (:obj:`list`)
+                Packets that couldn't be sent for any other reason, in
+                their original order.
+            nrejected (:obj:`int`)
+                Number of packets dropped as refused.
+            err (:obj:`Exception`)
+                Why the leftovers couldn't be sent, or None.
+        """
+        try:
+            self.send(key, batch)
+            return [], 0, None
+        except Exception as err:
+            if lineprotocol.rejected(err) is False:
+                return batch, 0, err
+            elif len(batch) == 1:
+                print("--> %s refused a packet: %s" % (key[0], str(err)))
+                print(batch[0])
+                return [], 1, None
+
+        half = len(batch)//2
+        left, nrej, err = self.sendSplitting(key, batch[:half])
+        if left != []:
+            # Database went away partway through; keep the order
+            return left + batch[half:], nrej, err
+        left, nrej2, err = self.sendSplitting(key, batch[half:])
+
+        return left, nrej + nrej2, err
+
+    def write(self, key, batch, since):
+        """
+        Write one batch over the (kept open) connection. Packets the
+        database refused are dropped (see :meth:`sendSplitting`); if it
+        couldn't be reached, turned us away (401, 403, 404) or had a
+        problem of its own (a 5xx), the packets go back on the front of
+        the queue to try again.
+        """
+        table = key[0]
+        left, nrejected, err = self.sendSplitting(key, batch)
+        nwritten = len(batch) - len(left) - nrejected
+
+        with self.lock:
+            self.metrics['rejected'] += nrejected
+            if nwritten > 0:
+                self.metrics['written'] += nwritten
+                self.metrics['flushes'] += 1
+                self.metrics['lastflush'] = time.time()
+                self.metrics['lastlatency'] = time.time() - since
+
+        if left != []:
+            print("--> Batch write of %d packets to %s failed: %s" %
+                  (len(left), table, str(err)))
+            # Start fresh next time, in case the connection went stale
+            self.closeConnection()
+            with self.lock:
+                self.metrics['failures'] += 1
+                self.buffers[key].extendleft(reversed(left))
+                self.oldest[key] = since
+            if self.halt is False:
+                # Don't hammer a database that's down
+                time.sleep(min(5., self.maxage))
+            return False
+
+        return True
+
+    def closeConnection(self):
+        """
+        """
+        if self.sender is not None:
+            self.sender.close()
+        closer = getattr(self.dbconn, 'closeDB', None)
+        if closer is not None:
+            try:
+                closer()
+            except Exception:
+                pass
+
+    def stats(self):
+        """
+        Snapshot of the queue depth and write counters.
+        """
+        with self.lock:
+            stats = dict(self.metrics)
+            stats['depth'] = self.depth()
+
+        return stats
+
+    def close(self, timeout=10.):
+        """
+        Write out whatever's left and stop the flush thread. Packets that
+        still can't be written by the timeout are lost.
+        """
+        with self.lock:
+            self.halt = True
+            self.lock.notify()
+        self.thread.join(timeout=timeout)
+
+
+# One writer per database, shared by every listener that uses it
+writers = OrderedDict()
+
+
+def getWriter(dbconn, name, maxbatch=500, maxage=1., maxqueue=50000,
+              lines=True):
+    """
+    The shared writer for a database, made on first use.
+    """
+    if name not in writers:
+        writers[name] = BatchWriter(dbconn, name=name, maxbatch=maxbatch,
+                                    maxage=maxage, maxqueue=maxqueue,
+                                    lines=lines)
+
+    return writers[name]
+
+
+def printStats():
+    """
+    Print the queue depth and counters of every writer.
+    """
+    for name in writers:
+        stats = writers[name].stats()
+        print("%s: %d waiting (max %d), %d written in %d flushes, "
+              "%d dropped, %d refused, %d failed writes" %
+              (name, stats['depth'], stats['maxdepth'], stats['written'],
+               stats['flushes'], stats['dropped'], stats['rejected'],
+               stats['failures']))
+
+
+def closeAll(timeout=10.):
+    """
+    Flush and stop every writer.
+    """
+    for name in writers:
+        writers[name].close(timeout=timeout)
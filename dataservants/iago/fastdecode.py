@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Fast decoders for the simple, flat packet schemas.
+
+Most of the packets Iago sees (AOSDataPacket, WRSDataPacket, the
+loisTelemetry ones...) are a fixed set of elements, each holding one
+number or string, and putting every single one of them through xmlschema's
+full validation and to_dict is most of the work Iago does. So for each
+schema version that's simple enough, a :class:`FastDecoder` is made ahead
+of time. It holds a nested map of element tag to either its (already
+flattened) field name and a type converter, or the map of its children,
+and decoding is just one walk of the element tree with that.
+
+Anything the decoders don't understand (attributes, repeated or wildcard
+elements, mixed content, list or union types) means no fast decoder for
+that schema version, and xmlschema does it the usual way. Any message that
+doesn't exactly fit raises :class:`FastDecodeError`, so the caller can do
+the same. See :func:`dataservants.iago.parser_general.decodePacket` for how
+a sample of messages still goes through full validation.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+from collections import OrderedDict
+
+
+xsdNS = "{http://www.w3.org/2001/XMLSchema}"
+
+# Deeper than this and it's surely not a flat packet
+maxDepth = 16
+
+
+class FastDecodeError(Exception):
+    """
+    The message (or schema) doesn't fit what the fast decoder can do.
+    """
+    pass
+
+
+def toBool(text):
+    """
+    """
+    try:
+        return {'true': True, '1': True,
+                'false': False, '0': False}[text.strip()]
+    except KeyError:
+        raise ValueError("Not an xs:boolean: %s" % (text))
+
+
+def toToken(text):
+    """
+    Whitespace collapsed, like xs:token and friends.
+    """
+    return " ".join(text.split())
+
+
+# Local names of the XSD builtins, and what to turn them into.  Decimals
+#   are floats here since that's what Iago asks xmlschema for too.
+converters = {'float': float, 'double': float, 'decimal': float,
+              'boolean': toBool, 'string': str}
+for each in ['integer', 'int', 'long', 'short', 'byte',
+             'nonNegativeInteger', 'nonPositiveInteger',
+             'positiveInteger', 'negativeInteger',
+             'unsignedLong', 'unsignedInt', 'unsignedShort',
+             'unsignedByte']:
+    converters[each] = int
+
+
+def builtinName(xtype):
+    """
+    Local name of the XSD builtin type that a simple type derives from.
+    """
+    depth = 0
+    while xtype is not None and depth < maxDepth:
+        if xtype.is_list() or xtype.is_union():
+            raise FastDecodeError("List and union types aren't supported")
+        name = getattr(xtype, 'name', None)
+        if name is not None and name.startswith(xsdNS):
+            return name[len(xsdNS):]
+        xtype = getattr(xtype, 'base_type', None)
+        depth += 1
+
+    raise FastDecodeError("Couldn't find a builtin type")
+
+
+def converterFor(xtype):
+    """
+    Converter function for a simple type's text.
+    """
+    return converters.get(builtinName(xtype), toToken)
+
+
+def buildPlan(elem, prefix, depth=0):
+    """
+    The nested map for the children of a complex element; each child tag
+    maps to [fieldname, converter, required] or [subplan, required].
+    """
+    if depth > maxDepth:
+        raise FastDecodeError("Schema is too deep")
+
+    xtype = elem.type
+    if len(getattr(elem, 'attributes', [])) > 0 or \
+       len(getattr(xtype, 'attributes', [])) > 0:
+        raise FastDecodeError("Attributes aren't supported")
+    if xtype.is_simple() or xtype.has_simple_content():
+        raise FastDecodeError("Expected complex content")
+    if getattr(xtype, 'mixed', False) is True:
+        raise FastDecodeError("Mixed content isn't supported")
+
+    group = xtype.content
+    # Anything but a plain sequence (or all) of elements and we can't
+    #   say which children have to be there, so don't insist on any
+    strict = group.model in ['sequence', 'all'] and \
+        all([not hasattr(item, 'model') for item in group])
+
+    plan = OrderedDict()
+    for child in group.iter_elements():
+        if not hasattr(child, 'type'):
+            raise FastDecodeError("Wildcard elements aren't supported")
+        if child.max_occurs != 1:
+            raise FastDecodeError("Repeated elements aren't supported")
+
+        # Same key names that to_dict + flatten would end up with
+        key = child.prefixed_name
+        if prefix != '':
+            key = "%s_%s" % (prefix, key)
+        required = strict and child.min_occurs > 0
+
+        if child.type.is_simple():
+            plan[child.name] = [key, converterFor(child.type), required]
+        else:
+            plan[child.name] = [buildPlan(child, key, depth=depth+1),
+                                required]
+
+    return plan
+
+
+class FastDecoder():
+    """
+    Decoder for the elements of one schema version.
+    """
+    def __init__(self, schema):
+        # Root element tag: plan for its children
+        self.roots = {}
+        for name in schema.elements:
+            elem = schema.elements[name]
+            self.roots[elem.name] = buildPlan(elem, '')
+
+    def walk(self, node, plan, fields):
+        """
+        """
+        seen = 0
+        for child in node:
+            try:
+                entry = plan[child.tag]
+            except KeyError:
+                raise FastDecodeError("Unexpected element %s" % (child.tag))
+            seen += 1
+
+            if len(entry) == 3:
+                key, conv, _ = entry
+                if len(child) > 0:
+                    raise FastDecodeError("Unexpected children in %s" %
+                                          (child.tag))
+                text = child.text
+                if text is None:
+                    if conv is not str:
+                        raise FastDecodeError("Empty element %s" %
+                                              (child.tag))
+                    fields[key] = None
+                else:
+                    try:
+                        fields[key] = conv(text)
+                    except ValueError as err:
+                        raise FastDecodeError(str(err))
+            else:
+                self.walk(child, entry[0], fields)
+
+        # Cheap check first; only look closer if something's missing
+        if seen < len(plan):
+            present = set([child.tag for child in node])
+            for tag in plan:
+                if plan[tag][-1] is True and tag not in present:
+                    raise FastDecodeError("Missing element %s" % (tag))
+
+    def decode(self, root):
+        """
+        Flattened fields of a message, given its root element.
+        """
+        try:
+            plan = self.roots[root.tag]
+        except KeyError:
+            raise FastDecodeError("Unexpected root element %s" % (root.tag))
+
+        fields = {}
+        self.walk(root, plan, fields)
+
+        return fields
+
+
+# id() of a schema version: its FastDecoder, or None if it can't have one
+decoders = {}
+
+
+def decoderFor(schema):
+    """
+    The fast decoder for a schema version (made now if need be), or None.
+    """
+    key = id(schema)
+    try:
+        return decoders[key]
+    except KeyError:
+        pass
+
+    try:
+        decoders[key] = FastDecoder(schema)
+    except FastDecodeError as err:
+        print("No fast decoder for %s: %s" %
+              (getattr(schema, 'url', schema), str(err)))
+        decoders[key] = None
+    except Exception as err:
+        # Something about the schema object itself we didn't expect
+        print("No fast decoder for %s: %s" %
+              (getattr(schema, 'url', schema), repr(err)))
+        decoders[key] = None
+
+    return decoders[key]
+
+
+def disable(schema):
+    """
+    Stop using the fast decoder for a schema version.
+    """
+    decoders[id(schema)] = None
+
+
+def buildAll(schemas):
+    """
+    Make the fast decoders for every schema version up front.
+    """
+    nfast = 0
+    ntotal = 0
+    for topic in schemas:
+        versions = schemas[topic]
+        if not isinstance(versions, dict):
+            versions = {None: versions}
+        for ver in versions:
+            ntotal += 1
+            if decoderFor(versions[ver]) is not None:
+                nfast += 1
+
+    print("Fast decoders for %d of %d schema versions" % (nfast, ntotal))
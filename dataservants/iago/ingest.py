@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Bounded queue and worker threads between the broker and the parsers.
+
+stomp.py calls on_message on its receiver thread, so any time spent
+parsing, validating or writing a message is time the broker connection
+isn't being read, and the broker ends up buffering (or dropping) for us.
+Instead, on_message just puts the message in an :class:`IngestQueue` and
+a few worker threads do the real work.
+
+When the queue is full, what happens depends on the overflow policy:
+
+    block
+        on_message waits for room, so the broker is told to slow down
+    drop-oldest
+        the oldest waiting message is thrown away to make room
+    spill
+        messages go to a spool file on disk and are read back (in order)
+        once there's room again; anything left over at exit is picked up
+        the next time Iago starts
+
+Either way a message can sit a while before it's handled, so on_message
+stamps it with when it arrived (see :func:`stampArrival`) and that's the
+time it's stored with, not whenever a worker finally got to it.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import time
+import pickle
+import threading
+from collections import OrderedDict, deque
+
+from ligmos import utils
+
+
+policies = ['block', 'drop-oldest', 'spill']
+
+# Header that on_message adds with the arrival time (integer ns)
+receivedKey = 'iago-received-ns'
+
+
+def stampArrival(headers):
+    """
+    Copy of the headers with the arrival time added, so it goes through
+    the queue (and the spool) along with the message. This is our own
+    clock rather than the broker's 'timestamp' header, which is only to
+    the millisecond and comes from whatever clock the sender has.
+    """
+    headers = dict(headers)
+    headers.setdefault(receivedKey, time.time_ns())
+
+    return headers
+
+
+def receivedAt(headers):
+    """
+    When a message arrived (integer ns), or None if it was never stamped.
+    """
+    try:
+        return int(headers[receivedKey])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class IngestQueue():
+    """
+    Messages waiting to be handled, and the threads that handle them.
+    """
+    def __init__(self, name, nworkers=2, maxsize=10000, policy='block',
+                 spooldir=None):
+        if policy not in policies:
+            raise ValueError("Unknown overflow policy %s" % (policy))
+
+        self.name = name
+        self.nworkers = max(1, nworkers)
+        self.maxsize = maxsize
+        self.policy = policy
+
+        self.queue = deque()
+        self.lock = threading.Condition()
+        self.halt = False
+        self.handler = None
+        self.threads = []
+
+        self.spoolfile = None
+        self.spoolpos = 0
+        # True while there's anything in the spool not yet read back
+        self.spooling = False
+        if policy == 'spill':
+            if spooldir is None:
+                spooldir = "/tmp/"
+            utils.files.checkDir(spooldir)
+            self.spoolfile = os.path.join(spooldir, "%s.spool" % (name))
+            # Leftovers from last time
+            if os.path.exists(self.spoolfile) is True:
+                self.spooling = os.path.getsize(self.spoolfile) > 0
+
+        self.metrics = {'queued': 0, 'handled': 0, 'dropped': 0,
+                        'spilled': 0, 'failures': 0, 'maxdepth': 0}
+
+    def start(self, handler):
+        """
+        Start the workers, each calling handler(headers, body).
+        """
+        self.handler = handler
+        for i in range(self.nworkers):
+            thd = threading.Thread(target=self.worker, daemon=True,
+                                   name="%s-%d" % (self.name, i))
+            thd.start()
+            self.threads.append(thd)
+
+    def spill(self, headers, body):
+        """
+        Append a message to the spool file.
+        """
+        with open(self.spoolfile, 'ab') as spf:
+            pickle.dump((headers, body), spf,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        self.metrics['spilled'] += 1
+        self.spooling = True
+
+    def unspill(self):
+        """
+        Move messages from the spool file back into the queue, as many as
+        there's room for.  Once it's all been read the file starts over.
+        """
+        try:
+            spf = open(self.spoolfile, 'rb')
+        except OSError as err:
+            print("Lost the spool file %s: %s" % (self.spoolfile, str(err)))
+            self.spoolpos = 0
+            self.spooling = False
+            return
+
+        with spf:
+            spf.seek(self.spoolpos)
+            while len(self.queue) < self.maxsize:
+                try:
+                    self.queue.append(pickle.load(spf))
+                except EOFError:
+                    break
+                except pickle.UnpicklingError as err:
+                    # Probably a partial write at a crash; nothing
+                    #   after it can be trusted either
+                    print("Corrupt spool file %s: %s" %
+                          (self.spoolfile, str(err)))
+                    spf.seek(0, os.SEEK_END)
+                    break
+            self.spoolpos = spf.tell()
+            finished = self.spoolpos >= os.fstat(spf.fileno()).st_size
+
+        if finished is True:
+            os.remove(self.spoolfile)
+            self.spoolpos = 0
+            self.spooling = False
+
+    def put(self, headers, body):
+        """
+        Add a message to the queue, following the overflow policy if
+        it's full.
+        """
+        with self.lock:
+            self.metrics['queued'] += 1
+            if self.policy == 'spill':
+                # Once anything is spilled, everything goes through the
+                #   spool until it's caught up so the order is kept
+                if len(self.queue) >= self.maxsize or \
+                   self.spooling is True:
+                    self.spill(headers, body)
+                    self.lock.notify()
+                    return
+            elif self.policy == 'drop-oldest':
+                while len(self.queue) >= self.maxsize:
+                    self.queue.popleft()
+                    self.metrics['dropped'] += 1
+            else:
+                while len(self.queue) >= self.maxsize and \
+                      self.halt is False:
+                    self.lock.wait(timeout=1.)
+
+            self.queue.append((headers, body))
+            self.metrics['maxdepth'] = max(self.metrics['maxdepth'],
+                                           len(self.queue))
+            self.lock.notify()
+
+    def get(self):
+        """
+        Next message to handle, or None once we're stopping and there's
+        nothing left.
+        """
+        with self.lock:
+            while len(self.queue) == 0:
+                # Don't bother replaying the spool on the way out
+                if self.halt is True:
+                    return None
+                if self.spooling is True:
+                    self.unspill()
+                    continue
+                self.lock.wait(timeout=1.)
+
+            msg = self.queue.popleft()
+            if len(self.queue) < self.maxsize//2 and \
+               self.spooling is True and self.halt is False:
+                self.unspill()
+            # Let anyone blocked in put() know there's room
+            self.lock.notify_all()
+
+        return msg
+
+    def worker(self):
+        """
+        Thread that handles messages until told to stop.
+        """
+        while True:
+            msg = self.get()
+            if msg is None:
+                break
+
+            try:
+                self.handler(*msg)
+                good = True
+            except Exception as err:
+                # The handlers catch their own errors, so this is mostly
+                #   just to keep the thread alive no matter what
+                print("Unhandled error in %s: %s" % (self.name, str(err)))
+                good = False
+
+            with self.lock:
+                self.metrics['handled'] += 1
+                if good is False:
+                    self.metrics['failures'] += 1
+
+    def stats(self):
+        """
+        Snapshot of the queue depth and counters.
+        """
+        with self.lock:
+            stats = dict(self.metrics)
+            stats['depth'] = len(self.queue)
+            stats['spoolpending'] = self.spooling
+
+        return stats
+
+    def close(self, timeout=10.):
+        """
+        Stop the workers once they've handled what's in memory.  With the
+        spill policy, the rest stays in the spool file for next time.
+        """
+        with self.lock:
+            self.halt = True
+            self.lock.notify_all()
+
+        for thd in self.threads:
+            thd.join(timeout=timeout)
+
+        if self.spooling is True:
+            with self.lock:
+                self.compact()
+
+    def compact(self):
+        """
+        Drop the already-read start of the spool file, so the next start
+        only replays what hasn't been handled.
+        """
+        if self.spoolpos == 0:
+            return
+
+        with open(self.spoolfile, 'rb') as spf:
+            spf.seek(self.spoolpos)
+            rest = spf.read()
+        with open(self.spoolfile, 'wb') as spf:
+            spf.write(rest)
+        self.spoolpos = 0
+
+
+# One queue per topic section
+queues = OrderedDict()
+
+
+def getQueue(name, nworkers=2, maxsize=10000, policy='block',
+             spooldir=None):
+    """
+    The queue for a topic section, made on first use.
+    """
+    if name not in queues:
+        queues[name] = IngestQueue(name, nworkers=nworkers, maxsize=maxsize,
+                                   policy=policy, spooldir=spooldir)
+
+    return queues[name]
+
+
+def printStats():
+    """
+    Print the depth and counters of every queue.
+    """
+    for name in queues:
+        stats = queues[name].stats()
+        spool = ""
+        if stats['spoolpending'] is True:
+            spool = " (more spooled on disk)"
+        print("%s: %d waiting%s (max %d), %d handled, %d dropped, "
+              "%d spilled" %
+              (name, stats['depth'], spool, stats['maxdepth'],
+               stats['handled'], stats['dropped'], stats['spilled']))
+
+
+def closeAll(timeout=10.):
+    """
+    Stop every queue's workers.
+    """
+    for name in queues:
+        queues[name].close(timeout=timeout)
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Straight from parsed fields to InfluxDB line protocol.
+
+Every parser used to build a packet (a list of nested dicts) with
+utils.packetizer.makeInfluxPacket, only for the influx client to turn it
+back into line protocol text when it's written. For the busy topics,
+:func:`makeLine` skips the middleman and writes the line directly, using
+an already escaped "measurement,tags" prefix and already escaped field
+keys, both remembered from the first time they were seen. The
+:class:`LineSender` then posts a whole batch of those lines to the
+database's /write endpoint over one kept-alive HTTP connection.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import math
+import http.client
+import urllib.parse
+
+
+# (measurement, tags): escaped "measurement,tag=value" prefix
+prefixes = {}
+
+# Field key: escaped field key plus "="
+fieldKeys = {}
+
+# HTTP statuses that mean something in the batch itself was refused (or
+#   the batch was too big), rather than the database being unreachable,
+#   misconfigured or having a bad moment
+refusedStatuses = [400, 413]
+
+
+class RejectedError(IOError):
+    """
+    The database understood the write and said no (a 4xx); see
+    :func:`rejected` for whether sending it again could ever help.
+    """
+    def __init__(self, status, message):
+        super(RejectedError, self).__init__(message)
+        self.status = status
+
+
+def rejected(err):
+    """
+    True if an exception from a write means the data itself was refused
+    (a 400 or a 413), so splitting up the batch is worth a try. Bad or
+    missing credentials (401, 403) or a missing database (404) aren't the
+    data's fault and aren't included. Works for our own
+    :class:`RejectedError` as well as the influxdb client's
+    InfluxDBClientError, which carries the status as code.
+    """
+    status = getattr(err, 'status', getattr(err, 'code', None))
+
+    return status in refusedStatuses
+
+
+def escapeMeasurement(meas):
+    """
+    """
+    return meas.replace(",", "\\,").replace(" ", "\\ ")
+
+
+def escapeKey(key):
+    """
+    Tag keys, tag values and field keys all escape the same things.
+    """
+    return key.replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+
+def linePrefix(meas, tags=None):
+    """
+    The escaped measurement and tags part of a line, made on first use.
+    """
+    if tags:
+        tkey = tuple(sorted(tags.items()))
+    else:
+        tkey = ()
+
+    try:
+        return prefixes[(meas, tkey)]
+    except KeyError:
+        prefix = escapeMeasurement(str(meas))
+        for tag, tval in tkey:
+            if tval is None or str(tval) == '':
+                # Empty tags aren't allowed
+                continue
+            prefix += ",%s=%s" % (escapeKey(str(tag)), escapeKey(str(tval)))
+        prefixes[(meas, tkey)] = prefix
+        return prefix
+
+
+def fieldKey(key):
+    """
+    """
+    try:
+        return fieldKeys[key]
+    except KeyError:
+        fieldKeys[key] = "%s=" % (escapeKey(str(key)))
+        return fieldKeys[key]
+
+
+def fieldValue(val):
+    """
+    A field value as line protocol, or None if it can't be one.
+    """
+    # bool first, since it's also an int
+    if isinstance(val, bool):
+        return "true" if val else "false"
+    elif isinstance(val, int):
+        return "%di" % (val)
+    elif isinstance(val, float):
+        # Influx won't take these at all
+        if math.isnan(val) or math.isinf(val):
+            return None
+        return repr(val)
+    elif val is None:
+        return None
+    else:
+        val = str(val).replace("\\", "\\\\").replace('"', '\\"')
+        return '"%s"' % (val.replace("\n", "\\n"))
+
+
+def makeLine(meas, fields, ts=None, tags=None):
+    """Make one line of line protocol.
+
+    Args:
+        meas (:obj:`str`)
+            Measurement name. A plain string, NOT a list!
+        fields (:obj:`dict`)
+            Field names and values.
+        ts (:obj:`int`, optional)
+            Timestamp, as an integer in whatever precision the batch is
+            written with. Defaults to None, letting the database timestamp
+            it when it's written.
+        tags (:obj:`dict`, optional)
+            Tag names and values. Defaults to None.
+
+    Returns:
+        line (:obj:`str`)
+            The line, or None if there were no usable fields.
+    """
+    parts = []
+    for key in fields:
+        fval = fieldValue(fields[key])
+        if fval is not None:
+            parts.append(fieldKey(key) + fval)
+
+    if parts == []:
+        return None
+
+    line = "%s %s" % (linePrefix(meas, tags), ",".join(parts))
+    if ts is not None:
+        line = "%s %d" % (line, int(ts))
+
+    return line
+
+
+class LineSender():
+    """
+    Posts batches of lines to an InfluxDB (1.x) /write endpoint, keeping
+    the HTTP connection open between batches.
+    """
+    def __init__(self, host, port=8086, user=None, pw=None, timeout=10.):
+        self.host = host
+        self.port = int(port)
+        self.user = user
+        self.pw = pw
+        self.timeout = timeout
+        self.conn = None
+
+    def write(self, lines, table, timeprec='s'):
+        """
+        Write a batch of lines to the given database (table); raises
+        :class:`RejectedError` if the database refused them, or IOError
+        if it couldn't take them right now.
+        """
+        query = {'db': table, 'precision': timeprec}
+        if self.user not in [None, 'None', '']:
+            query.update({'u': self.user, 'p': self.pw})
+        url = "/write?%s" % (urllib.parse.urlencode(query))
+        body = "\n".join(lines).encode("utf-8")
+
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port,
+                                                   timeout=self.timeout)
+        try:
+            self.conn.request("POST", url, body=body,
+                              headers={'Content-Type': 'text/plain'})
+            resp = self.conn.getresponse()
+            ans = resp.read()
+        except (http.client.HTTPException, OSError):
+            # Start over with a new connection next time
+            self.close()
+            raise
+
+        if resp.status != 204:
+            msg = "InfluxDB said %d: %s" % (resp.status,
+                                            ans.decode("utf-8", "replace"))
+            if 400 <= resp.status < 500:
+                raise RejectedError(resp.status, msg)
+            raise IOError(msg)
+
+    def close(self):
+        """
+        """
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+
+def senderFor(dbconn):
+    """
+    A :class:`LineSender` for the same database as a
+    ligmos.utils.database.influxobj from the config. Raises
+    AttributeError if it doesn't have the connection details we need,
+    rather than quietly writing somewhere else or without credentials.
+    """
+    missing = [each for each in ['host', 'port', 'username', 'password']
+               if hasattr(dbconn, each) is False]
+    if missing != []:
+        raise AttributeError("Database object %s has no %s; can't write "
+                             "line protocol to it (see --noLineProtocol)" %
+                             (type(dbconn).__name__, ", ".join(missing)))
+
+    return LineSender(dbconn.host, port=dbconn.port, user=dbconn.username,
+                      pw=dbconn.password)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Common listener that sends each message wherever its routing table says.
+
+All of the specific listeners (LDT, LOIS, etc.) are just this with a
+different default routing table; see :mod:`dataservants.iago.routing`.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import urllib
+import xml.etree.ElementTree as ET
+from stomp.listener import ConnectionListener
+
+from . import ingest
+from . import routing
+from . import schemas
+
+
+def looksLikeXML(body):
+    """
+    Whether a message is (supposed to be) XML, judging by its first
+    non-whitespace character rather than by trying to parse it.
+    """
+    return body[:256].lstrip('\ufeff \t\r\n').startswith('<')
+
+
+class RoutedConsumer(ConnectionListener):
+    # Which set of default routes to use if none are given
+    listenertype = None
+
+    def __init__(self, dbconn=None, routes=None, queue=None):
+        """
+        This will really be stuffed into a
+        utils.amq.amqHelper class, so all the connections stuff is
+        really over there in that class.  This is just to route the
+        messages to the right parsers, according to the routing table.
+
+        If given a :class:`dataservants.iago.ingest.IngestQueue`, messages
+        are handed off to its workers rather than dealt with right here
+        on stomp's receiver thread.
+        """
+
+        # Adding an extra argument to the subclass
+        self.dbconn = dbconn
+
+        if routes is None:
+            routes = routing.buildTable(self.listenertype)
+        self.routes = routes
+
+        # All the schemas that are in the ligmos library; every listener
+        #   shares the same copy
+        self.schemaDict = schemas.registry.get()
+
+        self.queue = queue
+        if self.queue is not None:
+            self.queue.start(self.process)
+
+    def on_message(self, headers, body):
+        """
+        Basically subclassing stomp.listener.ConnectionListener
+        """
+        # Before anything else, so time spent waiting in the queue (or
+        #   the spool) doesn't end up in the stored timestamp
+        headers = ingest.stampArrival(headers)
+        if self.queue is not None:
+            self.queue.put(headers, body)
+        else:
+            self.process(headers, body)
+
+    def process(self, headers, body):
+        """
+        Decode a message and send it to the right parser.
+        """
+        badMsg = False
+        tname = headers['destination'].split('/')[-1].strip()
+        # Manually turn the bytestring into a string
+        try:
+            body = body.decode("utf-8")
+            badMsg = False
+        except UnicodeDecodeError as err:
+            print(str(err))
+            print("Badness 10000")
+            print(body)
+            badMsg = True
+
+        # Now send the packet to the right place for processing.
+        if badMsg is False:
+            # No need to actually parse anything just to see if it's XML
+            isXML = looksLikeXML(body)
+            try:
+                route = self.routes.lookup(tname)
+                if route is None:
+                    # Intended to be the endpoint of the auto-XML publisher
+                    #   so I can catch most of them rather than explicitly
+                    #   listing them in the routing table
+                    print("Orphan topic: %s" % (tname))
+                    print(headers)
+                    print(body)
+                elif route.needsSchema is True:
+                    # Without XML there's nothing to validate
+                    if isXML is True:
+                        # If there's no schema it'll be caught in "WTF!!!"
+                        schema = self.schemaDict[tname]
+                        # The one and only parse of this message; the tree
+                        #   is what gets validated and decoded from here on
+                        tree = ET.fromstring(body)
+                        route.func(headers, body, schema=schema,
+                                   db=self.dbconn, tree=tree,
+                                   **route.kwargs)
+                    else:
+                        print("Non-XML message on %s; skipping" % (tname))
+                else:
+                    route.func(headers, body, db=self.dbconn, **route.kwargs)
+            except ET.ParseError as err:
+                # Started like XML but isn't, or it got mangled in transit.
+                #   Scream into the log but keep moving
+                print("="*42)
+                print("Bad XML on %s: %s" % (tname, str(err)))
+                print(headers)
+                print(body)
+                print("="*42)
+            except urllib.error.URLError as err:
+                # This actually implies that the message wasn't a valid XML
+                #   message and couldn't actually be validated.  I think it's
+                #   really a quirk of the xmlschema library but I'm not sure
+                print(err)
+            except Exception as err:
+                # Mostly this catches instances where the topic name doesn't
+                #   have a schema, but it catches all oopsies really
+                print("="*11)
+                print("WTF!!!")
+                print(str(err))
+                print(headers)
+                print(body)
+                print("="*11)
@@ -20,9 +20,64 @@ def extraArguments(parser):
     If there are none, it just returns the parser unchanged.
     """
 
-    # An example...
-    # parser.add_argument('-q', '--quiddich', action='store_true',
-    #                     help='Define a useless argument',
-    #                     default=False)
+    bsstr = 'Number of waiting packets that triggers a database write'
+    parser.add_argument('--batchSize', type=int,
+                        help=bsstr,
+                        default=500, nargs="?")
+
+    bastr = 'Longest (seconds) a packet waits before a database write'
+    parser.add_argument('--batchAge', type=float,
+                        help=bastr,
+                        default=1., nargs="?")
+
+    bqstr = 'Most packets to hold per database before dropping the oldest'
+    parser.add_argument('--batchQueue', type=int,
+                        help=bqstr,
+                        default=50000, nargs="?")
+
+    nlstr = 'Write packets through the influx client, not as line protocol'
+    parser.add_argument('--noLineProtocol', action='store_true',
+                        help=nlstr,
+                        default=False)
+
+    parser.add_argument('--workers', type=int,
+                        help='Worker threads handling messages per listener',
+                        default=2, nargs="?")
+
+    qsstr = 'Most messages waiting per listener before --overflow applies'
+    parser.add_argument('--queueSize', type=int,
+                        help=qsstr,
+                        default=10000, nargs="?")
+
+    ofstr = 'What to do with new messages when a listener queue is full'
+    parser.add_argument('--overflow', type=str,
+                        choices=['block', 'drop-oldest', 'spill'],
+                        help=ofstr,
+                        default='block')
+
+    sdstr = 'Directory for messages spilled to disk by --overflow spill'
+    parser.add_argument('--spoolDir', type=str,
+                        help=sdstr,
+                        default='/tmp/iago_spool/')
+
+    scstr = 'File to keep the compiled packet schemas in between runs'
+    parser.add_argument('--schemaCache', type=str,
+                        help=scstr,
+                        default='./config/iago_schemas.cache')
+
+    vestr = 'Fully validate every Nth message of a topic; 0 for only as needed'
+    parser.add_argument('--validateEvery', type=int,
+                        help=vestr,
+                        default=100, nargs="?")
+
+    shstr = 'Run each topic section in its own supervised process'
+    parser.add_argument('--shard', action='store_true',
+                        help=shstr,
+                        default=False)
+
+    spstr = 'With --shard, split each section into this many processes'
+    parser.add_argument('--shardParts', type=int,
+                        help=spstr,
+                        default=1, nargs="?")
 
     return parser
@@ -17,8 +17,10 @@ from __future__ import division, print_function, absolute_import
 
 from ligmos import utils
 
+from . import ingest
 
-def parserLPI(_, msg, db=None):
+
+def parserLPI(hed, msg, db=None):
     """
     'mirrorCoverMode=Open'
     'instrumentCoverState=OPEN'
@@ -26,7 +28,8 @@ def parserLPI(_, msg, db=None):
     'foldMirrorsState=HOME,HOME,HOME,HOME'
     'foldMirrorsStageCoordindates=+0.00,+0.00,+0.00,+0.00'
     """
-    # ts = hed['timestamp']
+    # When it arrived, not when a worker got around to it (ns)
+    ts = ingest.receivedAt(hed)
 
     key = msg.split("=")[0]
     value = msg.split("=")[1]
@@ -110,9 +113,9 @@ def parserLPI(_, msg, db=None):
 
                 tags = {"Coordinates": "CubeMirrors"}
 
-        # Note: passing ts=None lets python Influx do the timestamp for you.
+        # Note: ts=None (never stamped) lets python Influx do the timestamp
         packet = utils.packetizer.makeInfluxPacket(meas=meas,
-                                                   ts=None,
+                                                   ts=ts,
                                                    tags=tags,
                                                    fields=fields)
 
@@ -121,4 +124,5 @@ def parserLPI(_, msg, db=None):
         # Actually commit the packet. singleCommit opens it,
         #   writes the packet, and then optionally closes it.
         if db is not None:
-            db.singleCommit(packet, table=db.tablename, close=True)
+            db.singleCommit(packet, table=db.tablename, close=True,
+                            timeprec='n')
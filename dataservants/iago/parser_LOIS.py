@@ -20,13 +20,16 @@ import datetime as dt
 
 from ligmos import utils
 
+from . import ingest
+
 
 def parserLOlogs(hed, msg, db=None, badFWHM=100.):
     """
     '22:26:55 Level_4:CCD Temp:-110.06 18.54 Setpoints:-109.95 0.00 '
     '22:26:55 Level_4:Telescope threads have been reactivated'
     """
-    # ts = hed['timestamp']
+    # When it arrived, not when a worker got around to it (ns)
+    ts = ingest.receivedAt(hed)
     topic = os.path.basename(hed['destination'])
 
     # print(ts, msg)
@@ -97,13 +100,14 @@ def parserLOlogs(hed, msg, db=None, badFWHM=100.):
 
     # Make the InfluxDB packet and store it, skipping if fields is None
     if fields is not None:
-        # Note: passing ts=None lets python Influx do the timestamp for you
+        # Note: ts=None (never stamped) lets python Influx do the timestamp
         packet = utils.packetizer.makeInfluxPacket(meas=meas,
-                                                   ts=None,
+                                                   ts=ts,
                                                    tags=tags,
                                                    fields=fields)
 
         # Actually commit the packet. singleCommit opens it,
         #   writes the packet, and then optionally closes it.
         if db is not None:
-            db.singleCommit(packet, table=db.tablename, close=True)
+            db.singleCommit(packet, table=db.tablename, close=True,
+                            timeprec='n')
@@ -17,6 +17,8 @@ from __future__ import division, print_function, absolute_import
 
 from ligmos import utils
 
+from . import ingest
+
 
 def parserStageResult(hed, msg, db=None):
     """
@@ -34,7 +36,8 @@ def parserStageResult(hed, msg, db=None):
 
     Results are *tagged* per axis to keep resulting queries simpler.
     """
-    # ts = hed['timestamp']
+    # When it arrived, not when a worker got around to it (ns)
+    ts = ingest.receivedAt(hed)
 
     cardMessage = msg.split(" ")
     cardOrigin = cardMessage[0].split(":")
@@ -123,7 +126,7 @@ def parserStageResult(hed, msg, db=None):
         fields = {"flagType": flagMsg}
 
         packet = utils.packetizer.makeInfluxPacket(meas=meas,
-                                                   ts=None,
+                                                   ts=ts,
                                                    tags=tags,
                                                    fields=fields)
 
@@ -139,7 +142,7 @@ def parserStageResult(hed, msg, db=None):
             tags = {"cardIP": cardIP, "type": "detent", "axis": "AA"}
 
             packet = utils.packetizer.makeInfluxPacket(meas=meas,
-                                                       ts=None,
+                                                       ts=ts,
                                                        tags=tags,
                                                        fields=fields)
 
@@ -209,7 +212,7 @@ def parserStageResult(hed, msg, db=None):
 
                     tags = {"cardIP": cardIP, "type": metric, "axis": axis}
                     packet = utils.packetizer.makeInfluxPacket(meas=meas,
-                                                               ts=None,
+                                                               ts=ts,
                                                                tags=tags,
                                                                fields=fields)
                     packets += packet
@@ -224,7 +227,7 @@ def parserStageResult(hed, msg, db=None):
                     tags = {"cardIP": cardIP,
                             "type": metric, "axis": axisLabels[i]}
                     packet = utils.packetizer.makeInfluxPacket(meas=meas,
-                                                               ts=None,
+                                                               ts=ts,
                                                                tags=tags,
                                                                fields=fields)
 
@@ -237,15 +240,17 @@ def parserStageResult(hed, msg, db=None):
         # Actually commit the packet. singleCommit opens it,
         #   writes the packet, and then optionally closes it.
         if db is not None:
-            db.singleCommit(packets, table=db.tablename, close=True)
+            db.singleCommit(packets, table=db.tablename, close=True,
+                            timeprec='n')
 
 
-def parserPDU(_, msg, db=None):
+def parserPDU(hed, msg, db=None):
     """
     'gwavespdu2.lowell.edu:23 IPC ONLINE!'
     'gwavespdu2.lowell.edu:23 OUTLET 2 ON ( UNIT#0 J2 )NIH-TEMP'
     """
-    # ts = hed['timestamp']
+    # When it arrived, not when a worker got around to it (ns)
+    ts = ingest.receivedAt(hed)
 
     # Cut the hostname down to something more managable
     hostname = msg.split(" ")[0]
@@ -277,13 +282,14 @@ def parserPDU(_, msg, db=None):
         fields.update({"Label": label})
 
         # Make and store the influx packet
-        # Note: passing ts=None lets python Influx do the timestamp for you
+        # Note: ts=None (never stamped) lets python Influx do the timestamp
         packet = utils.packetizer.makeInfluxPacket(meas=meas,
-                                                   ts=None,
+                                                   ts=ts,
                                                    tags=tag,
                                                    fields=fields)
 
         # Actually commit the packet. singleCommit opens it,
         #   writes the packet, and then optionally closes it.
         if db is not None:
-            db.singleCommit(packet, table=db.tablename, close=True)
+            db.singleCommit(packet, table=db.tablename, close=True,
+                            timeprec='n')
@@ -16,13 +16,23 @@ Further description.
 from __future__ import division, print_function, absolute_import
 
 import os
-import collections
+import sys
+import time
 import distutils.util as dut
 
 import xmlschema as xmls
 
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
 from ligmos import utils
 
+from . import ingest
+from . import fastdecode
+from . import lineprotocol
+
 
 def flatten(d, parent_key='', sep='_'):
     """
@@ -36,16 +46,307 @@ def flatten(d, parent_key='', sep='_'):
     items = []
     for k, v in d.items():
         new_key = parent_key + sep + k if parent_key else k
-        if isinstance(v, collections.MutableMapping):
+        if isinstance(v, MutableMapping):
             items.extend(flatten(v, new_key, sep=sep).items())
         else:
             items.append((new_key, v))
     return dict(items)
 
 
+class FlatLayout():
+    """
+    The flattened key names for one topic and schema version, worked out
+    once and then reused for every message.
+
+    Same result as :func:`flatten`, but without the recursion and all the
+    intermediate lists/dicts, and each "parent_child" key is only ever
+    joined (and interned) the first time it's seen.
+    """
+    def __init__(self, sep='_'):
+        self.sep = sep
+        # Flattened parent key: {child key: flattened child key}
+        self.keys = {}
+
+    def children(self, parent):
+        """
+        """
+        try:
+            return self.keys[parent]
+        except KeyError:
+            self.keys[parent] = {}
+            return self.keys[parent]
+
+    def key(self, parent, child):
+        """
+        """
+        if parent == '':
+            fkey = sys.intern(str(child))
+        else:
+            fkey = sys.intern("%s%s%s" % (parent, self.sep, child))
+        self.keys[parent][child] = fkey
+
+        return fkey
+
+    def apply(self, xmlp):
+        """
+        Flatten a decoded packet in one pass.
+        """
+        fields = {}
+        todo = [('', xmlp)]
+        while todo != []:
+            parent, node = todo.pop()
+            kmap = self.children(parent)
+            for child, val in node.items():
+                fkey = kmap.get(child)
+                if fkey is None:
+                    fkey = self.key(parent, child)
+                # to_dict only ever gives back dicts (or subclasses), and
+                #   this is a lot quicker than asking MutableMapping
+                if isinstance(val, dict):
+                    todo.append((fkey, val))
+                else:
+                    fields[fkey] = val
+
+        return fields
+
+
+# (topic name, schema version): FlatLayout
+layouts = {}
+
+
+def layoutFor(topic, version):
+    """
+    The flattening layout for a topic and schema version, made on first use.
+    """
+    key = (topic, version)
+    try:
+        return layouts[key]
+    except KeyError:
+        layouts[key] = FlatLayout()
+        return layouts[key]
+
+
+def flatFields(xmlp, layout=None):
+    """
+    Decoded packet as a flat dict of fields, nested bits joined with '_'.
+    """
+    if layout is None:
+        layout = FlatLayout()
+
+    return layout.apply(xmlp)
+
+
+# Topic name: schema version that last decoded it successfully
+schemaAffinity = {}
+
+# Every this-many messages of a topic still get xmlschema's full
+#   validation (and a check on the fast decoder); 0 means only when the
+#   fast decoder can't cope
+validateEvery = 100
+
+# Topic name: messages seen, for the above
+sampleCounts = {}
+
+# Schema URL: messages its fast decoder couldn't handle, which isn't
+#   the same as getting them wrong
+fastFallbacks = {}
+
+
+def laxDecode(schema, msg):
+    """
+    Decode a message with one schema, in lax mode so it's only done once;
+    returns the decoded dict and the list of validation errors.
+    """
+    try:
+        xmlp = schema.to_dict(msg, decimal_type=float, validation='lax')
+    except xmls.XMLSchemaValidationError as err:
+        return None, [err]
+
+    # I HATE THIS
+    if isinstance(xmlp, tuple):
+        xmlp, errs = xmlp
+    else:
+        errs = []
+
+    return xmlp, errs
+
+
+def fastDecode(schema, tree):
+    """
+    Flat fields from the schema's fast decoder, or None if it can't.
+    """
+    dec = fastdecode.decoderFor(schema)
+    if dec is None:
+        return None
+
+    try:
+        return dec.decode(tree)
+    except fastdecode.FastDecodeError:
+        return None
+
+
+def tryVersion(schema, msg, fast=False, strict=True):
+    """
+    Decode a message with one schema version, taking the fast path if
+    allowed and possible.  Returns the decoded dict or None.
+    """
+    tried = False
+    if fast is True:
+        fields = fastDecode(schema, msg)
+        if fields is not None:
+            return fields
+        tried = True
+
+    xmlp, errs = laxDecode(schema, msg)
+    if xmlp is None or (strict is True and errs != []):
+        return None
+
+    # Make sure the fast decoder would have gotten the same answer for
+    #   a perfectly valid message. If it couldn't decode it at all, that's
+    #   just a fallback, not a wrong answer
+    if errs == [] and hasattr(msg, 'tag') and \
+       fastdecode.decoderFor(schema) is not None:
+        fields = None
+        if tried is False:
+            fields = fastDecode(schema, msg)
+        if fields is None:
+            url = getattr(schema, 'url', '')
+            fastFallbacks[url] = fastFallbacks.get(url, 0) + 1
+        elif fields != flatFields(xmlp):
+            print("Fast decoder disagrees with xmlschema for %s; "
+                  "not using it anymore" % (getattr(schema, 'url', '')))
+            fastdecode.disable(schema)
+
+    return xmlp
+
+
+def decodePacket(topic, schema, msg):
+    """Validate and decode a message, decoding it only once if possible.
+
+    If there are multiple versions of the schema, the one that worked last
+    time for this topic is tried first, and only forgotten once it stops
+    working; then the others are tried in order like before.
+
+    Given an element tree, the versions' fast decoders (see
+    :mod:`dataservants.iago.fastdecode`) are used where possible; every
+    validateEvery-th message of the topic, and any the fast decoders
+    can't handle, are fully validated by xmlschema instead.
+
+    Args:
+        topic (:obj:`str`)
+            Topic name, used as the key for the remembered version.
+        schema (:obj:`dict` or :class:`xmlschema.XMLSchema`)
+            Schema, or dict of schema versions, for this topic.
+        msg (:obj:`str` or :class:`xml.etree.ElementTree.Element`)
+            The message itself, or its already parsed element tree.
+
+    Returns:
+        best (:obj:`str`)
+            Key of the schema version that worked, or None if there
+            weren't any versions.
+        xmlp (:obj:`dict`)
+            Decoded message, or None if it wasn't valid.
+    """
+    fast = False
+    if hasattr(msg, 'tag'):
+        nseen = sampleCounts.get(topic, 0) + 1
+        sampleCounts[topic] = nseen
+        fast = validateEvery <= 0 or nseen % validateEvery != 0
+
+    if not isinstance(schema, dict):
+        # No other versions to check.  Like before, a lax decode that
+        #   doesn't fall over outright is good enough here
+        return None, tryVersion(schema, msg, fast=fast, strict=False)
+
+    order = list(schema.keys())
+    last = schemaAffinity.get(topic, None)
+    if last in schema:
+        order.remove(last)
+        order.insert(0, last)
+
+    for verKey in order:
+        xmlp = tryVersion(schema[verKey], msg, fast=fast)
+        if xmlp is not None:
+            if verKey != last:
+                print("Found working schema %s for %s" % (verKey, topic))
+                schemaAffinity[topic] = verKey
+            return verKey, xmlp
+        elif verKey == last:
+            # Only forget it once it's actually failed
+            schemaAffinity.pop(topic, None)
+
+    print("Failed to find a working schema :(")
+
+    return None, None
+
+
+def commitFields(db, meas, fields, ts=None, tags=None, timeprec='s',
+                 received=None):
+    """Send the fields of a message to the database.
+
+    If the database is really a batchwriter.BufferedTable that takes line
+    protocol, the line is made directly; otherwise it's the usual packet
+    from makeInfluxPacket and singleCommit.
+
+    Args:
+        db (:obj:`object`)
+            Database (or stand-in for one), or None to just make the thing.
+        meas (:obj:`list`)
+            Measurement name, as a list of one like makeInfluxPacket wants.
+        fields (:obj:`dict`)
+            Field names and values.
+        ts (:obj:`int`, optional)
+            Timestamp, or None for now. Defaults to None.
+        tags (:obj:`dict`, optional)
+            Tags for the measurement. Defaults to None.
+        timeprec (:obj:`str`, optional)
+            Precision of ts. Defaults to 's'.
+        received (:obj:`int`, optional)
+            When the message arrived (integer ns), used if there's no ts.
+            Defaults to None.
+
+    Returns:
+        packet (:obj:`str` or :obj:`list`)
+            The line or packet that was made.
+    """
+    if ts is None and received is not None:
+        # When it got here, rather than whenever the queue and the batch
+        #   writer finally let it through
+        ts = received
+        timeprec = 'n'
+
+    if getattr(db, 'lines', False) is True:
+        # It could sit in the batch writer a while, so it can't be left
+        #   for the database to timestamp when it finally gets there.
+        #   Nanoseconds, like the database would have, so that several
+        #   messages in one second stay several points
+        if ts is None:
+            ts = time.time_ns()
+            timeprec = 'n'
+        line = lineprotocol.makeLine(meas[0], fields, ts=ts, tags=tags)
+        if line is not None:
+            db.commitLines([line], table=db.tablename, timeprec=timeprec)
+        return line
+
+    packet = utils.packetizer.makeInfluxPacket(meas=meas,
+                                               ts=ts,
+                                               tags=tags,
+                                               fields=fields)
+
+    # Actually commit the packet. singleCommit opens it,
+    #   writes the packet, and then optionally closes it.
+    if db is not None:
+        db.singleCommit(packet, table=db.tablename,
+                        close=True, timeprec=timeprec)
+
+    return packet
+
+
 def parserFlatPacket(hed, msg, schema=None, db=None, debug=False,
-                     timestampKey=None):
+                     timestampKey=None, tree=None):
     """
+    If the listener already parsed the message, pass the element tree in
+    as tree and it'll be used instead of parsing msg all over again.
     """
     debug = True
     # This is really the topic name, so we'll make that the measurement name
@@ -58,68 +359,15 @@ def parserFlatPacket(hed, msg, schema=None, db=None, debug=False,
         return None
 
     # In this house, we only store valid packets!
-    if isinstance(schema, dict):
-        # For now, just be super lazy and try all the versions defined
-        #   and see which one sticks. Warning: it might be none of them!
-        best = None
-        for verKey in schema:
-            testSchema = schema[verKey]
-            print("Testing schema:")
-            print(testSchema.url)
-            good = testSchema.is_valid(msg)
-            if good is True:
-                # Override the schema variable with the one that worked
-                best = verKey
-                print("Found working schema %s" % (verKey))
-                break
-        if best is not None:
-            schema = schema[best]
-        else:
-            print("Failed to find a working schema :(")
-            good = False
-            schema = None
-    else:
-        # print("Schema was not a dict, so no other versions to check.")
-        # print(type(schema))
-        #
-        # We still need this because the version is now used as an extra
-        #   database metric postfix if it is there
-        best = None
-        good = schema.is_valid(msg)
-
-    # A DIRTY DIRTY HACK
-    if schema is not None:
-        try:
-            xmlp = schema.to_dict(msg, decimal_type=float, validation='lax')
-            # print(xmlp)
-            good = True
-        except xmls.XMLSchemaValidationError:
-            good = False
+    if tree is None:
+        tree = msg
+    best, xmlp = decodePacket(meas[0], schema, tree)
+    good = xmlp is not None
 
     if good is True:
         try:
-            print("Trying to_dict")
-            xmlp = schema.to_dict(msg, decimal_type=float, validation='lax')
-            # I HATE THIS
-            if isinstance(xmlp, tuple):
-                xmlp = xmlp[0]
-
             # Back to normal.
-            keys = xmlp.keys()
-
-            fields = {}
-            # Store each key:value pairing
-            # print("Storing keys")
-            # print(keys)
-            for each in keys:
-                val = xmlp[each]
-
-                # TESTING
-                if isinstance(val, dict):
-                    flatVals = flatten(val, parent_key=each)
-                    fields.update(flatVals)
-                else:
-                    fields.update({each: val})
+            fields = flatFields(xmlp, layout=layoutFor(meas[0], best))
 
             if fields is not None:
                 if timestampKey is not None:
@@ -188,21 +436,10 @@ def parserFlatPacket(hed, msg, schema=None, db=None, debug=False,
                     meas = "%s_%s" % (meas[0], best[1:])
                     meas = [meas]
 
-                packet = utils.packetizer.makeInfluxPacket(meas=meas,
-                                                           ts=ts,
-                                                           tags=None,
-                                                           fields=fields)
-
-                # print("Packet done")
+                packet = commitFields(db, meas, fields, ts=ts,
+                                      timeprec=timeprec,
+                                      received=ingest.receivedAt(hed))
                 print(packet)
-
-                # Actually commit the packet. singleCommit opens it,
-                #   writes the packet, and then optionally closes it.
-                if db is not None:
-                    print("Sending packet")
-                    db.singleCommit(packet, table=db.tablename,
-                                    close=True, timeprec=timeprec)
-                    # print("Sent!")
         except xmls.XMLSchemaDecodeError as err:
             print(err.message.strip())
             print(err.reason.strip())
@@ -246,14 +483,6 @@ def parserSimple(hed, msg, db=None, datatype='float'):
 
     fields = {"value": val}
 
-    # Make and store the influx packet
-    # Note: passing ts=None lets python Influx do the timestamp for you
-    packet = utils.packetizer.makeInfluxPacket(meas=meas,
-                                               ts=None,
-                                               tags=tag,
-                                               fields=fields)
-
-    # Actually commit the packet. singleCommit opens it,
-    #   writes the packet, and then optionally closes it.
-    if db is not None:
-        db.singleCommit(packet, table=db.tablename, close=True)
+    # Make and store the influx packet, timestamped with when it arrived
+    commitFields(db, meas, fields, ts=None, tags=tag,
+                 received=ingest.receivedAt(hed))
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Which parser handles which topic, set up once from the config file.
+
+Every listener used to rebuild its lists of known topics on every single
+message and then walk an if/elif chain of ``in`` checks to pick a parser;
+adding a topic meant editing (at least) one of five nearly identical
+listener classes. Instead, each listener type gets a :class:`RoutingTable`
+built once at startup. Exact topic names are a dict lookup, and wildcard
+patterns are only tried the first time a topic is seen; the answer is
+remembered after that.
+
+Routes come from ``[routes-<listenertype>]`` sections in iago.conf, one
+topic (or fnmatch-style pattern) per line, on top of the built-in defaults
+below::
+
+    [routes-ldt]
+    TCS.TCSSharedVariables.NewThing=flat
+    DCS.DCSPubDataSV.*Temperature=float
+    lig.weather.clark.*=flat, timestampKey=influx_ts
+
+The parser names are the keys of :data:`parserTypes`; anything after the
+name is passed along to the parser as keyword arguments.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import re
+import fnmatch
+import configparser as conf
+from collections import OrderedDict
+
+from .parser_LDT import parserLPI
+from .parser_LOIS import parserLOlogs
+from .parser_OMSPDU import parserPDU, parserStageResult
+from .parser_general import parserFlatPacket, parserSimple
+
+
+# name: (parser, fixed keyword arguments, whether it needs a schema)
+parserTypes = {'flat': (parserFlatPacket, {}, True),
+               'float': (parserSimple, {'datatype': 'float'}, False),
+               'string': (parserSimple, {'datatype': 'string'}, False),
+               'bool': (parserSimple, {'datatype': 'bool'}, False),
+               'lpi': (parserLPI, {}, False),
+               'loislog': (parserLOlogs, {}, False),
+               'pdu': (parserPDU, {}, False),
+               'stageresult': (parserStageResult, {}, False)}
+
+# What each listener type knew about before the routes were configurable
+defaultRoutes = {'ldt': [('lightPathInformation', 'lpi'),
+                         ('AOS.AOSPubDataSV.AOSDataPacket', 'flat'),
+                         ('WRS.WRSPubDataSV.WRSDataPacket', 'flat'),
+                         ('TCS.TCSSharedVariables.TCSHighLevelStatusSV.'
+                          'TCSTcsStatusSV', 'flat'),
+                         ('Ryans.DCTWeatherStream', 'flat'),
+                         ('lig.sitepower.isense', 'flat'),
+                         ('AOS.AOSSubDataSV.RelativeFocusOffset', 'float'),
+                         ('AOS.AOSSubDataSV.AbsoluteFocusOffset', 'float'),
+                         ('MTS.MTSPubDataSV.MountTemperature', 'float'),
+                         ('DCS.DCSPubDataSV.MountDomeAzimuthDifference',
+                          'float'),
+                         ('DCS.DSSPubDataSV.PositionStatus', 'string'),
+                         ('DCS.DCSPubDataSV.OccultationWarning', 'bool')],
+                 'lois': [('*loisLog', 'loislog'),
+                          ('tcs.loisTelemetry', 'flat'),
+                          ('lmi.loisTelemetry', 'flat'),
+                          ('deveny.loisTelemetry', 'flat'),
+                          ('RC1.loisTelemetry', 'flat'),
+                          ('RC2.loisTelemetry', 'flat')],
+                 'marshill': [('lig.weather.clark.basestation',
+                               'flat, timestampKey=influx_ts'),
+                              ('lig.weather.clark.outdoorstation',
+                               'flat, timestampKey=influx_ts'),
+                              ('lig.weather.clark.raingauge',
+                               'flat, timestampKey=influx_ts'),
+                              ('lig.weather.clark.windgauge',
+                               'flat, timestampKey=influx_ts'),
+                              ('lig.weather.timo.boltwoodii',
+                               'flat, timestampKey=influx_ts'),
+                              ('lig.weather.timo.aagcloudwatcher',
+                               'flat, timestampKey=influx_ts')],
+                 'mesa': [('lig.mesa.NPOIWeatherStation', 'flat'),
+                          ('LOUI.nasa42.loisTelemetry', 'flat')],
+                 'omspdu': [('joePduResult', 'pdu'),
+                            ('joeStageResult', 'stageresult'),
+                            ('joeStage', 'flat')]}
+
+# Keys in a routes section that aren't topics
+notTopics = ['enabled', 'name']
+
+
+class Route():
+    """
+    A parser, and how to call it, for one topic (or pattern of topics).
+    """
+    def __init__(self, ptype, kwargs=None):
+        func, fixed, needsSchema = parserTypes[ptype]
+        self.ptype = ptype
+        self.func = func
+        self.needsSchema = needsSchema
+        self.kwargs = dict(fixed)
+        if kwargs is not None:
+            self.kwargs.update(kwargs)
+
+
+def optionValue(val):
+    """
+    Route options come in as strings; turn the numbers back into numbers.
+    """
+    for vtype in [int, float]:
+        try:
+            return vtype(val)
+        except ValueError:
+            pass
+
+    return val
+
+
+def parseRoute(spec):
+    """
+    Turn a routing line (e.g. "flat, timestampKey=influx_ts") into a
+    :class:`Route`. Raises KeyError if the parser name is unknown.
+    """
+    parts = [each.strip() for each in spec.split(",")]
+    kwargs = {}
+    for each in parts[1:]:
+        if "=" in each:
+            key, val = each.split("=", 1)
+            kwargs.update({key.strip(): optionValue(val.strip())})
+
+    return Route(parts[0].lower(), kwargs=kwargs)
+
+
+def isPattern(topic):
+    """
+    """
+    return any([char in topic for char in "*?["])
+
+
+class RoutingTable():
+    """
+    Exact topic names, plus wildcard patterns tried in order, mapped to
+    the :class:`Route` that handles them.
+    """
+    def __init__(self):
+        self.exact = {}
+        self.patterns = []
+        # Every topic we've looked up, and where it went (None == orphan)
+        self.seen = {}
+
+    def add(self, topic, spec):
+        """
+        Add (or replace) the route for a topic or pattern.
+        """
+        try:
+            route = parseRoute(spec)
+        except KeyError:
+            print("WARNING: Unknown parser '%s' for topic %s; ignoring" %
+                  (spec, topic))
+            return
+
+        if isPattern(topic) is True:
+            regex = re.compile(fnmatch.translate(topic))
+            self.patterns = [p for p in self.patterns if p[0] != topic]
+            self.patterns.append((topic, regex, route))
+        else:
+            self.exact[topic] = route
+        self.seen = {}
+
+    def lookup(self, tname):
+        """
+        The route for a topic name, or None if nothing handles it.
+        """
+        try:
+            return self.seen[tname]
+        except KeyError:
+            pass
+
+        route = self.exact.get(tname, None)
+        if route is None:
+            for _, regex, proute in self.patterns:
+                if regex.match(tname) is not None:
+                    route = proute
+                    break
+        self.seen[tname] = route
+
+        return route
+
+
+def buildTable(ltype, extra=None):
+    """
+    Routing table for a listener type: the defaults, then any extra
+    (topic, spec) pairs on top.
+    """
+    table = RoutingTable()
+    for topic, spec in defaultRoutes.get(ltype, []):
+        table.add(topic, spec)
+    if extra is not None:
+        for topic, spec in extra:
+            table.add(topic, spec)
+
+    return table
+
+
+def loadRoutes(conffile):
+    """Build the routing table for every listener type from iago.conf.
+
+    Args:
+        conffile (:obj:`str`)
+            Path to iago.conf.
+
+    Returns:
+        tables (:obj:`dict`)
+            :class:`RoutingTable` for each listener type (lowercase),
+            including the ones that only have the built-in defaults.
+    """
+    parser = conf.ConfigParser()
+    # Topic names are case sensitive!
+    parser.optionxform = str
+    parser.read(conffile)
+
+    extras = OrderedDict()
+    for section in parser.sections():
+        if section.lower().startswith("routes-") is False:
+            continue
+        ltype = section.split("-", 1)[1].lower()
+        extras.setdefault(ltype, [])
+        for topic in parser[section]:
+            if topic.lower() not in notTopics:
+                extras[ltype].append((topic, parser[section][topic]))
+
+    tables = {}
+    for ltype in set(list(defaultRoutes.keys()) + list(extras.keys())):
+        tables[ltype] = buildTable(ltype, extra=extras.get(ltype, None))
+
+    return tables
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""One copy of the compiled packet schemas, shared by every listener.
+
+Each listener used to call utils.amq.schemaDicter() itself, which loads
+and compiles every XSD in ligmos all over again (and then printed the
+whole lot), so startup got slower and memory got bigger with every
+listener. Instead there's a single :class:`SchemaRegistry` per process,
+built the first time a listener asks for it.
+
+It's also kept on disk: the compiled schemas are pickled to the cache
+file along with a hash of every XSD they were built from (plus the
+xmlschema, ligmos and python versions, and the source of schemaDicter
+itself), and the next start just loads them back unless any of those
+have changed.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import sys
+import glob
+import time
+import pickle
+import hashlib
+import inspect
+import threading
+import urllib.parse
+import urllib.request
+
+import xmlschema as xmls
+
+import ligmos
+from ligmos import utils
+
+
+def schemaFiles(schemas):
+    """
+    Local paths of the XSDs behind a schema dict from schemaDicter.
+    """
+    paths = set()
+    for topic in schemas:
+        versions = schemas[topic]
+        if not isinstance(versions, dict):
+            versions = {None: versions}
+        for ver in versions:
+            url = getattr(versions[ver], 'url', None)
+            if url is None:
+                continue
+            purl = urllib.parse.urlparse(url)
+            if purl.scheme in ['', 'file']:
+                paths.add(urllib.request.url2pathname(purl.path))
+
+    return sorted(paths)
+
+
+def dicterSource():
+    """
+    Source of utils.amq.schemaDicter, since that's what decides which
+    topic gets which XSD; '' if it can't be found.
+    """
+    try:
+        return inspect.getsource(utils.amq.schemaDicter)
+    except (TypeError, OSError):
+        return ''
+
+
+def fingerprint(dirs):
+    """
+    Hash of every XSD in the given directories, and of the versions of
+    the things that made the compiled (pickled) schemas, including the
+    ligmos code that maps the topics to them.
+    """
+    fprint = hashlib.sha256()
+    fprint.update(("%s %s %s" % (xmls.__version__, sys.version_info[:2],
+                                 getattr(ligmos, '__version__', '')
+                                 )).encode("utf-8"))
+    fprint.update(hashlib.sha256(dicterSource().encode("utf-8")).digest())
+    for each in sorted(dirs):
+        for xsd in sorted(glob.glob(os.path.join(each, "*.xsd"))):
+            fprint.update(xsd.encode("utf-8"))
+            with open(xsd, 'rb') as xsf:
+                fprint.update(hashlib.sha256(xsf.read()).digest())
+
+    return fprint.hexdigest()
+
+
+def readCache(cachefile):
+    """
+    The schemas from the cache file, or None if they're missing or stale.
+    """
+    try:
+        with open(cachefile, 'rb') as cfile:
+            # The header is its own pickle, so we can check it without
+            #   having to load all of the schemas
+            header = pickle.load(cfile)
+            if fingerprint(header['dirs']) != header['fingerprint']:
+                print("Schema cache %s is stale" % (cachefile))
+                return None
+            return pickle.load(cfile)
+    except FileNotFoundError:
+        return None
+    except Exception as err:
+        print("Couldn't read schema cache %s: %s" % (cachefile, str(err)))
+        return None
+
+
+def writeCache(cachefile, schemas):
+    """
+    Pickle the schemas to the cache file, along with what they came from.
+    """
+    dirs = sorted(set([os.path.dirname(each)
+                       for each in schemaFiles(schemas)]))
+    header = {'dirs': dirs, 'fingerprint': fingerprint(dirs)}
+
+    tmpfile = "%s.%d" % (cachefile, os.getpid())
+    try:
+        utils.files.checkDir(os.path.dirname(os.path.abspath(cachefile)))
+        with open(tmpfile, 'wb') as cfile:
+            pickle.dump(header, cfile, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(schemas, cfile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpfile, cachefile)
+    except Exception as err:
+        # Not fatal; we'll just compile them again next time
+        print("Couldn't write schema cache %s: %s" % (cachefile, str(err)))
+        if os.path.exists(tmpfile):
+            os.remove(tmpfile)
+
+
+class SchemaRegistry():
+    """
+    The compiled schemas for every topic, built (or loaded) on first use.
+    """
+    def __init__(self, cachefile=None):
+        self.cachefile = cachefile
+        self.schemas = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """
+        Topic name: schema (or dict of schema versions).
+        """
+        if self.schemas is None:
+            with self.lock:
+                if self.schemas is None:
+                    self.schemas = self.load()
+
+        return self.schemas
+
+    def load(self):
+        """
+        """
+        t1 = time.time()
+        schemas = None
+        if self.cachefile is not None:
+            schemas = readCache(self.cachefile)
+
+        if schemas is None:
+            schemas = utils.amq.schemaDicter()
+            source = "compiled"
+            if self.cachefile is not None:
+                writeCache(self.cachefile, schemas)
+        else:
+            source = "loaded from %s" % (self.cachefile)
+
+        print("%d topic schemas %s in %.2f s" %
+              (len(schemas), source, time.time() - t1))
+
+        return schemas
+
+
+# The one everybody uses
+registry = SchemaRegistry()
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Run each topic section (or slice of one) in its own process.
+
+Every listener normally lives in the one Iago process, so they all share
+one GIL; the schema decoding for the busy LDT topics is enough to starve
+the OMS/PDU and LOIS listeners sitting next to them. With --shard, each
+topic section gets its own child process instead, with its own broker
+connection, database connection and batch writer. --shardParts splits
+each section's topics further by a (stable) hash of the topic name, so
+that one busy section can be spread over several processes too.
+
+The parent just keeps an eye on them. A child that exits, or that stops
+updating its heartbeat, is restarted after a delay that grows with each
+consecutive failure.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import time
+import zlib
+import multiprocessing as mp
+from collections import OrderedDict
+
+from ligmos.utils import amq, common
+from ligmos.workers import connSetup
+
+from . import ingest
+from . import batchwriter
+
+
+def topicList(topics):
+    """
+    Topics as a list, whether the config gave a list or a string.
+    """
+    if isinstance(topics, str):
+        topics = topics.split(",")
+
+    return [each.strip() for each in topics if each.strip() != '']
+
+
+def partitionTopics(topics, nparts, part):
+    """
+    The topics that belong in the given slice. crc32 rather than hash(),
+    since the latter changes from one interpreter to the next.
+    """
+    return [each for each in topicList(topics)
+            if zlib.crc32(each.encode("utf-8")) % nparts == part]
+
+
+def runShard(name, conSect, topics, comm, args, startListener, heartbeat,
+             interval=10.):
+    """Child process: listen to one slice of topics until told to stop.
+
+    Args:
+        name (:obj:`str`)
+            Name of this shard, for the logs and the ingest queue.
+        conSect (:class:`ligmos.utils.classes.snoopTarget`)
+            Config section the topics came from.
+        topics (:obj:`list`)
+            Topics this shard subscribes to.
+        comm (:obj:`dict`)
+            Common (broker and database) config blocks.
+        args (:class:`argparse.Namespace`)
+            Parsed command line arguments.
+        startListener (:obj:`function`)
+            Iago's function that sets up a listener and its broker
+            connection; returns the broker connection.
+        heartbeat (:class:`multiprocessing.Value`)
+            Updated with the time every time around the loop, so the
+            parent can tell if this process has hung.
+        interval (:obj:`float`, optional)
+            Seconds between connection checks. Defaults to 10.
+    """
+    runner = common.HowtoStopNicely()
+
+    # Our very own database connections, not the parent's
+    idbs = connSetup.connIDB(comm)
+    bkr = startListener(name, conSect, topics, comm, idbs, args)
+
+    while runner.halt is False:
+        heartbeat.value = time.time()
+        bkr = amq.checkSingleConnection(bkr, subscribe=True)
+
+        ingest.printStats()
+        batchwriter.printStats()
+
+        # Sleep in small chunks to check abort
+        for _ in range(int(interval*10)):
+            time.sleep(0.1)
+            if runner.halt is True:
+                break
+
+    print("Shard %s is now out of here!" % (name))
+    bkr[0].disconnect()
+    ingest.closeAll()
+    batchwriter.closeAll()
+
+
+class Shard():
+    """
+    One child process, and what's needed to start it again.
+    """
+    def __init__(self, name, target, targs):
+        self.name = name
+        self.target = target
+        self.targs = targs
+        self.proc = None
+        self.heartbeat = None
+        self.restarts = 0
+        self.failures = 0
+        self.nextstart = 0.
+        self.started = 0.
+
+    def start(self, ctx):
+        """
+        """
+        # Stays 0 until the child checks in for the first time
+        self.heartbeat = ctx.Value('d', 0.)
+        self.started = time.time()
+        self.proc = ctx.Process(target=self.target, name=self.name,
+                                args=self.targs + (self.heartbeat,))
+        self.proc.daemon = False
+        self.proc.start()
+        print("Started shard %s as PID %d" % (self.name, self.proc.pid))
+
+    def stop(self, timeout=30.):
+        """
+        Ask nicely (SIGTERM) and then not so nicely.
+        """
+        if self.proc is None:
+            return
+
+        if self.proc.is_alive():
+            self.proc.terminate()
+            self.proc.join(timeout=timeout)
+        if self.proc.is_alive():
+            print("Shard %s ignored SIGTERM; killing it" % (self.name))
+            self.proc.kill()
+            self.proc.join()
+
+
+class Supervisor():
+    """
+    Starts the shards, checks on them, and restarts them if needed.
+    """
+    def __init__(self, stale=120., backoff=5., maxbackoff=300.):
+        # Seconds without a heartbeat before a shard is considered hung
+        self.stale = stale
+        self.backoff = backoff
+        self.maxbackoff = maxbackoff
+        self.shards = OrderedDict()
+        # fork, like mandos.hostpool, so the children get the config
+        #   classes and routing tables without any pickling
+        self.ctx = mp.get_context('fork')
+
+    def add(self, name, target, targs):
+        """
+        """
+        self.shards[name] = Shard(name, target, targs)
+
+    def startAll(self):
+        """
+        """
+        for name in self.shards:
+            self.shards[name].start(self.ctx)
+
+    def check(self):
+        """
+        Restart any shard that's died or hung.
+        """
+        now = time.time()
+        for name in self.shards:
+            shard = self.shards[name]
+            if shard.proc.is_alive():
+                last = shard.heartbeat.value
+                age = now - max(last, shard.started)
+                if age < self.stale:
+                    # Only call it healthy once it's actually checked in
+                    if last > 0:
+                        shard.failures = 0
+                    continue
+                print("Shard %s hasn't checked in for %.0f s; stopping it" %
+                      (name, age))
+                shard.stop()
+                shard.nextstart = 0.
+
+            # Dead one way or another; wait a bit before trying again
+            if shard.nextstart == 0.:
+                delay = min(self.maxbackoff,
+                            self.backoff*2**shard.failures)
+                shard.nextstart = now + delay
+                shard.failures += 1
+                print("Shard %s exited (code %s); restarting in %.1f s" %
+                      (name, shard.proc.exitcode, delay))
+            elif now >= shard.nextstart:
+                shard.nextstart = 0.
+                shard.restarts += 1
+                shard.start(self.ctx)
+
+    def printStats(self):
+        """
+        """
+        for name in self.shards:
+            shard = self.shards[name]
+            print("%s: PID %s, %s, %d restarts" %
+                  (name, shard.proc.pid,
+                   "alive" if shard.proc.is_alive() else "down",
+                   shard.restarts))
+
+    def stopAll(self, timeout=30.):
+        """
+        """
+        for name in self.shards:
+            self.shards[name].stop(timeout=timeout)
@@ -1,2 +1,7 @@
 from . import tasks
+from . import ledger
+from . import manifests
+from . import localcache
+from . import deleter
+from . import hostpool
 from . import parseargs
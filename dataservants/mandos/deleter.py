@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Actually delete the remote directories that Mandos has judged deletable.
+
+Rather than one SSH command per file (or per directory), the deletable
+directories are sent to Yvette in batches, each batch signed with the key
+in --cleanKey along with the manifest root that was compared for each
+directory. Yvette checks all of it again on her side before deleting
+anything; see :mod:`dataservants.yvette.cleaning`. Nothing happens at all
+unless Mandos is started with --deleteArchived.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+from .. import yvette
+from . import ledger
+
+
+def deleteBatches(eSSH, baseYcmd, args, iobj, ledg, dirs):
+    """Have Yvette delete the given directories, a batch at a time.
+
+    Args:
+        eSSH (:class:`ligmos.utils.ssh.SSHHandler`)
+            Open SSH connection to the remote host.
+        baseYcmd (:obj:`str`)
+            String describing how to properly start Yvette on the target.
+        args (:class:`argparse.Namespace`)
+            Parsed command line arguments.
+        iobj (:obj:`dict`)
+            Instrument object from the config.
+        ledg (:class:`dataservants.mandos.ledger.VerdictLedger`)
+            Verdict ledger; deleted directories are recorded there.
+        dirs (:obj:`list`)
+            List of [remote directory, manifest root] pairs.
+
+    Returns:
+        freed (:obj:`int`)
+            Total bytes freed on the remote host.
+    """
+    key = yvette.cleaning.loadKey(args.cleanKey)
+    if key is None:
+        print("--> No signing key in %s; not deleting anything" %
+              (args.cleanKey))
+        return 0
+
+    freed = 0
+    nbatch = max(1, args.cleanBatch)
+    for i in range(0, len(dirs), nbatch):
+        chunk = dirs[i:i + nbatch]
+        batch, signature = yvette.cleaning.packBatch(key, iobj.srcdir, chunk,
+                                                     htype=args.hashtype,
+                                                     filetype=iobj.filemask)
+
+        # Same quick hack as srcdir, to hand Yvette the batch
+        iobj.cleanBatch = batch
+        iobj.cleanSignature = signature
+        print("--> Asking Yvette to delete %d directories on %s" %
+              (len(chunk), iobj.host))
+        ans = yvette.remote.commandYvetteSimple(eSSH, baseYcmd, args, iobj,
+                                                'clean', debug=args.debug)
+        iobj.cleanBatch = ''
+        iobj.cleanSignature = ''
+
+        try:
+            cleaned = ans['Cleaned']
+        except (KeyError, TypeError):
+            print("--> Yvette didn't clean anything: %s" % (ans))
+            break
+
+        roots = dict([(d, r) for d, r in chunk])
+        for rdir in cleaned:
+            res = cleaned[rdir]
+            if res['deleted'] is True:
+                print("--> Deleted %s:%s; %.2f GiB freed, %d files kept" %
+                      (iobj.host, rdir, res['bytesfreed']/2**30,
+                       res['nkept']))
+                ledg.record(iobj.host, rdir, ledger.DELETED,
+                            root=roots.get(rdir, None))
+            else:
+                print("--> Yvette refused to delete %s:%s (%s)" %
+                      (iobj.host, rdir, res['reason']))
+        freed += ans.get('BytesFreed', 0)
+
+    print("--> %.2f GiB freed on %s" % (freed/2**30, iobj.host))
+
+    return freed
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Check all of the instrument hosts at the same time.
+
+instLooper goes through the instruments one by one, so one slow
+verification holds up the cleanup checks on everything else. Instead,
+hand each host to its own worker and wait for them all, so that a full
+pass over the observatory takes about as long as the slowest host rather
+than the sum of all of them.
+
+The workers are processes rather than threads. The actions rely on the
+SIGALRM timeouts in instLooper and instAction, and only the main thread
+of a process can have those. It also means each worker gets its own SSH
+session. Config sections that point at the same host go to the same
+worker and run one after another, so no instrument's disks ever see more
+than one verification at a time.
+
+Each host keeps the same worker process from one pass to the next, so
+its cache of parsed manifests and the local hashing it started in the
+background (see :mod:`dataservants.mandos.localcache`) are still there
+the next time around.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import time
+import datetime as dt
+import multiprocessing as mp
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from ligmos.utils import common
+from . import ledger
+
+
+# Host: its own single process pool, kept between passes
+workers = OrderedDict()
+
+
+def groupByHost(config):
+    """
+    Split the config into one smaller config per host, keeping the
+    original order of the sections.
+    """
+    hosts = OrderedDict()
+    for key in config:
+        host = config[key].host
+        if host not in hosts:
+            hosts[host] = OrderedDict()
+        hosts[host].update({key: config[key]})
+
+    return hosts
+
+
+def checkHost(hconfig, args, defineActions, updateArguments, baseYcmd,
+              alarmtime):
+    """
+    Worker: run the usual per-instrument loop, but over just one host's
+    sections of the config. Returns how long it took.
+    """
+    t1 = time.time()
+    runner = common.HowtoStopNicely()
+    actions = defineActions()
+    try:
+        common.instLooper(hconfig, runner, args,
+                          actions, updateArguments,
+                          baseYcmd,
+                          db=None,
+                          alarmtime=alarmtime)
+    except Exception as err:
+        # Don't let one host take the whole pool down with it
+        print("--> Host check failed: %s" % (str(err)))
+
+    return time.time() - t1
+
+
+def hostWorker(host, ctx):
+    """
+    The worker process for a host, started if it doesn't have one yet.
+    """
+    if host not in workers:
+        workers[host] = ProcessPoolExecutor(max_workers=1, mp_context=ctx)
+
+    return workers[host]
+
+
+def stopWorkers(hosts=None):
+    """
+    Shut down the worker processes of the given hosts (or all of them).
+    Any background hashing they're still doing is abandoned; it'll be
+    picked up again whenever it's needed.
+    """
+    if hosts is None:
+        hosts = list(workers.keys())
+
+    for host in hosts:
+        pool = workers.pop(host, None)
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+
+def loopSummary(ledg, hosts, since, htimes, wall):
+    """Summarize one full pass over all the hosts.
+
+    Args:
+        ledg (:class:`dataservants.mandos.ledger.VerdictLedger`)
+            The verdict ledger the workers were writing into.
+        hosts (:obj:`list`)
+            Hosts that were checked.
+        since (:obj:`float`)
+            Time (epoch seconds) at which the pass started.
+        htimes (:obj:`dict`)
+            Seconds each host took, keyed by host.
+        wall (:obj:`float`)
+            Seconds the whole pass took.
+
+    Returns:
+        summary (:obj:`dict`)
+            Per-host counts of the verdicts reached during this pass, the
+            total number of directories currently deletable, and timings.
+    """
+    summary = {'hosts': {}, 'wall': wall,
+               'serial': sum([htimes[h] for h in htimes])}
+    for host in hosts:
+        counts = ledg.verdictCounts(host, since=since)
+        summary['hosts'].update({host: {'elapsed': htimes.get(host, None),
+                                        'judged': counts,
+                                        'deletable':
+                                        ledg.verdictCounts(host).get(
+                                            ledger.DELETABLE, 0)}})
+
+    return summary
+
+
+def printSummary(summary):
+    """
+    """
+    print("=" * 60)
+    print("Mandos pass finished at %s" % (dt.datetime.utcnow()))
+    for host in summary['hosts']:
+        hsum = summary['hosts'][host]
+        elapsed = hsum['elapsed']
+        if elapsed is None:
+            elapsed = float('nan')
+        print("  %s: %.1f s; judged %s; %d directories deletable" %
+              (host, elapsed, hsum['judged'], hsum['deletable']))
+    print("  %.1f s wall clock for %.1f s of host checks" %
+          (summary['wall'], summary['serial']))
+    print("=" * 60)
+
+
+def checkAllHosts(config, args, defineActions, updateArguments, baseYcmd,
+                  alarmtime, nworkers=4):
+    """Run Mandos' actions for every host concurrently.
+
+    Args:
+        config (:obj:`dict`)
+            Parsed configuration, one entry per instrument section.
+        args (:class:`argparse.Namespace`)
+            Parsed command line arguments.
+        defineActions (:obj:`function`)
+            Function returning the list of actions to run per instrument.
+        updateArguments (:obj:`function`)
+            Function that fills in the per-instrument action arguments.
+        baseYcmd (:obj:`str`)
+            String describing how to properly start Yvette on the target.
+        alarmtime (:obj:`int`)
+            Total time (seconds) allowed for all actions per instrument.
+        nworkers (:obj:`int`, optional)
+            Maximum number of hosts to check at once. Defaults to 4.
+
+    Returns:
+        summary (:obj:`dict`)
+            See :func:`loopSummary`.
+    """
+    since = time.time()
+    hosts = groupByHost(config)
+
+    # fork, so the workers get the main module's functions and any
+    #   already-imported config classes without any fuss
+    ctx = mp.get_context('fork')
+
+    # Hosts that have dropped out of the config don't need one anymore
+    stopWorkers([host for host in workers if host not in hosts])
+
+    htimes = {}
+    todo = list(hosts.keys())
+    running = {}
+    while todo != [] or running != {}:
+        # No more than nworkers hosts at a time, in config order
+        while todo != [] and len(running) < max(1, nworkers):
+            host = todo.pop(0)
+            fut = hostWorker(host, ctx).submit(checkHost, hosts[host], args,
+                                               defineActions,
+                                               updateArguments,
+                                               baseYcmd, alarmtime)
+            running[fut] = host
+
+        done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+        for fut in done:
+            host = running.pop(fut)
+            try:
+                htimes[host] = fut.result()
+            except Exception as err:
+                # checkHost catches its own, so the process itself broke;
+                #   the host gets a fresh one next time
+                print("--> Worker for %s died: %s" % (host, str(err)))
+                stopWorkers([host])
+
+    wall = time.time() - since
+    ledg = ledger.VerdictLedger(args.ledger)
+    summary = loopSummary(ledg, list(hosts.keys()), since, htimes, wall)
+
+    return summary
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Persistent ledger of Mandos' verdicts on old directories.
+
+Every loop, cleanRemote used to make Yvette verify every old directory in
+full, pull down its manifest and compare it again, even if the very same
+directory was proven deletable an hour earlier. Instead, remember each
+verdict along with cheap (stat-only) fingerprints of both the remote and
+local copies and the root digest of the manifest that was compared. A
+directory is only judged again if either side changed, or if the verdict
+is older than the re-verification period.
+
+It also keeps a cursor per host (which directory, and how far into it)
+so that verification that runs out of time picks up where it left off on
+the next loop instead of starting over from the first old directory, and
+the remote size and mtime of every manifest we've downloaded so that an
+unchanged one never has to be pulled over again.
+
+Same idea (and same SQLite-with-short-connections approach) as Wadsworth's
+transfer journal, :mod:`dataservants.wadsworth.journal`.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import time
+import sqlite3
+from contextlib import closing
+
+
+# Possible verdicts
+DELETABLE = 'deletable'
+RETRANSFER = 'retransfer'
+BADREMOTE = 'badremote'
+DELETED = 'deleted'
+
+schema = ["""CREATE TABLE IF NOT EXISTS verdicts (
+                 host TEXT NOT NULL,
+                 srcdir TEXT NOT NULL,
+                 verdict TEXT NOT NULL,
+                 rprint TEXT,
+                 lprint TEXT,
+                 root TEXT,
+                 checked REAL,
+                 PRIMARY KEY (host, srcdir))""",
+          """CREATE TABLE IF NOT EXISTS cursors (
+                 host TEXT NOT NULL PRIMARY KEY,
+                 srcdir TEXT,
+                 offset INTEGER,
+                 rprint TEXT,
+                 secperfile REAL,
+                 updated REAL)""",
+          """CREATE TABLE IF NOT EXISTS manifests (
+                 host TEXT NOT NULL,
+                 rfile TEXT NOT NULL,
+                 size INTEGER,
+                 mtime REAL,
+                 lfile TEXT,
+                 fetched REAL,
+                 PRIMARY KEY (host, rfile))"""]
+
+
+class VerdictLedger():
+    """
+    Ledger of directory verdicts, keyed by host and remote directory.
+    """
+    def __init__(self, dbpath):
+        self.dbpath = os.path.abspath(os.path.expanduser(dbpath))
+        dname = os.path.dirname(self.dbpath)
+        if os.path.isdir(dname) is False:
+            os.makedirs(dname, exist_ok=True)
+
+        with closing(self.connect()) as conn:
+            with conn:
+                for each in schema:
+                    conn.execute(each)
+
+    def connect(self):
+        """
+        """
+        conn = sqlite3.connect(self.dbpath, timeout=30.)
+        return conn
+
+    def lookup(self, host, srcdir):
+        """
+        Return the last verdict for a directory as a dict, or None if it's
+        never been judged.
+        """
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT verdict, rprint, lprint, root, "
+                               "checked FROM verdicts "
+                               "WHERE host=? AND srcdir=?",
+                               (host, srcdir)).fetchone()
+        if row is None:
+            return None
+
+        return {'verdict': row[0], 'rprint': row[1], 'lprint': row[2],
+                'root': row[3], 'checked': row[4]}
+
+    def current(self, host, srcdir, rprint, lprint, period):
+        """Check whether the last verdict on a directory still stands.
+
+        Args:
+            host (:obj:`str`)
+                Instrument host.
+            srcdir (:obj:`str`)
+                Remote directory.
+            rprint (:obj:`str`)
+                Current fingerprint of the remote copy.
+            lprint (:obj:`str`)
+                Current fingerprint of the local copy.
+            period (:obj:`float`)
+                Hours after which a verdict must be re-checked regardless.
+
+        Returns:
+            verdict (:obj:`dict`)
+                The still-valid verdict, as from :meth:`lookup`, or None
+                if the directory needs to be judged again.
+        """
+        last = self.lookup(host, srcdir)
+        if last is None or rprint is None or lprint is None:
+            return None
+
+        age = (time.time() - last['checked'])/3600.
+        if age > period:
+            return None
+        elif last['rprint'] != rprint or last['lprint'] != lprint:
+            return None
+
+        return last
+
+    def record(self, host, srcdir, verdict, rprint=None, lprint=None,
+               root=None):
+        """
+        Record a fresh verdict on a directory.
+        """
+        with closing(self.connect()) as conn:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO verdicts VALUES "
+                             "(?, ?, ?, ?, ?, ?, ?)",
+                             (host, srcdir, verdict, rprint, lprint, root,
+                              time.time()))
+
+    def verdictCounts(self, host, since=None):
+        """
+        Count of each verdict for a host, optionally only those reached
+        since the given time (epoch seconds).
+        """
+        query = "SELECT verdict, COUNT(*) FROM verdicts WHERE host=?"
+        qargs = [host]
+        if since is not None:
+            query += " AND checked>=?"
+            qargs.append(since)
+        query += " GROUP BY verdict"
+
+        with closing(self.connect()) as conn:
+            rows = conn.execute(query, qargs).fetchall()
+
+        return dict(rows)
+
+    def getCursor(self, host):
+        """
+        Return the verification cursor for a host as a dict, or None if
+        there isn't one yet.
+        """
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT srcdir, offset, rprint, secperfile "
+                               "FROM cursors WHERE host=?",
+                               (host,)).fetchone()
+        if row is None:
+            return None
+
+        return {'srcdir': row[0], 'offset': row[1], 'rprint': row[2],
+                'secperfile': row[3]}
+
+    def setCursor(self, host, srcdir, offset=0, rprint=None,
+                  secperfile=None):
+        """
+        Save how far verification got on a host. Committed immediately so
+        it survives the alarm going off.
+        """
+        with closing(self.connect()) as conn:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO cursors VALUES "
+                             "(?, ?, ?, ?, ?, ?)",
+                             (host, srcdir, offset, rprint, secperfile,
+                              time.time()))
+
+    def cachedManifest(self, host, rfile):
+        """
+        Return what we knew about a remote manifest the last time we
+        downloaded it as a dict, or None if we never have.
+        """
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT size, mtime, lfile, fetched "
+                               "FROM manifests WHERE host=? AND rfile=?",
+                               (host, rfile)).fetchone()
+        if row is None:
+            return None
+
+        return {'size': row[0], 'mtime': row[1], 'lfile': row[2],
+                'fetched': row[3]}
+
+    def cacheManifest(self, host, rfile, size, mtime, lfile):
+        """
+        Remember the remote size and mtime of a manifest we just downloaded.
+        """
+        with closing(self.connect()) as conn:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO manifests VALUES "
+                             "(?, ?, ?, ?, ?, ?)",
+                             (host, rfile, size, mtime, lfile, time.time()))
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Keep our local manifests parsed, and make them before they're needed.
+
+Judging a directory means comparing Yvette's manifest against our local
+one, which used to mean parsing the local CSV again on every loop and,
+if it was missing or incomplete, hashing the archive copy right there
+while the rest of the cleanup waited. Instead:
+
+    * Parsed manifests are kept in a small LRU, keyed by path and checked
+      against the file's stat() each time, so a manifest is only parsed
+      again after it actually changes on disk
+    * Directories that are getting close to rangeOld have their local
+      manifests brought up to date by a background thread, so by the time
+      cleanRemote gets to them there's nothing left to hash
+    * If cleanRemote does find one that's incomplete, it's handed to the
+      background thread and judged on a later loop rather than hashed
+      inline
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+from ligmos import utils
+from .. import yvette
+
+
+def statSignature(path):
+    """
+    Enough of a file's stat() to tell if it's changed, or None if it's not
+    there at all.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class ManifestCache():
+    """
+    LRU of parsed (basenamed) manifests, keyed by path and invalidated
+    whenever the file on disk changes.
+    """
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, path, debug=False):
+        """
+        Return the parsed manifest at path, parsing it only if we don't
+        already have its current contents. {} if there isn't one.
+        """
+        sig = statSignature(path)
+        if sig is None:
+            with self.lock:
+                self.entries.pop(path, None)
+            return {}
+
+        with self.lock:
+            entry = self.entries.get(path, None)
+            if entry is not None and entry[0] == sig:
+                self.entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+
+        hashes = utils.hashes.readHashFile(path, basenamed=True, debug=debug)
+        # Only keep it if the file didn't change while we were reading it
+        if statSignature(path) == sig:
+            self.store(path, hashes, sig=sig)
+        with self.lock:
+            self.misses += 1
+
+        return hashes
+
+    def store(self, path, hashes, sig=None):
+        """
+        Put a manifest we already have in memory (e.g. one we just wrote)
+        into the cache, so it doesn't need to be read back in.
+        """
+        if sig is None:
+            sig = statSignature(path)
+            if sig is None:
+                return
+
+        with self.lock:
+            self.entries[path] = (sig, hashes)
+            self.entries.move_to_end(path)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+def writeLocalManifest(ldir, htype='xx64', filemask="*.fits", cache=None,
+                       debug=False):
+    """Bring the local manifest of a directory up to date.
+
+    makeManifest only hashes the files that aren't already in the
+    existing manifest, so this is cheap for anything that Wadsworth
+    hashed as it landed.
+
+    Returns:
+        hashes (:obj:`dict`)
+            The (basenamed) manifest, or {} if there was nothing to hash or
+            it couldn't be written.
+    """
+    lpfile = "%s/AListofHashes.%s" % (ldir, htype)
+    lhash = yvette.filehashing.makeManifest(ldir, htype=htype,
+                                            filetype=filemask, debug=debug)
+    if lhash is None or lhash == {}:
+        return {}
+
+    s = utils.hashes.writeHashFile(lhash, lpfile)
+    if s is False:
+        print("--> Failed to write hash file %s" % (lpfile))
+        return {}
+
+    # Without the path information so it's easier later
+    hashes = {}
+    for each in lhash:
+        hashes.update({os.path.basename(each): lhash[each]})
+    if cache is not None:
+        cache.store(lpfile, hashes)
+
+    return hashes
+
+
+class Precomputer():
+    """
+    Background thread that brings local manifests up to date, one
+    directory at a time.
+    """
+    def __init__(self, cache):
+        self.cache = cache
+        self.todo = queue.Queue()
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, ldir, htype='xx64', filemask="*.fits", debug=False):
+        """
+        Queue up a directory, unless it's already queued or in progress.
+        """
+        ldir = os.path.normpath(ldir)
+        with self.lock:
+            if ldir in self.pending:
+                return False
+            self.pending.add(ldir)
+            self.todo.put((ldir, htype, filemask, debug))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.worker,
+                                               daemon=True)
+                self.thread.start()
+
+        return True
+
+    def busy(self, ldir):
+        """
+        True if the directory is still waiting to be (or being) hashed.
+        """
+        with self.lock:
+            return os.path.normpath(ldir) in self.pending
+
+    def worker(self):
+        """
+        """
+        while True:
+            try:
+                ldir, htype, filemask, debug = self.todo.get(timeout=5.)
+            except queue.Empty:
+                # Only quit if nothing snuck in; submit() checks under
+                #   the same lock whether it needs to start a new thread
+                with self.lock:
+                    if self.todo.empty() is True:
+                        self.thread = None
+                        break
+                continue
+
+            try:
+                writeLocalManifest(ldir, htype=htype, filemask=filemask,
+                                   cache=self.cache, debug=debug)
+            except Exception as err:
+                print("--> Background hashing of %s failed: %s" %
+                      (ldir, str(err)))
+            finally:
+                with self.lock:
+                    self.pending.discard(ldir)
+                self.todo.task_done()
+
+
+# One of each per process; they need to outlive any one cleanRemote call
+cache = ManifestCache()
+precomputer = Precomputer(cache)
+
+
+def precomputeUpcoming(args, iobj, lead=2):
+    """Queue up local directories that will soon be old enough to clean.
+
+    Args:
+        args (:class:`argparse.Namespace`)
+            Parsed command line arguments.
+        iobj (:obj:`dict`)
+            Instrument object from the config.
+        lead (:obj:`int`, optional)
+            How many days before rangeOld to start. Defaults to 2.
+
+    Returns:
+        nqueued (:obj:`int`)
+            Number of directories newly queued.
+    """
+    upcoming = utils.files.getDirListing(iobj.destdir, dirmask=iobj.dirmask,
+                                         window=max(0, args.rangeOld - lead),
+                                         oldest=args.rangeOld,
+                                         comptype='older',
+                                         debug=args.debug)
+    nqueued = 0
+    for ldir in upcoming:
+        nqueued += precomputer.submit(ldir, htype=args.hashtype,
+                                      filemask=iobj.filemask,
+                                      debug=args.debug)
+
+    return nqueued
+
+
+def manifestStale(ldir, lpfile, lhash, filemask="*.fits"):
+    """
+    True if any file on local disk matching the filemask isn't in the
+    (basenamed) manifest, or has been changed since it was written.
+    """
+    mtime = os.stat(lpfile).st_mtime_ns
+    for dirpath, _, files in os.walk(ldir):
+        for each in files:
+            if yvette.filehashing.matchesMask(each, filemask) is False:
+                continue
+            if each not in lhash:
+                return True
+            try:
+                if os.stat(os.path.join(dirpath, each)).st_mtime_ns > mtime:
+                    return True
+            except OSError:
+                # Gone since we listed it; the manifest can't cover it
+                return True
+
+    return False
+
+
+def localManifest(ldir, args, iobj):
+    """Get our local manifest for a directory without waiting on hashing.
+
+    Only what's actually on our disk decides whether the manifest is
+    complete; anything in Yvette's manifest that we never got is for
+    :func:`dataservants.mandos.tasks.judgeDirectory` to flag, since no
+    amount of hashing here would make it appear.
+
+    Args:
+        ldir (:obj:`str`)
+            Local copy of the directory.
+        args (:class:`argparse.Namespace`)
+            Parsed command line arguments.
+        iobj (:obj:`dict`)
+            Instrument object from the config.
+
+    Returns:
+        lhash (:obj:`dict`)
+            The (basenamed) local manifest, or None if it's missing or
+            out of date and has been handed off to be (re)made in the
+            background.
+    """
+    lpfile = "%s/AListofHashes.%s" % (ldir, args.hashtype)
+    if precomputer.busy(ldir) is True:
+        return None
+
+    lhash = cache.read(lpfile, debug=args.debug)
+    try:
+        stale = lhash == {} or manifestStale(ldir, lpfile, lhash,
+                                             filemask=iobj.filemask)
+    except OSError:
+        # Manifest vanished out from under us
+        stale = True
+
+    if stale is True:
+        precomputer.submit(ldir, htype=args.hashtype,
+                           filemask=iobj.filemask, debug=args.debug)
+        return None
+
+    return lhash
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Fetch all of Yvette's manifests for a host in one go.
+
+cleanRemote used to open an SFTP session, get one AListofHashes file and
+close the session again for every single old directory, paying for the
+channel setup each time and downloading the same unchanged manifest on
+every loop. Instead, a few workers each open their own SFTP channel on the
+host's existing connection and split the manifests between them, so the
+stats and reads of several manifests are in flight at once rather than
+one blocking round trip after another. Only the ones whose remote size or
+mtime changed since we last got them (or whose local copy has gone
+missing) are actually downloaded, and Paramiko prefetches those so the
+reads within a file are pipelined too.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import queue
+import threading
+
+from ..wadsworth import sftpengine
+
+
+def stillCached(cached, rstat, lfile):
+    """
+    True if our local copy of a manifest is the same one that's on the
+    remote side, going by the remote size/mtime we saw when we fetched it.
+    """
+    if cached is None or os.path.exists(lfile) is False:
+        return False
+    elif cached['lfile'] != lfile:
+        return False
+    elif cached['size'] != rstat.st_size or cached['mtime'] != rstat.st_mtime:
+        return False
+    elif os.path.getsize(lfile) != rstat.st_size:
+        return False
+
+    return True
+
+
+def fetchOne(sftp, rfile, lfile, cached):
+    """
+    Stat one remote manifest and download it if our copy is out of date.
+    Returns (good, rstat, wascached); rstat is None if it couldn't be
+    stat'd at all.
+    """
+    try:
+        rstat = sftp.stat(rfile)
+    except sftpengine.sftpErrors as err:
+        print("--> Can't stat %s: %s" % (rfile, str(err)))
+        return False, None, False
+
+    if stillCached(cached, rstat, lfile) is True:
+        return True, rstat, True
+
+    try:
+        # get() prefetches, so the reads are all in flight at once
+        sftp.get(rfile, lfile, prefetch=True)
+        good = os.path.getsize(lfile) == rstat.st_size
+    except sftpengine.sftpErrors as err:
+        print("--> Failed to get %s: %s" % (rfile, str(err)))
+        good = False
+
+    return good, rstat, False
+
+
+def fetchManifests(eSSH, ledg, host, wanted, nworkers=4, debug=False):
+    """Get a batch of remote manifests, several at a time.
+
+    Args:
+        eSSH (:class:`ligmos.utils.ssh.SSHHandler`)
+            Open SSH connection to the remote host.
+        ledg (:class:`dataservants.mandos.ledger.VerdictLedger`)
+            Ledger holding the manifest cache.
+        host (:obj:`str`)
+            Instrument host, used to key the cache.
+        wanted (:obj:`list`)
+            List of [remote path, local path] pairs to fetch.
+        nworkers (:obj:`int`, optional)
+            Number of SFTP channels (and so manifests) to have going at
+            once. Defaults to 4.
+        debug (:obj:`bool`, optional)
+            Bool to trigger additional debugging outputs. Defaults to False.
+
+    Returns:
+        fetched (:obj:`dict`)
+            {remote path: bool} of whether an up to date copy of each
+            manifest is now at its local path.
+    """
+    fetched = {}
+    if wanted == []:
+        return fetched
+
+    # The ledger stays on this thread; the workers only touch the host
+    cache = dict([(rfile, ledg.cachedManifest(host, rfile))
+                  for rfile, _ in wanted])
+
+    todo = queue.Queue()
+    for each in wanted:
+        todo.put(each)
+
+    results = {}
+    lock = threading.Lock()
+
+    def drain(sftp):
+        while True:
+            try:
+                rfile, lfile = todo.get_nowait()
+            except queue.Empty:
+                break
+            ans = fetchOne(sftp, rfile, lfile, cache[rfile])
+            with lock:
+                results[rfile] = (lfile,) + ans
+
+    def worker():
+        sftp = sftpengine.openSession(eSSH)
+        if sftp is None:
+            return
+        try:
+            drain(sftp)
+        finally:
+            sftp.close()
+
+    threads = [threading.Thread(target=worker, daemon=True)
+               for i in range(max(1, min(nworkers, len(wanted))))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if todo.empty() is False:
+        # No extra channels to be had (or they all died), so finish up
+        #   the old way over the handler's own session
+        eSSH.openSFTP()
+        if getattr(eSSH, 'sftp', None) is None:
+            print("--> Couldn't open SFTP session to %s" % (host))
+        else:
+            try:
+                drain(eSSH.sftp)
+            finally:
+                eSSH.closeSFTP()
+
+    ncached = 0
+    for rfile, _ in wanted:
+        if rfile not in results:
+            continue
+        lfile, good, rstat, wascached = results[rfile]
+        if wascached is True:
+            ncached += 1
+        elif good is True:
+            ledg.cacheManifest(host, rfile, rstat.st_size,
+                               rstat.st_mtime, lfile)
+        fetched.update({rfile: good})
+
+    if debug is True:
+        print("--> %d of %d manifests from %s were already here" %
+              (ncached, len(wanted), host))
+
+    return fetched
@@ -10,6 +10,8 @@
 
 from __future__ import division, print_function, absolute_import
 
+from ..wadsworth import parseargs as wparseargs
+
 
 def extraArguments(parser):
     """ADDITIONAL command line arguments that Mandos will use.
@@ -17,7 +19,53 @@ def extraArguments(parser):
     Implies that they already contain the default set so there's no
     setup of the parser details/format/whatever.
 
-    If there are none, it just returns the parser unchanged.
+    Mandos shares Wadsworth's configuration, so it gets all of Wadsworth's
+    extra arguments too.
     """
+    parser = wparseargs.extraArguments(parser)
+
+    lstr = 'Ledger of directory verdicts, so unchanged ones are skipped'
+    parser.add_argument('--ledger', type=str, metavar='/path/to/ledger',
+                        help=lstr,
+                        default='./mandos_ledger.sqlite')
+
+    rstr = 'Hours after which a verdict is re-verified even if unchanged'
+    parser.add_argument('--reverify', type=float,
+                        help=rstr,
+                        default=24., nargs="?")
+
+    vbstr = 'Seconds per instrument to spend verifying before stopping'
+    parser.add_argument('--verifyBudget', type=float,
+                        help=vbstr,
+                        default=540., nargs="?")
+
+    vcstr = 'Maximum number of files for Yvette to verify in one go'
+    parser.add_argument('--verifyChunk', type=int,
+                        help=vcstr,
+                        default=500, nargs="?")
+
+    hwstr = 'Number of instrument hosts to check at once; 1 means in turn'
+    parser.add_argument('--hostWorkers', type=int,
+                        help=hwstr,
+                        default=4, nargs="?")
+
+    dastr = 'Actually delete deletable directories from the instrument hosts'
+    parser.add_argument('--deleteArchived', action='store_true',
+                        help=dastr,
+                        default=False)
+
+    ckstr = 'Key (shared with Yvette) used to sign batches of deletions'
+    parser.add_argument('--cleanKey', type=str, metavar='/path/to/key',
+                        help=ckstr,
+                        default='./config/mandos_clean.key')
+
+    parser.add_argument('--cleanBatch', type=int,
+                        help='Number of directories to delete per batch',
+                        default=10, nargs="?")
+
+    crstr = 'Most files per second for Yvette to delete; 0 for no limit'
+    parser.add_argument('--cleanRate', type=int,
+                        help=crstr,
+                        default=500, nargs="?")
 
     return parser
@@ -21,6 +21,155 @@ import datetime as dt
 
 from ligmos import utils
 from .. import yvette
+from ..wadsworth import journal
+from ..wadsworth import estimator
+from ..wadsworth import planner
+from . import ledger
+from . import manifests
+from . import localcache
+from . import deleter
+
+
+def dirStats(eSSH, baseYcmd, args, iobj, rdir):
+    """Cheap, stat-only listings of the remote and local copies of a
+    directory.
+
+    Returns:
+        rstats (:obj:`dict`)
+            Remote file stats, or None if Yvette didn't answer.
+        lstats (:obj:`dict`)
+            Local file stats, or None if there isn't a local copy.
+    """
+    # Quick hack, same as below, to point Yvette at the specific directory
+    oiobjsrc = iobj.srcdir
+    iobj.srcdir = rdir
+    ans = yvette.remote.commandYvetteSimple(eSSH, baseYcmd, args, iobj,
+                                            'listing', debug=args.debug)
+    iobj.srcdir = oiobjsrc
+
+    try:
+        rstats = ans['FileStats']
+    except (KeyError, TypeError):
+        rstats = None
+
+    lstats = None
+    ldir = os.path.join(iobj.destdir, os.path.basename(rdir))
+    if os.path.isdir(ldir) is True:
+        lstats = yvette.filehashing.getFileStats(ldir,
+                                                 filetype=iobj.filemask,
+                                                 debug=args.debug)
+
+    return rstats, lstats
+
+
+def dirPrints(eSSH, baseYcmd, args, iobj, rdir):
+    """Cheap, stat-only fingerprints of the remote and local copies of a
+    directory, for checking against the ledger.
+
+    Returns:
+        rprint (:obj:`str`)
+            Fingerprint of the remote copy, or None if Yvette didn't answer.
+        lprint (:obj:`str`)
+            Fingerprint of the local copy, or None if there isn't one.
+    """
+    rstats, lstats = dirStats(eSSH, baseYcmd, args, iobj, rdir)
+
+    return journal.fingerprint(rstats), journal.fingerprint(lstats)
+
+
+def resumeOffset(cursor, rdir, rprint):
+    """
+    Where verification of a directory should pick up, going by the cursor;
+    only partway in if it's the same directory and it hasn't changed.
+    """
+    if cursor is not None and cursor['srcdir'] == rdir and \
+       cursor['rprint'] == rprint:
+        return cursor['offset']
+
+    return 0
+
+
+def rotateDirs(odirs, cursor):
+    """
+    Start where we ran out of time last loop, and wrap around, so that
+    every directory gets its turn eventually.
+    """
+    if cursor is not None and cursor['srcdir'] in odirs:
+        i = odirs.index(cursor['srcdir'])
+        odirs = odirs[i:] + odirs[:i]
+
+    return odirs
+
+
+def verifyChunked(verify, ledg, args, iobj, rdir, rprint, startt):
+    """Have Yvette verify a directory in chunks that fit the time budget.
+
+    The cursor in the ledger is updated after every chunk, so if we run
+    out of time the next loop starts where this one stopped rather than
+    at the beginning.
+
+    Returns:
+        vans (:obj:`dict`)
+            Yvette's answer, with the chunks combined so it looks just like
+            a single whole-directory verify; {} if there was no answer.
+        estop (:obj:`bool`)
+            True if we ran out of time (or were told to stop) partway.
+    """
+    # Same estimator (from the same history) that --plan uses
+    est = estimator.hostEstimator(iobj.host, ledg=ledg)
+    offset = resumeOffset(ledg.getCursor(iobj.host), rdir, rprint)
+    if offset > 0:
+        print("--> Resuming verification of %s at file %d" % (rdir, offset))
+
+    checks = {'NFilesFound': 0, 'MissingFiles': [], 'UnhashedFiles': [],
+              'DifferentFiles': []}
+    estop = False
+    while True:
+        telapsed = (dt.datetime.utcnow() - startt).total_seconds()
+        nfiles = est.verifyFits(args.verifyBudget - telapsed,
+                                args.verifyChunk)
+        if nfiles == 0:
+            estop = True
+            break
+
+        # Same quick hack as srcdir, to tell Yvette which chunk to do
+        iobj.verifyOffset = offset
+        iobj.verifyNFiles = nfiles
+        t1 = dt.datetime.utcnow()
+        vans, estop = utils.common.instAction(verify, outertime=startt)
+        iobj.verifyOffset = 0
+        iobj.verifyNFiles = 0
+        print(vans)
+        if estop is True or vans == {}:
+            break
+
+        try:
+            chunk = vans['HashChecks']
+            nchecked = chunk['NFilesChecked']
+        except (KeyError, TypeError):
+            # Yvette had PROBLEMS, so don't pretend anything was checked
+            return {}, estop
+
+        checks['NFilesFound'] = chunk['NFilesFound']
+        for key in ['MissingFiles', 'UnhashedFiles', 'DifferentFiles']:
+            checks[key] += chunk[key]
+
+        tchunk = (dt.datetime.utcnow() - t1).total_seconds()
+        est.observeVerify(nchecked, tchunk)
+
+        offset += nchecked
+        ledg.setCursor(iobj.host, rdir, offset=offset, rprint=rprint,
+                       secperfile=est.secperfile)
+
+        # No point checking the rest if something's already bad
+        if nchecked == 0 or offset >= chunk['NFilesFound'] or \
+           checks['DifferentFiles'] != []:
+            break
+
+    if estop is True:
+        return {}, estop
+
+    return {'HashChecks': checks}, estop
 
 
 def cleanRemote(eSSH, baseYcmd, args, iobj):
@@ -32,8 +181,6 @@ def cleanRemote(eSSH, baseYcmd, args, iobj):
 
     # Rename to control line length
     yR = yvette.remote
-    yH = yvette.filehashing
-    uH = utils.hashes
 
     # Need to make sure our destination directory actually exists first
     ldircheck = utils.files.checkDir(iobj.destdir)
@@ -41,6 +188,13 @@ def cleanRemote(eSSH, baseYcmd, args, iobj):
         print("--> Local destination directory unreachable! Aborting!")
         return None
 
+    # Get a head start on hashing the local copies of directories that
+    #   are nearly old enough to be cleaned
+    nqueued = localcache.precomputeUpcoming(args, iobj)
+    if nqueued > 0:
+        print("--> Hashing %d upcoming local directories in the background" %
+              (nqueued))
+
     print("--> Defining custom action set for cleaning old files...")
 
     # Get the list of "old" files on the instrument host
@@ -71,21 +225,44 @@ def cleanRemote(eSSH, baseYcmd, args, iobj):
     bhfname = "AListofHashes.%s" % (args.hashtype)
     yhfname = "RemoteListofHashes.%s" % (args.hashtype)
 
+    # What we decided about each directory last time (and why)
+    ledg = ledger.VerdictLedger(args.ledger)
+
+    # Start where we ran out of time last loop
+    odirs = rotateDirs(ans['DirsOld'][1], ledg.getCursor(iobj.host))
+
     # Make Yvette verify these directories on her side
-    #   This will make manifests in directories that don't have them
-    for each in ans['DirsOld'][1]:
-        # The final answer flag
-        deletable = False
+    #   This will make manifests in directories that don't have them.
+    #   The ones that pass get their manifests fetched all together after.
+    passed = []
+    deletable = []
+    for n, each in enumerate(odirs):
+        # If neither copy has changed since we last looked, and we didn't
+        #   look too long ago, the old verdict still stands
+        rprint, lprint = dirPrints(eSSH, baseYcmd, args, iobj, each)
+        last = ledg.current(iobj.host, each, rprint, lprint, args.reverify)
+        if last is not None:
+            print("--> %s:%s unchanged; still %s" % (iobj.host, each,
+                                                     last['verdict']))
+            if last['verdict'] == ledger.DELETABLE:
+                print("--> CAN DELETE %s:%s" % (iobj.host, each))
+                deletable.append([each, last['root']])
+            continue
 
         # Now to start the checking process, multi-stage
         iobj.srcdir = each
         print("--> Getting Yvette to verify %s on %s" % (each, iobj.host))
         # print(baseYcmd, getOld.args, getOld.kwargs)
-        vans, estop = utils.common.instAction(verify, outertime=startt)
-        print(vans)
+        vans, estop = verifyChunked(verify, ledg, args, iobj, each, rprint,
+                                    startt)
         if estop is True:
             print("--> Timeout/stop reached")
             break
+
+        # Done with this one (whatever the verdict) so move the cursor on
+        cursor = ledg.getCursor(iobj.host)
+        ledg.setCursor(iobj.host, odirs[(n + 1) % len(odirs)], offset=0,
+                       secperfile=cursor['secperfile'] if cursor else None)
         # Check the status of each verification output type
         #   vans['HashChecks'] is base dict, which contains these keys:
         #     MissingFiles == Files that were hashed but now can't be found
@@ -103,9 +280,11 @@ def cleanRemote(eSSH, baseYcmd, args, iobj):
                 # Possibly have Yvette re-make the file hash on her side
                 #   after some sensible checks of filesize/date/time???
                 good = False
+                ledg.record(iobj.host, each, ledger.BADREMOTE,
+                            rprint=rprint, lprint=lprint)
 
-            # If Yvette checks out internally, get her hash file and compare
-            #   it to the local files
+            # If Yvette checks out internally, we'll get her hash file and
+            #   compare it to the local files
             if good is True and vans['HashChecks']['NFilesFound'] != 0:
                 print("--> Remote checks for remote %s pass" % (each))
                 # Try to YOLO it and see if the name of the remote dir exists
@@ -116,81 +295,7 @@ def cleanRemote(eSSH, baseYcmd, args, iobj):
                 sldircheck, sldirrp = utils.files.checkDir(specificLocalDir)
                 # print(specificLocalDir, sldircheck)
                 if sldircheck is True:
-                    # Open up our SSH file transfer pathway; if it works,
-                    #   eSSH.sftp will not be None
-                    eSSH.openSFTP()
-                    # print("Opened SFTP connection")
-                    if eSSH.sftp is not None:
-                        # This where we'll store Yvette's file locally
-                        lfile = "%s/%s" % (sldirrp, yhfname)
-                        # This is where Yvette's file is on her system
-                        rfile = "%s/%s" % (each, bhfname)
-                        # This is the file we made locally
-                        lpfile = "%s/%s" % (sldirrp, bhfname)
-
-                        # Now actually get the remote file
-                        status = eSSH.getFile(lfile, rfile)
-                        eSSH.closeSFTP()
-
-                        if status is True:
-                            # Verify the file we just got against our local one
-                            #   by comparing the hashes directly
-                            # print("File transfer complete")
-                            # print(lfile, rfile)
-                            # These are the hashes from our file from Yvette
-                            rhash = uH.readHashFile(lfile,
-                                                    basenamed=True,
-                                                    debug=args.debug)
-                            # These are the hashes that we made locally
-                            lhash = uH.readHashFile(lpfile,
-                                                    basenamed=True,
-                                                    debug=args.debug)
-                            # print(lhash)
-                            # If lhashes == {}} then we haven't made them yet
-                            #   ... so do that and write the file
-                            if lhash == {}:
-                                lhash = yH.makeManifest(sldirrp,
-                                                        htype=args.hashtype,
-                                                        filetype=iobj.filemask,
-                                                        debug=args.debug)
-                                # print("Writing hashes to %s" % (rfile))
-                                s = uH.writeHashFile(lhash,
-                                                     lpfile)
-                                if s is False:
-                                    print("--> Failed to write hash file %s" %
-                                          (lpfile))
-                                else:
-                                    # Read the hashes back in, but without the
-                                    #   path information so it's easier later
-                                    lhash = uH.readHashFile(lpfile,
-                                                            basenamed=True,
-                                                            debug=args.debug)
-
-                            # Compare the remote ones against our local ones
-                            deletable = True
-                            for key in rhash.keys():
-                                try:
-                                    comp = rhash[key] == lhash[key]
-                                    if comp is False:
-                                        # A file failed its hash check!
-                                        deletable = False
-                                    # print("File %s is %s" % (key, comp))
-                                except KeyError:
-                                    # A file doesn't exist locally!
-                                    deletable = False
-                                    print("--> %s not in local set!" % (key))
-
-                            if deletable is True:
-                                print("--> CAN DELETE %s:%s" % (iobj.host,
-                                                                each))
-                            else:
-                                print("--> Retransfer needed!")
-
-                        if status is False:
-                            # This means the file transfer failed for some
-                            #   reason (timeout?) so move on somehow
-                            print("--> File transfer failed!!")
-                            print(lfile, rfile)
+                    passed.append([each, sldirrp, rprint, lprint])
                 else:
                     # This means the directory doesn't exist locally yet,
                     #   so we'll need to transfer it over and then get it next
@@ -200,7 +305,171 @@ def cleanRemote(eSSH, baseYcmd, args, iobj):
                 if vans['HashChecks']['DifferentFiles'] == 0:
                     print("--> No files matching %s" % (iobj.filemask))
 
-    # Now that we're all done with this directory:
+    # Now that we're all done with Yvette:
     #   Reset the src directory to it's original value!
     #   Otherwise the next loop will fail miserably and you'll have a bad time
     iobj.srcdir = oiobjsrc
+
+    # Grab all of Yvette's hash files in one go; unchanged ones come
+    #   straight out of the cache
+    wanted = []
+    for each, sldirrp, _, _ in passed:
+        # This is where Yvette's file is on her system, and where
+        #   we'll store it locally
+        wanted.append(["%s/%s" % (each, bhfname),
+                       "%s/%s" % (sldirrp, yhfname)])
+    fetched = manifests.fetchManifests(eSSH, ledg, iobj.host, wanted,
+                                       debug=args.debug)
+
+    for each, sldirrp, rprint, lprint in passed:
+        rfile = "%s/%s" % (each, bhfname)
+        if fetched.get(rfile, False) is False:
+            # This means the file transfer failed for some
+            #   reason (timeout?) so move on somehow
+            print("--> File transfer failed!!")
+            print(rfile)
+            continue
+
+        if judgeDirectory(args, iobj, ledg, each, sldirrp, rprint,
+                          lprint) is True:
+            deletable.append([each, ledg.lookup(iobj.host, each)['root']])
+
+    # Only if we were explicitly told to; otherwise it's just advice
+    if args.deleteArchived is True and deletable != []:
+        deleter.deleteBatches(eSSH, baseYcmd, args, iobj, ledg, deletable)
+
+
+def judgeDirectory(args, iobj, ledg, rdir, sldirrp, rprint, lprint):
+    """Compare Yvette's manifest for a directory against our local one,
+    and record the verdict in the ledger.
+
+    Returns:
+        deletable (:obj:`bool`)
+            True if every remote file is here with a matching hash, or
+            None if our local manifest isn't ready yet.
+    """
+    # Rename to control line length
+    yH = yvette.filehashing
+
+    # This where we stored Yvette's file locally
+    lfile = "%s/RemoteListofHashes.%s" % (sldirrp, args.hashtype)
+
+    # Verify the file we just got against our local one
+    #   by comparing the hashes directly
+    # These are the hashes from our file from Yvette
+    rhash = localcache.cache.read(lfile, debug=args.debug)
+    # These are the hashes that we made locally. If they're missing or
+    #   don't cover everything we have on disk, they're (re)made in the
+    #   background and we'll come back to this directory next time
+    lhash = localcache.localManifest(sldirrp, args, iobj)
+    if lhash is None:
+        print("--> Local manifest for %s is still being made" % (sldirrp))
+        return None
+
+    # Compare the remote ones against our local ones;
+    #   if the roots match, so does everything else
+    rroot = yH.manifestRoot(rhash)
+    deletable = True
+    if rroot is not None and rroot == yH.manifestRoot(lhash):
+        rkeys = []
+    else:
+        rkeys = rhash.keys()
+    for key in rkeys:
+        try:
+            comp = rhash[key] == lhash[key]
+            if comp is False:
+                # A file failed its hash check!
+                deletable = False
+        except KeyError:
+            # A file doesn't exist locally!
+            deletable = False
+            print("--> %s not in local set!" % (key))
+
+    if deletable is True:
+        print("--> CAN DELETE %s:%s" % (iobj.host, rdir))
+        verdict = ledger.DELETABLE
+    else:
+        print("--> Retransfer needed!")
+        verdict = ledger.RETRANSFER
+    ledg.record(iobj.host, rdir, verdict, rprint=rprint, lprint=lprint,
+                root=rroot)
+
+    return deletable
+
+
+def planCleanup(eSSH, baseYcmd, args, iobj):
+    """
+    Work out what cleanRemote would verify, and how long it should take,
+    without having Yvette hash anything. The steps end up in
+    :data:`dataservants.wadsworth.planner.timeline`.
+    """
+    # Rename to control line length
+    yR = yvette.remote
+
+    getOld = utils.common.processDescription(func=yR.commandYvetteSimple,
+                                             name='GetOldDirs',
+                                             timedelay=3.,
+                                             maxtime=60.,
+                                             needSSH=True,
+                                             args=[eSSH, baseYcmd, args,
+                                                   iobj, 'findold'],
+                                             kwargs={'debug': args.debug})
+    ans, _ = utils.common.instAction(getOld)
+
+    ledg = ledger.VerdictLedger(args.ledger)
+    cursor = ledg.getCursor(iobj.host)
+    est = estimator.hostEstimator(iobj.host, ledg=ledg)
+    remaining = args.verifyBudget
+
+    for each in rotateDirs(ans['DirsOld'][1], cursor):
+        rstats, lstats = dirStats(eSSH, baseYcmd, args, iobj, each)
+        rprint = journal.fingerprint(rstats)
+        lprint = journal.fingerprint(lstats)
+        last = ledg.current(iobj.host, each, rprint, lprint, args.reverify)
+        if last is not None:
+            planner.addStep(iobj.host, each, 'skip', est=0.,
+                            note="(unchanged; still %s)" % (last['verdict']))
+            continue
+        elif rstats is None:
+            planner.addStep(iobj.host, each, 'verify', est=None,
+                            note="(no listing; can't tell)")
+            continue
+
+        # Only what's left from wherever we stopped last time
+        rfiles = sorted(rstats.keys())
+        rfiles = rfiles[resumeOffset(cursor, each, rprint):]
+        nbytes = sum([rstats[f][0] for f in rfiles])
+        nfit = est.verifyFits(remaining, len(rfiles))
+        if remaining <= 0:
+            nfit = 0
+        if nfit == 0:
+            planner.addStep(iobj.host, each, 'verify', nfiles=len(rfiles),
+                            nbytes=nbytes, est=est.verify(len(rfiles),
+                                                          nbytes),
+                            scheduled=False)
+            continue
+
+        note = ""
+        if nfit < len(rfiles):
+            note = "(%d of %d files fit)" % (nfit, len(rfiles))
+            nbytes = sum([rstats[f][0] for f in rfiles[:nfit]])
+        tverify = est.verify(nfit, nbytes)
+        planner.addStep(iobj.host, each, 'verify', nfiles=nfit,
+                        nbytes=nbytes, est=tverify, note=note)
+        if tverify is not None:
+            remaining -= tverify
+
+        # Anything local that isn't in our manifest yet gets hashed in
+        #   the background, so it doesn't count against the budget
+        if lstats is not None:
+            lpfile = os.path.join(iobj.destdir, os.path.basename(each),
+                                  "AListofHashes.%s" % (args.hashtype))
+            lhash = localcache.cache.read(lpfile, debug=args.debug)
+            unhashed = [f for f in lstats
+                        if os.path.basename(f) not in lhash]
+            if unhashed != []:
+                hbytes = sum([lstats[f][0] for f in unhashed])
+                planner.addStep(iobj.host, each, 'hash', nfiles=len(unhashed),
+                                nbytes=hbytes, est=0.,
+                                note="(local; ~%.0f s in the background)" %
+                                     (est.hash(hbytes)))
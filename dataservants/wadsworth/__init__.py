@@ -1,2 +1,12 @@
 from . import tasks
+from . import journal
+from . import landing
+from . import rsyncer
+from . import replicate
+from . import tarpipe
+from . import sftpengine
+from . import scheduler
+from . import planner
+from . import compression
+from . import estimator
 from . import parseargs
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Per-host choice of transfer compression.
+
+Most of our data is either incompressible or already fpack'd, and on a
+fast LAN link rsync -z just makes the compressor the bottleneck. So every
+so often we:
+
+    1. Have Yvette compress a sample of the instrument's files to get the
+       compression ratio and compressor speed for zlib (-z) and a fast
+       compressor (zstd level 1)
+    2. Do the next transfer uncompressed as a probe of the link speed,
+       unless we already have an estimate of it from last time
+    3. Pick whichever of none/fast/zlib should give the best throughput
+
+Hosts whose transfers are all too small to say anything about the link
+give up on the probe after a few tries and go back to zlib, which is what
+rsync always did here.
+
+The state is kept on the instrument's config object between loops, the
+same way Abu keeps its prevFileHash around.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import datetime as dt
+
+from ligmos import utils
+from .. import yvette
+
+
+# Extra rsync arguments for each of the choices. 'fast' needs rsync >= 3.2
+#   on both ends, otherwise we'll fall back to zlib for that host.
+compressArgs = {'none': [],
+                'fast': ['-z', '--compress-choice=zstd',
+                         '--compress-level=1'],
+                'zlib': ['-z']}
+
+# Everything else that we always want rsync to do; see rsyncer.subpRsync
+baseRsyncArgs = ['-arm', '--stats', '--partial']
+
+# Transfers smaller than this (bytes) are too quick to say anything about
+#   the link speed, so they're ignored when updating it
+minProbeBytes = 2**23
+
+# Uncompressed transfers to try before giving up on measuring the link
+maxProbes = 3
+
+# Bits of an rsync error that mean it (or the far end) doesn't understand
+#   the fast compression arguments, as opposed to some other failure
+fastErrors = ['unknown option', 'compress-choice', 'compress-level',
+              'compress name']
+
+
+def rsyncArgs(choice):
+    """
+    rsync arguments for the given compression choice.
+    """
+    return baseRsyncArgs + compressArgs[choice]
+
+
+def predictRates(link, samp):
+    """Predict the effective (uncompressed) throughput of each choice.
+
+    Compressed transfers go no faster than either the compressor, or the
+    link scaled up by the compression ratio.
+
+    Args:
+        link (:obj:`float`)
+            Link speed, in MiB/s.
+        samp (:obj:`dict`)
+            Compression sample from
+            :func:`dataservants.yvette.compress.sampleCompressibility`.
+
+    Returns:
+        rates (:obj:`dict`)
+            Predicted MiB/s for each of the choices.
+    """
+    rates = {'none': link}
+    for choice, key in [['fast', 'fast'], ['zlib', 'zlib']]:
+        try:
+            ratio = max(samp['%sRatio' % (key)], 1e-3)
+            rates.update({choice: min(samp['%sMBps' % (key)], link/ratio)})
+        except KeyError:
+            pass
+
+    return rates
+
+
+def chooseCompression(link, samp, nofast=False):
+    """
+    Pick the choice with the best predicted throughput. Ties go to the
+    simpler option (none, then fast, then zlib).
+    """
+    rates = predictRates(link, samp)
+    if nofast is True:
+        rates.pop('fast', None)
+
+    best = 'none'
+    for choice in ['fast', 'zlib']:
+        if choice in rates and rates[choice] > rates[best]*1.05:
+            best = choice
+
+    return best, rates
+
+
+def fastUnsupported(stats):
+    """
+    True if a failed transfer's error (stats['error'], or just a string)
+    says the fast compression arguments weren't understood, so they're
+    never going to work with this host.
+    """
+    if isinstance(stats, dict):
+        stats = stats.get('error', None)
+    if isinstance(stats, str) is False:
+        return False
+
+    errstr = stats.lower()
+    for each in fastErrors:
+        if each in errstr:
+            return True
+
+    # rsync's own exit code for a syntax or usage error, when it didn't
+    #   say anything more useful than that
+    return errstr.endswith("returned code 1")
+
+
+def currentChoice(eSSH, baseYcmd, args, iobj, srcdir, db=None):
+    """Figure out which compression to use for the next transfer.
+
+    If it's been more than ``args.compressRecheck`` hours since we last
+    looked (or we've never looked) then ask Yvette for a new sample from
+    ``srcdir`` and start a new link probe.
+
+    Returns:
+        choice (:obj:`str`)
+            One of 'none', 'fast' or 'zlib'.
+    """
+    if args.compress != 'auto':
+        return args.compress
+
+    state = getattr(iobj, 'compressState', None)
+    now = dt.datetime.utcnow()
+    if state is not None:
+        age = (now - state['when']).total_seconds()/3600.
+        if age < args.compressRecheck:
+            return state['choice']
+
+    # Quick hack, same as Mandos, to point Yvette at the specific directory
+    oiobjsrc = iobj.srcdir
+    iobj.srcdir = srcdir
+    ans = yvette.remote.commandYvetteSimple(eSSH, baseYcmd, args, iobj,
+                                            'compressibility',
+                                            debug=args.debug)
+    iobj.srcdir = oiobjsrc
+
+    try:
+        samp = ans['Compressibility']
+    except (KeyError, TypeError):
+        samp = {}
+
+    nofast = False
+    link = None
+    if state is not None:
+        nofast = state.get('nofast', False)
+        link = state.get('link', None)
+
+    if samp == {}:
+        # Nothing to go on, so stick with what rsync always did; remember
+        #   that, so we don't ask again for every directory until it's
+        #   time to recheck anyway
+        print("--> No compression sample for %s; using zlib" % (iobj.host))
+        iobj.compressState = {'when': now, 'samp': {}, 'link': link,
+                              'choice': 'zlib', 'probing': False,
+                              'nofast': nofast}
+        return 'zlib'
+
+    print("--> Sampled compressibility on %s: %s" % (iobj.host, samp))
+    if link is not None:
+        # The link doesn't change nearly as much as the data does, so keep
+        #   using what we know of it; it's still updated by any
+        #   uncompressed transfers from here on
+        choice, rates = chooseCompression(link, samp, nofast=nofast)
+        print("--> Compression for %s is now %s (%s)" % (iobj.host,
+                                                         choice, rates))
+        iobj.compressState = {'when': now, 'samp': samp, 'link': link,
+                              'choice': choice, 'probing': False,
+                              'nprobes': 0, 'nofast': nofast}
+        return choice
+
+    # Do the next transfer(s) uncompressed to find out how fast the link is
+    iobj.compressState = {'when': now, 'samp': samp, 'link': None,
+                          'choice': 'none', 'probing': True,
+                          'nprobes': 0, 'nofast': nofast}
+
+    return 'none'
+
+
+def updateState(iobj, choice, ret, stats, telapsed, db=None):
+    """Fold the results of a transfer back into the compression state.
+
+    Uncompressed transfers tell us about the link speed; once we know
+    that, finish the probe and make (and record) a decision.
+
+    Returns:
+        gain (:obj:`float`)
+            Effective throughput of this transfer relative to the
+            (estimated) uncompressed link speed, or None if unknown.
+    """
+    state = getattr(iobj, 'compressState', None)
+    if state is None:
+        return None
+
+    if ret != 0:
+        # Older rsyncs don't know about --compress-choice; stop asking,
+        #   but only if that's actually why it failed
+        if choice == 'fast' and fastUnsupported(stats) is True:
+            print("--> Fast compression unsupported on %s; disabling it" %
+                  (iobj.host))
+            state['nofast'] = True
+            state['choice'] = 'zlib'
+        return None
+
+    if isinstance(stats, dict) is False or telapsed <= 0:
+        return None
+
+    wire = stats.get('totrecv', 0.)
+    effective = stats.get('totxfersize', 0.)/telapsed/2.**20
+    if choice == 'none' and wire >= minProbeBytes:
+        rate = wire/telapsed/2.**20
+        if state['link'] is None:
+            state['link'] = rate
+        else:
+            # Running average so one slow transfer doesn't swing it
+            state['link'] = 0.7*state['link'] + 0.3*rate
+
+    if state['probing'] is True and state['link'] is None and \
+       choice == 'none':
+        state['nprobes'] = state.get('nprobes', 0) + 1
+        if state['nprobes'] >= maxProbes:
+            # Never enough data in one go to tell; don't stay uncompressed
+            #   on the off chance, just do what we always did
+            print("--> Couldn't measure the link to %s after %d tries; "
+                  "using zlib" % (iobj.host, state['nprobes']))
+            state['choice'] = 'zlib'
+            state['probing'] = False
+            state['when'] = dt.datetime.utcnow()
+
+    if state['probing'] is True and state['link'] is not None:
+        best, rates = chooseCompression(state['link'], state['samp'],
+                                        nofast=state['nofast'])
+        state['choice'] = best
+        state['probing'] = False
+        state['when'] = dt.datetime.utcnow()
+        print("--> Compression for %s is now %s (%s)" % (iobj.host,
+                                                         best, rates))
+
+        meas = ['CompressionChoice']
+        tags = {'host': iobj.host}
+        fields = {'choice': best, 'linkMBps': state['link']}
+        for each in rates:
+            fields.update({'predicted_%s' % (each): rates[each]})
+        for each in ['zlibRatio', 'fastRatio', 'zlibMBps', 'fastMBps']:
+            if each in state['samp']:
+                fields.update({each: state['samp'][each]})
+
+        packet = utils.packetizer.makeInfluxPacket(meas=meas,
+                                                   ts=dt.datetime.utcnow(),
+                                                   tags=tags,
+                                                   fields=fields)
+        if db is not None:
+            db.singleCommit(packet, table=iobj.tablename, close=True)
+
+    gain = None
+    if state['link'] is not None and state['link'] > 0 and \
+       stats.get('totxfersize', 0.) >= minProbeBytes:
+        gain = effective/state['link']
+
+    return gain
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""How long things are going to take, from how long they've taken before.
+
+One cost model for everything, fed by cheap stat-only listings and by the
+throughput history in Wadsworth's journal and Mandos' ledger. The real
+runs use it to decide how to split up their work (which transfers fit
+in the budget, how big a chunk Yvette should verify next) and the
+planning mode uses exactly the same numbers to predict what those runs
+will do, so the plan and the reality can't drift apart.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+
+# Rough per-file costs (seconds) on top of the raw bytes/throughput; one
+#   for each file that actually moves, and one for each file rsync has
+#   to look at to decide whether it needs to move
+perFileXfer = 0.02
+perFileCheck = 0.001
+
+# Throughput (bytes/s) to assume for a host we have no history for
+defaultRate = 10.*2**20
+
+# Hashing throughput (bytes/s) to assume when there's no history
+defaultHashRate = 200.*2**20
+
+
+class Estimator():
+    """
+    Cost model for one host's transfers, verification and hashing.
+    """
+    def __init__(self, rate=None, secperfile=None, hashrate=None):
+        if rate is None or rate <= 0:
+            rate = defaultRate
+        if hashrate is None or hashrate <= 0:
+            hashrate = defaultHashRate
+        # Network throughput, bytes/s
+        self.rate = rate
+        # Seconds per file for Yvette to verify, if we've seen her do it
+        self.secperfile = secperfile
+        # Local hashing throughput, bytes/s
+        self.hashrate = hashrate
+
+    def transferFile(self, nbytes):
+        """
+        Seconds to move a single file of the given size.
+        """
+        return perFileXfer + nbytes/self.rate
+
+    def transfer(self, nlisted, nfiles, nbytes):
+        """
+        Seconds to move nfiles (nbytes in total) out of a directory of
+        nlisted files.
+        """
+        return nlisted*perFileCheck + nfiles*perFileXfer + nbytes/self.rate
+
+    def verify(self, nfiles, nbytes=None):
+        """
+        Seconds for Yvette to verify nfiles (nbytes in total), or None if
+        there's no way to know yet.
+        """
+        if self.secperfile is not None and self.secperfile > 0:
+            return nfiles*self.secperfile
+        elif nbytes is not None:
+            return nfiles*perFileCheck + nbytes/self.hashrate
+
+        return None
+
+    def verifyFits(self, remaining, maxfiles):
+        """
+        Number of files Yvette can comfortably verify in the remaining
+        time, but never more than maxfiles. With no history, just maxfiles.
+        """
+        if self.secperfile is None or self.secperfile <= 0:
+            return maxfiles
+
+        nfiles = int(0.8*remaining/self.secperfile)
+
+        return max(0, min(nfiles, maxfiles))
+
+    def observeVerify(self, nfiles, elapsed):
+        """
+        Fold a freshly timed verification chunk into the per-file estimate.
+        """
+        if nfiles <= 0:
+            return self.secperfile
+
+        rate = elapsed/nfiles
+        if self.secperfile is None:
+            self.secperfile = rate
+        else:
+            self.secperfile = 0.7*self.secperfile + 0.3*rate
+
+        return self.secperfile
+
+    def hash(self, nbytes):
+        """
+        Seconds to hash nbytes locally.
+        """
+        return nbytes/self.hashrate
+
+
+def hostEstimator(host, jrnl=None, ledg=None):
+    """Build the estimator for a host from whatever history we have.
+
+    Args:
+        host (:obj:`str`)
+            Instrument host.
+        jrnl (:class:`dataservants.wadsworth.journal.TransferJournal`)
+            Wadsworth's journal, for the transfer throughput.
+        ledg (:class:`dataservants.mandos.ledger.VerdictLedger`)
+            Mandos' ledger, for the verification speed.
+
+    Returns:
+        est (:class:`Estimator`)
+    """
+    rate, secperfile = None, None
+    if jrnl is not None:
+        rate = jrnl.throughput(host)
+    if ledg is not None:
+        cursor = ledg.getCursor(host)
+        if cursor is not None:
+            secperfile = cursor['secperfile']
+
+    return Estimator(rate=rate, secperfile=secperfile)
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""On-disk journal of what Wadsworth has (and hasn't) transferred.
+
+If Wadsworth gets a SIGTERM or the alarm fires partway through buttleData,
+this is how the next run knows which directories were already finished
+and verified, and which ones were cut off and need to go first.
+
+It's just a small SQLite file; each call opens and closes its own
+connection so that it doesn't matter which process or thread is asking.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import time
+import sqlite3
+import statistics
+from contextlib import closing
+
+
+# Directory states, roughly in the order they happen
+PENDING = 'pending'
+TRANSFERRING = 'transferring'
+DONE = 'done'
+VERIFIED = 'verified'
+FAILED = 'failed'
+
+schema = ["""CREATE TABLE IF NOT EXISTS dirs (
+                 host TEXT NOT NULL,
+                 srcdir TEXT NOT NULL,
+                 state TEXT NOT NULL,
+                 fingerprint TEXT,
+                 nfiles INTEGER,
+                 nbytes INTEGER,
+                 updated REAL,
+                 PRIMARY KEY (host, srcdir))""",
+          """CREATE TABLE IF NOT EXISTS files (
+                 host TEXT NOT NULL,
+                 srcdir TEXT NOT NULL,
+                 relpath TEXT NOT NULL,
+                 size INTEGER,
+                 mtime REAL,
+                 digest TEXT,
+                 state TEXT NOT NULL,
+                 updated REAL,
+                 PRIMARY KEY (host, srcdir, relpath))""",
+          """CREATE TABLE IF NOT EXISTS transfers (
+                 host TEXT NOT NULL,
+                 srcdir TEXT NOT NULL,
+                 transport TEXT,
+                 compression TEXT,
+                 nfiles INTEGER,
+                 nbytes INTEGER,
+                 duration REAL,
+                 retcode INTEGER,
+                 finished REAL)""",
+          """CREATE TABLE IF NOT EXISTS mirrors (
+                 host TEXT NOT NULL,
+                 srcdir TEXT NOT NULL,
+                 mirror TEXT NOT NULL,
+                 state TEXT NOT NULL,
+                 nfailed INTEGER,
+                 updated REAL,
+                 PRIMARY KEY (host, srcdir, mirror))"""]
+
+
+def fingerprint(fstats):
+    """Cheap fingerprint of a remote directory's contents.
+
+    Built from the number of files, their total size and the newest
+    modification time, so it changes whenever a file is added, grows,
+    or is rewritten.
+
+    Args:
+        fstats (:obj:`dict`)
+            Remote file stats, as returned by
+            :func:`dataservants.yvette.filehashing.getFileStats`.
+
+    Returns:
+        fprint (:obj:`str`)
+            Fingerprint string, or None if there were no stats.
+    """
+    if fstats is None:
+        return None
+
+    nbytes = sum([fstats[each][0] for each in fstats])
+    if fstats != {}:
+        newest = max([fstats[each][1] for each in fstats])
+    else:
+        newest = 0
+
+    fprint = "%d:%d:%d" % (len(fstats), nbytes, int(newest))
+
+    return fprint
+
+
+class TransferJournal():
+    """
+    Journal of directory and file transfer states, keyed by host and
+    remote directory.
+    """
+    def __init__(self, dbpath):
+        self.dbpath = os.path.abspath(os.path.expanduser(dbpath))
+        dname = os.path.dirname(self.dbpath)
+        if os.path.isdir(dname) is False:
+            os.makedirs(dname, exist_ok=True)
+
+        with closing(self.connect()) as conn:
+            with conn:
+                for each in schema:
+                    conn.execute(each)
+
+    def connect(self):
+        """
+        """
+        conn = sqlite3.connect(self.dbpath, timeout=30.)
+        return conn
+
+    def dirState(self, host, srcdir):
+        """
+        Return (state, fingerprint) for the given directory, or
+        (None, None) if we've never seen it.
+        """
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT state, fingerprint FROM dirs "
+                               "WHERE host=? AND srcdir=?",
+                               (host, srcdir)).fetchone()
+        if row is None:
+            return None, None
+
+        return row[0], row[1]
+
+    def isFinished(self, host, srcdir, fprint):
+        """
+        True if the directory was already transferred and verified, and
+        hasn't changed (according to its fingerprint) since then.
+        """
+        state, oldprint = self.dirState(host, srcdir)
+        if fprint is None:
+            return False
+
+        return state == VERIFIED and oldprint == fprint
+
+    def markDir(self, host, srcdir, state, fprint=None,
+                nfiles=None, nbytes=None):
+        """
+        Record the current state of a directory transfer. This is committed
+        immediately so it survives whatever happens next.
+        """
+        with closing(self.connect()) as conn:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO dirs VALUES "
+                             "(?, ?, ?, ?, ?, ?, ?)",
+                             (host, srcdir, state, fprint,
+                              nfiles, nbytes, time.time()))
+
+    def markFiles(self, host, srcdir, entries):
+        """
+        Record the state of a bunch of files in one go.
+
+        entries is a list of (relpath, size, mtime, digest, state) tuples;
+        digest can be None if it isn't known.
+        """
+        now = time.time()
+        rows = [(host, srcdir) + tuple(each) + (now,) for each in entries]
+        with closing(self.connect()) as conn:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO files VALUES "
+                                 "(?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def fileDigests(self, host, srcdir):
+        """
+        Return {relpath: digest} for all the files in a directory that we
+        know the digest of.
+        """
+        with closing(self.connect()) as conn:
+            rows = conn.execute("SELECT relpath, digest FROM files "
+                                "WHERE host=? AND srcdir=? "
+                                "AND digest IS NOT NULL",
+                                (host, srcdir)).fetchall()
+
+        return dict(rows)
+
+    def markMirror(self, host, srcdir, mirror, state, nfailed=0):
+        """
+        Record how replicating a directory to one of its mirrors went;
+        VERIFIED if every file made it there intact, FAILED otherwise.
+        """
+        with closing(self.connect()) as conn:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO mirrors VALUES "
+                             "(?, ?, ?, ?, ?, ?)",
+                             (host, srcdir, mirror, state, nfailed,
+                              time.time()))
+
+    def laggingMirrors(self, host, srcdir):
+        """
+        List of mirrors that the directory didn't fully make it to last
+        time, and so still need catching up.
+        """
+        with closing(self.connect()) as conn:
+            rows = conn.execute("SELECT mirror FROM mirrors WHERE host=? "
+                                "AND srcdir=? AND state=?",
+                                (host, srcdir, FAILED)).fetchall()
+
+        return [each[0] for each in rows]
+
+    def unfinishedDirs(self, host):
+        """
+        List of directories on the host that were cut off partway through
+        their transfer, e.g. because Wadsworth was killed. Ones that were
+        only ever queued (pending) or that failed aren't included.
+        """
+        with closing(self.connect()) as conn:
+            rows = conn.execute("SELECT srcdir FROM dirs WHERE host=? "
+                                "AND state=?",
+                                (host, TRANSFERRING)).fetchall()
+
+        return [each[0] for each in rows]
+
+    def retryAfter(self, host, srcdir, backoff=600., maxbackoff=86400.):
+        """
+        Time (epoch seconds) before which a directory that keeps failing
+        shouldn't be tried again; 0 if it isn't failing. The wait doubles
+        with each failure in a row, starting at backoff seconds and
+        going no higher than maxbackoff.
+        """
+        with closing(self.connect()) as conn:
+            rows = conn.execute("SELECT retcode, finished FROM transfers "
+                                "WHERE host=? AND srcdir=? "
+                                "ORDER BY finished DESC LIMIT 32",
+                                (host, srcdir)).fetchall()
+
+        nfails = 0
+        for retcode, _ in rows:
+            if retcode == 0:
+                break
+            nfails += 1
+        if nfails == 0:
+            return 0
+
+        wait = min(backoff*2**(nfails - 1), maxbackoff)
+
+        return rows[0][1] + wait
+
+    def recordTransfer(self, host, srcdir, transport, compression,
+                       nfiles, nbytes, duration, retcode):
+        """
+        Keep a history of how long each transfer took, so we can estimate
+        how long the next ones will take.
+        """
+        with closing(self.connect()) as conn:
+            with conn:
+                conn.execute("INSERT INTO transfers VALUES "
+                             "(?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             (host, srcdir, transport, compression,
+                              nfiles, nbytes, duration, retcode,
+                              time.time()))
+
+    def throughput(self, host, transport=None, nrecent=20, minbytes=2**20):
+        """
+        Median throughput (bytes/s) of the most recent successful transfers
+        from a host that were big enough to be meaningful. Returns None if
+        there's no such history yet.
+        """
+        query = "SELECT nbytes, duration FROM transfers WHERE host=? " + \
+                "AND retcode=0 AND nbytes>=? AND duration>0"
+        qargs = [host, minbytes]
+        if transport is not None:
+            query += " AND transport=?"
+            qargs.append(transport)
+        query += " ORDER BY finished DESC LIMIT ?"
+        qargs.append(nrecent)
+
+        with closing(self.connect()) as conn:
+            rows = conn.execute(query, qargs).fetchall()
+
+        if rows == []:
+            return None
+
+        return statistics.median([each[0]/each[1] for each in rows])
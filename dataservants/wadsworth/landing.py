@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Hash files as they land on the archive side.
+
+Mandos used to run makeManifest over the archive copy long after Wadsworth
+wrote it, which is a second full read of every byte. Instead, hash each
+file the moment the transfer finishes with it (while it's still warm in
+the page cache) and write our local manifest right away, so that by the
+time Mandos comes around the only thing left to do is compare manifests.
+
+The tar stream already hashes everything in-line (see
+:func:`dataservants.wadsworth.tarpipe.receiveMember`), so this is mostly
+for the rsync side of things.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import queue
+import threading
+
+from ligmos import utils
+from .. import yvette
+
+
+# rsync --out-format prefix so we can pick our lines out of the rest of
+#   its output. %b (bytes transferred) is in there on purpose: it forces
+#   rsync to log the file *after* it's been received and renamed into
+#   place rather than before the transfer starts.
+outPrefix = "WADSLANDED"
+outFormat = "--out-format=%s %%b %%n" % (outPrefix)
+
+
+def parseLanded(line):
+    """
+    Pull the file name out of one of our rsync --out-format lines,
+    returning None if the line isn't one of ours.
+    """
+    if isinstance(line, bytes) is True:
+        line = line.decode("utf-8", errors='replace')
+
+    if line.startswith(outPrefix + " ") is False:
+        return None
+
+    try:
+        _, _, fname = line.rstrip("\n").split(" ", 2)
+    except ValueError:
+        return None
+
+    return fname
+
+
+def statKey(lfile):
+    """
+    Enough of a file's stat() to tell whether it changed under us.
+    """
+    st = os.stat(lfile)
+
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class LandingHasher():
+    """
+    Background hasher that's fed the names of files as the transfer
+    finishes with them.
+
+    Only files matching ``filemask`` are hashed, so that the resulting
+    manifest contains the same things that Yvette's does. A file is only
+    hashed straight away if it already has the size and modification time
+    that the remote listing (``expected``) says it should, and didn't
+    change while it was being read; anything else (including everything,
+    if there's no listing) waits until :meth:`finish`, once the transfer
+    is over and the final file is surely in place.
+    """
+    def __init__(self, rootdir, filemask, htype='xx64', bsize=2**22,
+                 expected=None, debug=False):
+        self.rootdir = rootdir
+        self.filemask = filemask
+        self.htype = htype
+        self.bsize = bsize
+        self.expected = expected
+        self.debug = debug
+        self.digests = {}
+        self.deferred = []
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.worker, daemon=True)
+        self.thread.start()
+
+    def landed(self, fname):
+        """
+        Callback for the transfer; fname is relative to ``rootdir``.
+        """
+        lfile = os.path.join(self.rootdir, fname)
+        if fname.endswith("/"):
+            return
+        if yvette.filehashing.matchesMask(lfile, self.filemask) is False:
+            return
+        if self.expected is None:
+            self.deferred.append(lfile)
+        else:
+            self.queue.put(lfile)
+
+    def matchesListing(self, skey, lfile):
+        """
+        True if the file looks like the one in the remote listing, or if
+        there's no listing entry to check it against.
+        """
+        if self.expected is None or lfile not in self.expected:
+            return True
+        size, mtime = self.expected[lfile]
+
+        return skey[1] == size and int(skey[2]//10**9) == int(mtime)
+
+    def hashOne(self, lfile, final=False):
+        """
+        Hash a file if it's (by all appearances) complete. Returns False
+        if it should be tried again once the transfer is over.
+        """
+        try:
+            skey = statKey(lfile)
+            if self.matchesListing(skey, lfile) is False:
+                if final is True:
+                    print("--> %s doesn't match the remote listing; "
+                          "not hashing it" % (lfile))
+                return final
+            hasher = utils.hashes.hashfunc(lfile, htype=self.htype,
+                                           bsize=self.bsize,
+                                           debug=self.debug)
+            if statKey(lfile) != skey:
+                # Changed while we were reading it
+                return final
+            self.digests.update({lfile: hasher.hexdigest()})
+        except (OSError, ValueError) as err:
+            # It'll just get picked up by makeManifest later instead
+            print("--> Couldn't hash %s: %s" % (lfile, str(err)))
+
+        return True
+
+    def worker(self):
+        """
+        """
+        while True:
+            lfile = self.queue.get()
+            if lfile is None:
+                break
+            if self.hashOne(lfile) is False:
+                self.deferred.append(lfile)
+
+    def finish(self):
+        """
+        Wait for the queue to drain, hash whatever had to wait until the
+        transfer was over, and return {fullpath: digest} for all the files
+        that were hashed. Only call this once the transfer has exited.
+        """
+        self.queue.put(None)
+        self.thread.join()
+
+        for lfile in self.deferred:
+            self.hashOne(lfile, final=True)
+        self.deferred = []
+
+        return self.digests
+
+
+def updateManifest(localdir, digests, htype='xx64', debug=False):
+    """Merge freshly computed hashes into a local directory's manifest.
+
+    Args:
+        localdir (:obj:`str`)
+            Local copy of a remote directory.
+        digests (:obj:`dict`)
+            Hashes of newly received files, keyed to their full local path.
+        htype (:obj:`str`, optional)
+            Hashing function type. Defaults to 'xx64'.
+        debug (:obj:`bool`, optional)
+            Bool to trigger additional debugging outputs. Defaults to False.
+
+    Returns:
+        status (:obj:`bool`)
+            True if the manifest was written.
+    """
+    if digests == {}:
+        return True
+
+    hfname = os.path.join(localdir, "AListofHashes.%s" % (htype))
+    hashes = utils.hashes.readHashFile(hfname, basenamed=False)
+    hashes.update(digests)
+    status = utils.hashes.writeHashFile(hashes, hfname, debug=debug)
+    if status is False:
+        print("--> Failed to write hash file %s" % (hfname))
+    elif debug is True:
+        print("--> Added %d hashes to %s" % (len(digests), hfname))
+
+    return status
+
+
+def fetchRemoteManifest(eSSH, srcdir, localdir, htype='xx64',
+                        debug=False):
+    """
+    Grab Yvette's manifest for srcdir (if she has one) over SFTP, saving it
+    as RemoteListofHashes the same way Mandos does. Returns the hashes keyed
+    by file basename, or {} if there wasn't one to get.
+    """
+    rfile = "%s/AListofHashes.%s" % (os.path.normpath(srcdir), htype)
+    lfile = os.path.join(localdir, "RemoteListofHashes.%s" % (htype))
+
+    eSSH.openSFTP()
+    if eSSH.sftp is None:
+        return {}
+    status = eSSH.getFile(lfile, rfile)
+    eSSH.closeSFTP()
+
+    if status is False:
+        return {}
+
+    return utils.hashes.readHashFile(lfile, basenamed=True, debug=debug)
+
+
+def compareManifest(rhashes, digests, htype='xx64', debug=False):
+    """
+    Check freshly computed hashes against Yvette's manifest (keyed by file
+    basename, as from readHashFile with basenamed=True). Returns the list
+    of local files that don't match.
+
+    Any mismatch is hashed once more before it's believed, so a digest
+    that was somehow taken from a file still being written can't get a
+    good file thrown away; if the second look matches, the digest is
+    corrected in place.
+    """
+    bad = []
+    for lfile in digests:
+        rhash = rhashes.get(os.path.basename(lfile), None)
+        if rhash is None or rhash == digests[lfile]:
+            continue
+
+        try:
+            hasher = utils.hashes.hashfunc(lfile, htype=htype, debug=debug)
+            again = hasher.hexdigest()
+        except (OSError, ValueError) as err:
+            print("--> Couldn't rehash %s: %s" % (lfile, str(err)))
+            again = None
+
+        if again == rhash:
+            digests[lfile] = again
+        else:
+            bad.append(lfile)
+
+    return bad
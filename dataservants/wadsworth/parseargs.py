@@ -40,4 +40,63 @@ def extraArguments(parser):
                         help='Type of hash to use for file integrity checks',
                         default="xx64")
 
+    parser.add_argument('--transport', type=str,
+                        choices=['auto', 'rsync', 'tar', 'sftp'],
+                        help='How to move data; auto picks per directory',
+                        default="auto")
+
+    tfstr = 'Minimum number of needed files before considering tar transport'
+    parser.add_argument('--tarMinFiles', type=int,
+                        help=tfstr,
+                        default=500, nargs="?")
+
+    tsstr = 'Maximum median file size (KiB) to still consider tar transport'
+    parser.add_argument('--tarMaxSize', type=int,
+                        help=tsstr,
+                        default=1024, nargs="?")
+
+    parser.add_argument('--tarZstd', action='store_true',
+                        help='Compress tar transfers with zstd',
+                        default=False)
+
+    parser.add_argument('--sftpWorkers', type=int,
+                        help='Number of files to pull at once over SFTP',
+                        default=4, nargs="?")
+
+    parser.add_argument('--compress', type=str,
+                        choices=['auto', 'none', 'fast', 'zlib'],
+                        help='Transfer compression; auto picks per host',
+                        default="auto")
+
+    crstr = 'Hours between re-evaluating transfer compression per host'
+    parser.add_argument('--compressRecheck', type=float,
+                        help=crstr,
+                        default=24., nargs="?")
+
+    jstr = 'Journal of transfer states, used to resume after restarts'
+    parser.add_argument('--journal', type=str, metavar='/path/to/journal',
+                        help=jstr,
+                        default='./wadsworth_journal.sqlite')
+
+    fstr = 'Minutes to wait before retrying a failed directory; ' + \
+           'doubles with each failure in a row'
+    parser.add_argument('--failBackoff', type=float,
+                        help=fstr,
+                        default=10., nargs="?")
+
+    bstr = 'Seconds per instrument to spend on transfers before deferring'
+    parser.add_argument('--budget', type=float,
+                        help=bstr,
+                        default=540., nargs="?")
+
+    hstr = 'Hardlink (rather than copy) into mirrordirs on the same volume'
+    parser.add_argument('--mirrorHardlink', action='store_true',
+                        help=hstr,
+                        default=False)
+
+    pstr = 'Print the predicted timeline of one pass without doing any of it'
+    parser.add_argument('--plan', action='store_true',
+                        help=pstr,
+                        default=False)
+
     return parser
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Predicted timeline of a Wadsworth or Mandos pass, without doing it.
+
+With --plan, the usual per-instrument actions are swapped for planning
+ones that do the same cheap stat-only scans and make the same scheduling
+decisions (using :mod:`dataservants.wadsworth.estimator`), but stop short
+of moving, hashing or comparing anything. Each of them adds its steps
+here, and the whole timeline is printed at the end of the pass.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+from collections import OrderedDict
+
+
+# Steps from this pass, in the order they'd happen
+timeline = []
+
+
+def addStep(host, srcdir, action, nfiles=0, nbytes=0, est=0.,
+            scheduled=True, note=''):
+    """Add a step to the predicted timeline.
+
+    Args:
+        host (:obj:`str`)
+            Instrument host.
+        srcdir (:obj:`str`)
+            Remote directory the step is about.
+        action (:obj:`str`)
+            What would be done, e.g. 'transfer', 'verify' or 'skip'.
+        nfiles (:obj:`int`, optional)
+            Number of files involved.
+        nbytes (:obj:`int`, optional)
+            Number of bytes involved.
+        est (:obj:`float`, optional)
+            Predicted duration in seconds, or None if unknown.
+        scheduled (:obj:`bool`, optional)
+            False if it wouldn't fit and would be left for a later loop.
+        note (:obj:`str`, optional)
+            Anything else worth saying.
+    """
+    timeline.append({'host': host, 'srcdir': srcdir, 'action': action,
+                     'nfiles': nfiles, 'nbytes': nbytes, 'est': est,
+                     'scheduled': scheduled, 'note': note})
+
+
+def hostTotals(steps=None):
+    """
+    Predicted seconds of scheduled work per host, in timeline order.
+    """
+    if steps is None:
+        steps = timeline
+
+    totals = OrderedDict()
+    for step in steps:
+        host = step['host']
+        totals.setdefault(host, 0.)
+        if step['scheduled'] is True and step['est'] is not None:
+            totals[host] += step['est']
+
+    return totals
+
+
+def printTimeline(budget=None, steps=None):
+    """
+    Print the predicted timeline, host by host, with a start and end
+    offset for each scheduled step and a note of what would be deferred.
+    """
+    if steps is None:
+        steps = timeline
+
+    totals = hostTotals(steps)
+    print("=" * 72)
+    print("Predicted timeline (nothing was actually done)")
+    for host in totals:
+        print("  %s:" % (host))
+        t = 0.
+        for step in [s for s in steps if s['host'] == host]:
+            if step['scheduled'] is False:
+                when = "   deferred   "
+            elif step['est'] is None:
+                when = "%6.0f s  +  ?" % (t)
+            else:
+                when = "%6.0f-%6.0f s" % (t, t + step['est'])
+                t += step['est']
+            print("    %s  %-8s %s (%d files, %.1f MiB) %s" %
+                  (when, step['action'], step['srcdir'], step['nfiles'],
+                   step['nbytes']/2**20, step['note']))
+        fits = ""
+        if budget is not None and totals[host] > budget:
+            fits = " (over the %.0f s budget!)" % (budget)
+        print("    total %.0f s%s" % (totals[host], fits))
+
+    serial = sum([totals[h] for h in totals])
+    longest = max(list(totals.values()) + [0.])
+    print("  %.0f s one host after another; %.0f s if all at once" %
+          (serial, longest))
+    print("=" * 72)
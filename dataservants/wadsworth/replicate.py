@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Replicate freshly transferred data to secondary local archive targets.
+
+Every night gets mirrored to (at least) one more local volume. Rather than
+a separate copy job that reads all of the data back in userspace, copy it
+right after the primary transfer using whatever the filesystem can do
+without us shuffling the bytes around:
+
+    1. A reflink (FICLONE), which shares the extents on CoW filesystems
+    2. os.copy_file_range, which stays in the kernel (and may offload
+       to the storage server on NFS 4.2 and friends)
+    3. os.sendfile, which also stays in the kernel
+    4. Plain old shutil.copyfileobj if all else fails
+
+Hardlinks are available too, but only if asked for; they don't give you
+a second copy of anything, so they're only useful when the "mirror" is
+really just a second view of the same volume.
+
+Each copy is checked against the manifest we already built when the data
+landed (see :mod:`dataservants.wadsworth.landing`). Files that the mirror's
+own manifest already has (with the same hash) are left alone, so catching
+a mirror up after a failure only copies what's actually missing.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import shutil
+
+try:
+    # This one might fail, e.g. not on Linux
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from ligmos import utils
+from . import landing
+
+
+# From linux/fs.h; _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+
+def mirrorDirs(iobj):
+    """
+    List of extra local destination directories for an instrument, from
+    the (optional, comma separated) mirrordirs key in its config section.
+    """
+    mirrors = getattr(iobj, 'mirrordirs', None)
+    if mirrors is None or mirrors == '':
+        return []
+
+    return [each.strip() for each in mirrors.split(",") if each.strip()]
+
+
+def reflinkFile(fin, fout):
+    """
+    Try to clone fin into fout with the FICLONE ioctl. True if it worked.
+    """
+    if fcntl is None:
+        return False
+
+    try:
+        fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+    except OSError:
+        return False
+
+    return True
+
+
+def rangeCopy(fin, fout, nbytes):
+    """
+    Copy with os.copy_file_range. True if it worked; False if it's not
+    supported here, in which case nothing was copied.
+    """
+    if hasattr(os, 'copy_file_range') is False:
+        return False
+
+    ncopied = 0
+    while ncopied < nbytes:
+        try:
+            n = os.copy_file_range(fin.fileno(), fout.fileno(),
+                                   nbytes - ncopied)
+        except OSError:
+            # Cross-device on older kernels, or not supported at all
+            if ncopied == 0:
+                return False
+            raise
+        if n == 0:
+            break
+        ncopied += n
+
+    return True
+
+
+def sendfileCopy(fin, fout, nbytes):
+    """
+    Copy with os.sendfile. True if it worked; False if it's not supported
+    here, in which case nothing was copied.
+    """
+    if hasattr(os, 'sendfile') is False:
+        return False
+
+    offset = 0
+    while offset < nbytes:
+        try:
+            n = os.sendfile(fout.fileno(), fin.fileno(), offset,
+                            nbytes - offset)
+        except OSError:
+            if offset == 0:
+                return False
+            raise
+        if n == 0:
+            break
+        offset += n
+
+    return True
+
+
+def copyFile(src, dst, hardlink=False):
+    """Copy a single file into place using the cheapest method available.
+
+    The copy is written to a temporary name next to ``dst`` and only moved
+    into place once it's complete, with the original modification time.
+
+    Returns:
+        method (:obj:`str`)
+            Which method actually did the work; one of 'hardlink',
+            'reflink', 'copy_file_range', 'sendfile' or 'copy'.
+    """
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmpfile = os.path.join(os.path.dirname(dst),
+                           ".%s.part" % (os.path.basename(dst)))
+
+    if hardlink is True:
+        try:
+            if os.path.exists(tmpfile):
+                os.remove(tmpfile)
+            os.link(src, tmpfile)
+            os.replace(tmpfile, dst)
+            return 'hardlink'
+        except OSError:
+            # Probably a different filesystem, so do a real copy
+            pass
+
+    nbytes = os.path.getsize(src)
+    with open(src, 'rb') as fin, open(tmpfile, 'wb') as fout:
+        if reflinkFile(fin, fout) is True:
+            method = 'reflink'
+        elif rangeCopy(fin, fout, nbytes) is True:
+            method = 'copy_file_range'
+        elif sendfileCopy(fin, fout, nbytes) is True:
+            method = 'sendfile'
+        else:
+            shutil.copyfileobj(fin, fout, 2**22)
+            method = 'copy'
+
+    shutil.copystat(src, tmpfile)
+    os.replace(tmpfile, dst)
+
+    return method
+
+
+def replicateDir(localdir, mirror, digests, htype='xx64', hardlink=False,
+                 debug=False):
+    """Replicate the given files from a local directory into a mirror.
+
+    Args:
+        localdir (:obj:`str`)
+            Local (primary) copy of a transferred directory.
+        mirror (:obj:`str`)
+            Secondary destination directory; ``localdir`` is copied *into*
+            it, just like it was copied into the primary destdir.
+        digests (:obj:`dict`)
+            {relpath: digest} of the files to replicate, from the manifest
+            that was made when they landed.
+        htype (:obj:`str`, optional)
+            Hashing function type. Defaults to 'xx64'.
+        hardlink (:obj:`bool`, optional)
+            Try hardlinks first. Defaults to False.
+        debug (:obj:`bool`, optional)
+            Bool to trigger additional debugging outputs. Defaults to False.
+
+    Returns:
+        stats (:obj:`dict`)
+            Number of files (and bytes) copied, failed, already there, and
+            how many used each copy method.
+    """
+    mdir = os.path.join(mirror, os.path.basename(os.path.normpath(localdir)))
+    stats = {'ncopied': 0, 'nbytes': 0, 'nfailed': 0, 'nskipped': 0,
+             'methods': {}}
+    good = {}
+
+    hfname = os.path.join(mdir, "AListofHashes.%s" % (htype))
+    have = utils.hashes.readHashFile(hfname, basenamed=False)
+
+    for relpath in digests:
+        src = os.path.join(localdir, relpath)
+        dst = os.path.join(mdir, relpath)
+        if have.get(dst, None) == digests[relpath] and \
+           os.path.exists(dst) is True:
+            stats['nskipped'] += 1
+            continue
+        try:
+            method = copyFile(src, dst, hardlink=hardlink)
+            # A hardlink is the same inode, so there's nothing to check
+            if method != 'hardlink':
+                hasher = utils.hashes.hashfunc(dst, htype=htype,
+                                               debug=debug)
+                if hasher.hexdigest() != digests[relpath]:
+                    print("--> Mirror copy %s failed its hash check!" %
+                          (dst))
+                    os.remove(dst)
+                    stats['nfailed'] += 1
+                    continue
+        except OSError as err:
+            print("--> Couldn't replicate %s: %s" % (src, str(err)))
+            stats['nfailed'] += 1
+            continue
+
+        good.update({dst: digests[relpath]})
+        stats['ncopied'] += 1
+        stats['nbytes'] += os.path.getsize(dst)
+        stats['methods'][method] = stats['methods'].get(method, 0) + 1
+
+    # The mirror gets its own manifest, for just what actually made it
+    landing.updateManifest(mdir, good, htype=htype, debug=debug)
+
+    return stats
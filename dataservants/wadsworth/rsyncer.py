@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 18 Sep 2018
+#
+#  @author: rhamilton
+
+"""rsync, called via subprocess, with the --stats and progress parsed.
+
+Promoted from toymodels/rsyncTesting.py so that Wadsworth can actually keep
+the transfer statistics around rather than just printing them.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import re
+import tempfile
+import threading
+import subprocess as sub
+
+from . import landing
+
+
+# rsync --info=progress2 lines look like this, and are separated by \r:
+#   '    1,238,099 100%  146.38MB/s    0:00:00 (xfr#1, to-chk=0/1)'
+progressRE = re.compile(r"^\s*([\d,]+)\s+(\d+)%\s+([\d.]+)([kMGT]?B)/s\s+"
+                        r"(\d+):(\d{2}):(\d{2})"
+                        r"(?:\s+\(xfr#(\d+),\s+(?:to|ir)-chk=(\d+)/(\d+)\))?")
+
+# rsync reports its human readable rates in powers of 1024
+rateUnits = {'B': 1., 'kB': 2.**10, 'MB': 2.**20, 'GB': 2.**30, 'TB': 2.**40}
+
+
+def subpRsync(src, dest, cmd=None, args=None, timeout=600.,
+              progress=None, landed=None, debug=True):
+    """
+    rsync, called via subprocess to get at the binary on the local machine.
+
+    If progress is a callable, rsync is also asked for --info=progress2 and
+    each parsed progress line (see parseRsyncProgress) is handed to it as
+    the transfer happens.  Similarly, if landed is a callable it's handed
+    the name of each file (relative to dest) as soon as rsync has finished
+    receiving it.  A timeout of None or <= 0 means no timeout.
+    """
+    if cmd is None:
+        cmd = 'rsync'
+
+    if args is None:
+        # a: archive mode; equals -rlptgoD (no -H,-A,-X)
+        # r: recurse into directories
+        # m: prune empty directory chains from file-list
+        # z: compress file data during the transfer
+        # partial: keep partially transferred files
+        # stats: give some file-transfer stats
+        args = ['-armz', '--stats', '--partial']
+
+    if progress is not None:
+        # Stop the per-file lines from being spammed in with the totals
+        args = args + ['--info=progress2', '--no-inc-recursive']
+
+    if landed is not None:
+        args = args + [landing.outFormat]
+
+    if timeout is not None and timeout <= 0:
+        timeout = None
+
+    subcmdwargs = [cmd] + args + [src, dest]
+    try:
+        proc = sub.Popen(subcmdwargs, stdout=sub.PIPE, stderr=sub.PIPE)
+    except FileNotFoundError as err:
+        errstr = err.strerror
+        if debug is True:
+            print("rsync command not found!")
+
+        return -9999, errstr
+
+    # Need to drain both pipes in the background so we can watch the
+    #   progress and also so a chatty STDERR can't deadlock us
+    outbuf, errbuf = [], []
+    outreader = threading.Thread(target=readRsyncOutput,
+                                 args=(proc.stdout, outbuf, progress,
+                                       landed))
+    errreader = threading.Thread(target=readRsyncOutput,
+                                 args=(proc.stderr, errbuf, None, None))
+    outreader.start()
+    errreader.start()
+
+    try:
+        proc.wait(timeout=timeout)
+        timedout = False
+    except sub.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        timedout = True
+
+    outreader.join()
+    errreader.join()
+    stdout = b''.join(outbuf)
+    stderr = b''.join(errbuf)
+
+    # Check for anything on stdout/stderr
+    if debug is True:
+        if stdout != b'':
+            print(stdout.decode("utf-8", errors='replace'))
+
+    if timedout is True:
+        if debug is True:
+            print("Full STDERR: ", end='')
+            print(stderr.decode("utf-8", errors='replace'))
+
+        errstr = "'%s' timed out" % (" ".join(subcmdwargs))
+
+        return -99, errstr
+    elif proc.returncode != 0:
+        errstr = parseRsyncErr(stderr)
+        if errstr is None:
+            errstr = "'%s' returned code %d" % (" ".join(subcmdwargs),
+                                                proc.returncode)
+        if debug is True:
+            print("Full STDERR: ", end='')
+            print(stderr.decode("utf-8", errors='replace'))
+
+        return -999, errstr
+
+    gudstr = parseRsyncStats(stdout, debug=debug)
+
+    # If we're here, then we're fine. Stay golden, Ponyboy
+    return 0, gudstr
+
+
+def filesFrom(files, srcdir):
+    """
+    Write the given files, relative to srcdir, into a temporary file
+    suitable for rsync's --files-from option. The caller gets to clean it
+    up once rsync is done with it.
+    """
+    srcdir = os.path.normpath(srcdir)
+    fd, fname = tempfile.mkstemp(prefix='wadsworth_', suffix='.files')
+    with os.fdopen(fd, 'w') as f:
+        for each in files:
+            f.write("%s\n" % (os.path.relpath(each, srcdir)))
+
+    return fname
+
+
+def readRsyncOutput(pipe, buf, progress=None, landed=None):
+    """
+    Drain one of rsync's pipes into buf, passing any progress2 lines
+    (which are \\r terminated rather than \\n) along to progress() and
+    the names of any received files along to landed()
+    """
+    chunk = b''
+    for data in iter(lambda: pipe.read1(8192), b''):
+        buf.append(data)
+        if progress is None and landed is None:
+            continue
+
+        chunk += data
+        lines = re.split(b'[\r\n]', chunk)
+        # The last bit might be a partial line, so keep it for next time
+        chunk = lines.pop()
+        for line in lines:
+            if landed is not None:
+                fname = landing.parseLanded(line)
+                if fname is not None:
+                    landed(fname)
+                    continue
+            if progress is not None:
+                prog = parseRsyncProgress(line)
+                if prog is not None:
+                    try:
+                        progress(prog)
+                    except Exception as err:
+                        # Never let a telemetry problem kill the transfer
+                        print("Progress callback failed: %s" % (str(err)))
+    pipe.close()
+
+
+def parseRsyncErr(errbuf):
+    """
+    """
+    # We're in Python 3 territory, so err.stderr is a bytestring!
+    if isinstance(errbuf, bytes) is True:
+        errstr = errbuf.decode("utf-8", errors='replace')
+    elif isinstance(errbuf, str) is True:
+        errstr = errbuf
+    else:
+        return None
+
+    errsplit = errstr.split("\n")
+    if errsplit[0].lower().startswith("rsync: "):
+        errmsg = errsplit[0]
+    else:
+        errmsg = None
+
+    return errmsg
+
+
+def parseRsyncProgress(line):
+    """
+    Parse a single rsync --info=progress2 line into a dict, returning None
+    if the line wasn't actually a progress line.
+
+    .. code-block:: python
+
+        prog = {'bytes': 1238099, 'percent': 100,
+                'rate': 153488179.2, 'eta': 0,
+                'nxfered': 1, 'tocheck': 0, 'ntotal': 1}
+    """
+    if isinstance(line, bytes) is True:
+        line = line.decode("utf-8", errors='replace')
+
+    match = progressRE.match(line)
+    if match is None:
+        return None
+
+    grps = match.groups()
+    prog = {'bytes': int(grps[0].replace(",", "")),
+            'percent': int(grps[1]),
+            'rate': float(grps[2])*rateUnits.get(grps[3], 1.),
+            'eta': int(grps[4])*3600 + int(grps[5])*60 + int(grps[6])}
+
+    # The (xfr#N, to-chk=N/N) bit is only there once a file has finished
+    if grps[7] is not None:
+        prog.update({'nxfered': int(grps[7]),
+                     'tocheck': int(grps[8]),
+                     'ntotal': int(grps[9])})
+
+    return prog
+
+
+def parseRsyncStats(outbuf, debug=False):
+    """
+    Turn the block of rsync --stats output into a dict of numbers.
+
+    .. code-block:: python
+
+        statusDict = {'nfiles': {'nreg': 4, 'ndir': 1},
+                      'ncreated': 5.0,
+                      'nregxfered': 4.0,
+                      'totsize': 1238099.0,
+                      'totxfersize': 1238099.0,
+                      'literaldata': 1238099.0,
+                      'matchdata': 0.0,
+                      'flisttime': 0.001,
+                      'totsent': 1238563.0,
+                      'totrecv': 95.0}
+    """
+    statusDict = {}
+
+    # In theory, the rsync --stats option should output the same stuff
+    #   so we'll YOLO it and search for strings to build our dict
+    # We're in Python 3 territory, so err.stderr is a bytestring!
+    if isinstance(outbuf, bytes) is True:
+        outstr = outbuf.decode("utf-8", errors='replace')
+    elif isinstance(outbuf, str) is True:
+        outstr = outbuf
+    else:
+        outstr = None
+
+    keysmap = {'Number of files:': 'nfiles',
+               'Number of created files:': 'ncreated',
+               'Number of deleted files:': 'ndeleted',
+               'Number of regular files transferred:': 'nregxfered',
+               'Total file size:': 'totsize',
+               'Total transferred file size:': 'totxfersize',
+               'Literal data:': 'literaldata',
+               'Matched data:': 'matchdata',
+               'File list size:': 'flistsize',
+               'File list generation time:': 'flisttime',
+               'File list transfer time:': 'flistxftertime',
+               'Total bytes sent:': 'totsent',
+               'Total bytes received:': 'totrecv'
+               }
+
+    if outstr is not None:
+        outstr = outstr.strip()
+        for key in keysmap:
+            # Since the block of stats is terminated on each line by \n,
+            #   we can search the entire string block and then snip it
+            #   on the *next* \n instance rather than a double loop search.
+            strBeg = outstr.find(key)
+            if strBeg == -1:
+                continue
+
+            strEnd = outstr.find("\n", strBeg)
+            if strEnd == -1:
+                strEnd = len(outstr)
+            subStr = outstr[strBeg: strEnd]
+            val = subStr.split(key)[1].strip()
+            # Some special handling of ones with extra stuff in the line,
+            #   like "Number of files: 5 (reg: 4, dir: 1)"
+            if keysmap[key] == 'nfiles':
+                subvals = dict(re.findall(r"(\w+):\s*([\d,]+)", val))
+                nf = int(subvals.get('reg', '0').replace(",", ""))
+                nd = int(subvals.get('dir', '0').replace(",", ""))
+                val = {"nreg": nf, "ndir": nd}
+            else:
+                # Everything else is a number followed by a unit or
+                #   other cruft, like "1,238,099 bytes" or "0.001 seconds"
+                val = val.split()[0].strip()
+                try:
+                    # Kill any commas in the numbers
+                    val = val.replace(",", "")
+                    val = float(val)
+                except ValueError:
+                    # Just leave it as a string, then
+                    pass
+
+            if debug is True:
+                print(keysmap[key], val)
+            statusDict.update({keysmap[key]: val})
+
+    return statusDict
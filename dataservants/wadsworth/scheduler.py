@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Deadline- and priority-aware ordering of Wadsworth's transfers.
+
+Directories used to be transferred in whatever order Yvette listed them,
+so tonight's data could sit behind a multi-GB catch-up of last week and a
+long rsync could run straight through the alarm. Instead, order the work
+by priority, estimate each job from the historical throughput (see
+:mod:`dataservants.wadsworth.estimator`), and pack
+the jobs into the time we actually have. Anything that won't fit is split
+into a piece that does, or left for the next loop, rather than being
+killed partway through.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+
+from .estimator import Estimator
+
+# Ordering policies that can be set per instrument (priority= in the conf)
+policies = ['newest', 'oldest', 'listed']
+
+
+class TransferJob():
+    """
+    A single directory (or a piece of one) waiting to be transferred.
+    """
+    def __init__(self, srcdir, fstats=None, needed=None, fprint=None,
+                 order=0):
+        self.srcdir = srcdir
+        self.fstats = fstats
+        self.needed = needed
+        self.fprint = fprint
+        # Position in Yvette's original list, for the 'listed' policy
+        self.order = order
+        # True if a previous run was cut off partway through this one
+        self.resumed = False
+        # If this is a piece of a directory, the subset of needed files
+        self.files = None
+        self.estimate = None
+
+    @property
+    def newest(self):
+        """
+        Newest modification time of any file in the directory; falls back
+        to the directory name since those are dates for us anyway.
+        """
+        if self.fstats:
+            return max([self.fstats[f][1] for f in self.fstats])
+
+        return os.path.basename(os.path.normpath(self.srcdir))
+
+    @property
+    def nbytes(self):
+        """
+        Bytes that still need to be transferred.
+        """
+        if self.fstats is None:
+            return None
+        files = self.files if self.files is not None else self.needed
+
+        return sum([self.fstats[f][0] for f in files])
+
+
+def estimateDuration(job, est):
+    """Estimate how long (seconds) a job will take.
+
+    Args:
+        job (:class:`TransferJob`)
+            The job to estimate.
+        est (:class:`dataservants.wadsworth.estimator.Estimator`)
+            Cost model for the job's host.
+
+    Returns:
+        est (:obj:`float`)
+            Estimated duration in seconds, or None if we have no listing
+            for the directory and so no idea.
+    """
+    if job.fstats is None:
+        return None
+
+    files = job.files if job.files is not None else job.needed
+
+    return est.transfer(len(job.fstats), len(files), job.nbytes)
+
+
+def prioritize(jobs, policy='newest'):
+    """
+    Sort the jobs according to the given policy: newest nights first
+    (the default), oldest first, or just as Yvette listed them. Jobs that
+    a previous run was cut off partway through always go first.
+    """
+    if policy == 'listed':
+        ordered = sorted(jobs, key=lambda j: j.order)
+    else:
+        # Jobs without a listing can't be compared by mtime, so they go
+        #   by name instead
+        def sortkey(job):
+            newest = job.newest
+            if isinstance(newest, str):
+                return (0, newest)
+            return (1, newest)
+
+        ordered = sorted(jobs, key=sortkey, reverse=(policy != 'oldest'))
+
+    # sorted() is stable, so this keeps the policy order within each group
+    return sorted(ordered, key=lambda j: j.resumed is False)
+
+
+def splitJob(job, remaining, est):
+    """
+    Carve off the largest piece of a job (in file mtime order) that fits
+    into the remaining time. Returns None if not even one file fits.
+    """
+    files = sorted(job.needed, key=lambda f: job.fstats[f][1])
+    overhead = est.transfer(len(job.fstats), 0, 0)
+
+    piece = []
+    used = overhead
+    for each in files:
+        cost = est.transferFile(job.fstats[each][0])
+        if used + cost > remaining:
+            break
+        piece.append(each)
+        used += cost
+
+    if piece == []:
+        return None
+
+    part = TransferJob(job.srcdir, fstats=job.fstats, needed=job.needed,
+                       fprint=job.fprint, order=job.order)
+    part.files = piece
+    part.estimate = used
+
+    return part
+
+
+def packJobs(jobs, budget, est=None, policy='newest'):
+    """Decide which jobs to run this time around and in what order.
+
+    Jobs are taken in priority order and scheduled as long as they fit in
+    the remaining budget. A job that doesn't fit is split down to a piece
+    that does; if not even that works it's deferred to the next loop. If
+    nothing at all has been scheduled yet, the first job gets a single
+    file anyway so that a huge file can't block a host forever.
+
+    Args:
+        jobs (:obj:`list` of :class:`TransferJob`)
+            Jobs to consider.
+        budget (:obj:`float`)
+            Seconds available for transfers.
+        est (:class:`dataservants.wadsworth.estimator.Estimator`, optional)
+            Cost model for the host; defaults to one with no history.
+        policy (:obj:`str`, optional)
+            One of ``policies``. Defaults to 'newest'.
+
+    Returns:
+        scheduled (:obj:`list` of :class:`TransferJob`)
+            Jobs (or pieces of jobs) to run now, in order.
+        deferred (:obj:`list` of :class:`TransferJob`)
+            Jobs that will have to wait.
+    """
+    if est is None:
+        est = Estimator()
+
+    scheduled, deferred = [], []
+    remaining = budget
+    for job in prioritize(jobs, policy=policy):
+        job.estimate = estimateDuration(job, est)
+        if job.estimate is None:
+            # No idea how long it'll take, so only try it if there's a
+            #   decent chunk of time left
+            if remaining > budget/2.:
+                scheduled.append(job)
+                remaining -= budget/2.
+            else:
+                deferred.append(job)
+        elif job.estimate <= remaining:
+            scheduled.append(job)
+            remaining -= job.estimate
+        else:
+            part = splitJob(job, remaining, est)
+            if part is None and scheduled == [] and job.needed:
+                part = TransferJob(job.srcdir, fstats=job.fstats,
+                                   needed=job.needed, fprint=job.fprint,
+                                   order=job.order)
+                part.files = sorted(job.needed,
+                                    key=lambda f: job.fstats[f][1])[:1]
+                part.estimate = estimateDuration(part, est)
+
+            if part is not None:
+                print("--> Splitting %s: %d of %d files fit" %
+                      (job.srcdir, len(part.files), len(job.needed)))
+                scheduled.append(part)
+                remaining -= part.estimate
+            deferred.append(job)
+
+    return scheduled, deferred
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Parallel, pipelined SFTP transfers for hosts where rsync won't work.
+
+Some of the instrument hosts (the OS X cameras in particular) have old or
+broken rsync builds, in which case rsync just fails and nothing moves. We
+already hold a Paramiko connection to every host, so pull the files over
+SFTP instead:
+
+    * Each worker opens its own SFTP channel on the existing connection,
+      so several files are in flight at once
+    * Within a file, reads are issued in windows of many outstanding
+      requests (readv) so we aren't waiting a round trip per 32 KiB,
+      which is what keeps it near line rate on high-latency links
+    * Partial files are kept and resumed from their current size, as
+      long as there's a manifest hash to check the result against
+    * Everything is hashed as it arrives and checked against Yvette's
+      manifest before being moved into place; files that aren't in the
+      manifest aren't fetched at all, since nothing could vouch for them
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import time
+import queue
+import threading
+
+try:
+    # This one might fail
+    import paramiko
+except ImportError:
+    paramiko = None
+
+from .. import yvette
+
+
+# Things an SFTP channel can throw at us when the connection goes sideways
+if paramiko is not None:
+    sftpErrors = (IOError, OSError, EOFError, paramiko.SSHException)
+else:
+    sftpErrors = (IOError, OSError, EOFError)
+
+
+def openSession(eSSH):
+    """
+    Open a new SFTP channel on the existing SSH connection, returning None
+    if that's not possible.
+    """
+    ssh = getattr(eSSH, 'ssh', None)
+    if ssh is None:
+        return None
+
+    try:
+        sftp = ssh.open_sftp()
+    except sftpErrors as err:
+        print("--> Couldn't open SFTP channel: %s" % (str(err)))
+        sftp = None
+
+    return sftp
+
+
+def fetchFile(sftp, rfile, lfile, rsize, rmtime, expected=None,
+              htype='xx64', chunk=2**15, nreqs=64):
+    """Pull a single file over SFTP, resuming and hashing as we go.
+
+    Args:
+        sftp (:class:`paramiko.SFTPClient`)
+            Open SFTP channel to the remote host.
+        rfile (:obj:`str`)
+            Remote path of the file.
+        lfile (:obj:`str`)
+            Final local path of the file.
+        rsize (:obj:`int`)
+            Size of the remote file in bytes.
+        rmtime (:obj:`float`)
+            Modification time of the remote file.
+        expected (:obj:`str`, optional)
+            Hash of the file from Yvette's manifest, or None if unknown;
+            without it, a partial file isn't resumed.
+        htype (:obj:`str`, optional)
+            Hashing function type. Defaults to 'xx64'.
+        chunk (:obj:`int`, optional)
+            Size of each read request. Defaults to 2**15, which is the
+            most that many SFTP servers will hand back in one go.
+        nreqs (:obj:`int`, optional)
+            Number of read requests to keep in flight. Defaults to 64.
+
+    Returns:
+        good (:obj:`bool`)
+            True if the file arrived and matched ``expected``.
+        digest (:obj:`str`)
+            Hash of what actually arrived.
+        nrecv (:obj:`int`)
+            Bytes actually pulled over the wire (i.e. not resumed).
+    """
+    os.makedirs(os.path.dirname(lfile), exist_ok=True)
+    tmpfile = os.path.join(os.path.dirname(lfile),
+                           ".%s.part" % (os.path.basename(lfile)))
+    hasher = yvette.filehashing.newHasher(htype)
+
+    # Pick up where we left off, if there's a sensible partial file and
+    #   a hash that'll catch it if it wasn't
+    offset = 0
+    if os.path.exists(tmpfile):
+        psize = os.path.getsize(tmpfile)
+        if psize <= rsize and expected is not None:
+            with open(tmpfile, 'rb') as part:
+                for data in iter(lambda: part.read(2**22), b''):
+                    hasher.update(data)
+            offset = psize
+        else:
+            os.remove(tmpfile)
+
+    nrecv = 0
+    with sftp.open(rfile, 'rb') as rf, open(tmpfile, 'ab') as out:
+        while offset < rsize:
+            reqs = []
+            roff = offset
+            while roff < rsize and len(reqs) < nreqs:
+                nbytes = min(chunk, rsize - roff)
+                reqs.append((roff, nbytes))
+                roff += nbytes
+
+            for (aoff, nbytes), data in zip(reqs, rf.readv(reqs)):
+                hasher.update(data)
+                out.write(data)
+                offset += len(data)
+                nrecv += len(data)
+                # Anything short means the file shrank (or the server
+                #   is confused); everything after it would be misplaced
+                if len(data) != nbytes:
+                    raise IOError("Short read of %s at %d (%d of %d bytes)" %
+                                  (rfile, aoff, len(data), nbytes))
+            if offset != roff:
+                raise IOError("Only got %d of %d bytes of %s" %
+                              (offset, roff, rfile))
+
+    digest = hasher.hexdigest()
+    if expected is not None and expected == digest:
+        good = True
+        os.replace(tmpfile, lfile)
+        os.utime(lfile, (rmtime, rmtime))
+    else:
+        # Could just as well be a stale partial as a bad transfer, so
+        #   don't try to resume this one again
+        good = False
+        os.remove(tmpfile)
+
+    return good, digest, nrecv
+
+
+def sftpTransfer(eSSH, srcdir, files, fstats, destdir, rhashes=None,
+                 htype='xx64', nworkers=4, timeout=600., debug=False):
+    """Transfer the given files from a remote directory over SFTP.
+
+    Args:
+        eSSH (:class:`ligmos.utils.ssh.SSHHandler`)
+            Open SSH connection to the remote host.
+        srcdir (:obj:`str`)
+            Remote directory being transferred.
+        files (:obj:`list`)
+            List of remote paths (under ``srcdir``) to transfer.
+        fstats (:obj:`dict`)
+            Remote file stats, as returned by
+            :func:`dataservants.yvette.filehashing.getFileStats`.
+        destdir (:obj:`str`)
+            Local directory that ``srcdir`` is copied *into*.
+        rhashes (:obj:`dict`, optional)
+            Yvette's manifest, keyed by file basename. Files not in it
+            aren't fetched, and are listed in ``stats['unverified']``
+            for the caller to get some other way.
+        htype (:obj:`str`, optional)
+            Hashing function type. Defaults to 'xx64'.
+        nworkers (:obj:`int`, optional)
+            Number of files to transfer at once. Defaults to 4.
+        timeout (:obj:`float`, optional)
+            Seconds after which no new files are started. None or <= 0
+            means no timeout. Defaults to 600.
+        debug (:obj:`bool`, optional)
+            Bool to trigger additional debugging outputs. Defaults to False.
+
+    Returns:
+        retcode (:obj:`int`)
+            0 on success, same convention as
+            :func:`dataservants.wadsworth.rsyncer.subpRsync` otherwise.
+        stats (:obj:`dict` or :obj:`str`)
+            Transfer stats in the same style as the rsync ones, or an
+            error string if things went sideways. If it ran out of time,
+            it's the stats of the files that did make it, with the error
+            string in ``stats['error']``.
+    """
+    if rhashes is None:
+        rhashes = {}
+
+    srcdir = os.path.normpath(srcdir)
+    localdir = os.path.join(destdir, os.path.basename(srcdir))
+
+    deadline = None
+    if timeout is not None and timeout > 0:
+        deadline = time.time() + timeout
+
+    stats = {'nfiles': {'nreg': 0, 'ndir': 0}, 'nregxfered': 0.,
+             'totxfersize': 0., 'nfailed': 0., 'totrecv': 0.,
+             'totsize': 0., 'literaldata': 0., 'failed': [],
+             'unverified': [], 'digests': {}}
+    lock = threading.Lock()
+
+    # Biggest first, so one large file doesn't end up alone at the end
+    todo = queue.Queue()
+    for each in sorted(files, key=lambda f: fstats[f][0], reverse=True):
+        todo.put(each)
+
+    nopened = []
+
+    def worker():
+        sftp = openSession(eSSH)
+        if sftp is None:
+            return
+        nopened.append(1)
+        try:
+            while deadline is None or time.time() < deadline:
+                try:
+                    rfile = todo.get_nowait()
+                except queue.Empty:
+                    break
+
+                relpath = os.path.relpath(rfile, srcdir)
+                lfile = os.path.join(localdir, relpath)
+                rsize, rmtime = fstats[rfile]
+                expected = rhashes.get(os.path.basename(rfile), None)
+                if expected is None:
+                    print("--> %s isn't in the remote manifest!" % (rfile))
+                    with lock:
+                        stats['unverified'].append(rfile)
+                    continue
+                try:
+                    good, digest, nrecv = fetchFile(sftp, rfile, lfile,
+                                                    rsize, rmtime,
+                                                    expected=expected,
+                                                    htype=htype)
+                except sftpErrors as err:
+                    print("--> SFTP of %s failed: %s" % (rfile, str(err)))
+                    good, digest, nrecv = False, None, 0
+
+                with lock:
+                    stats['nfiles']['nreg'] += 1
+                    stats['totrecv'] += nrecv
+                    if good is True:
+                        stats['digests'].update({relpath: digest})
+                        stats['nregxfered'] += 1
+                        stats['totxfersize'] += rsize
+                    else:
+                        stats['nfailed'] += 1
+                        stats['failed'].append(rfile)
+                        if digest is not None:
+                            print("--> %s failed its hash check!" % (rfile))
+        finally:
+            sftp.close()
+
+    threads = [threading.Thread(target=worker, daemon=True)
+               for i in range(max(1, nworkers))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if nopened == []:
+        return -999, "couldn't open any SFTP channels to %s" % (srcdir)
+
+    stats['totsize'] = stats['totxfersize']
+    stats['literaldata'] = stats['totrecv']
+
+    if todo.empty() is False:
+        # What did make it is still good, so hand it back too
+        stats['error'] = "SFTP of %s timed out with %d files left" % \
+                         (srcdir, todo.qsize())
+        return -99, stats
+
+    return 0, stats
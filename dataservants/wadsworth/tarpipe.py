@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Bulk tar-over-SSH transfers for directories full of small files.
+
+rsync does a round trip (or three) per file, which dominates when an
+instrument writes thousands of tiny logs/guider frames/sidecars. Instead,
+ask the remote side for a single tar stream of just the files we need and
+unpack it here on the fly, checking each file against Yvette's manifest as
+it goes by.
+
+The stream is only compressed if the remote host actually has zstd; that's
+asked once per host (see :func:`remoteZstd`) rather than finding out by
+having every transfer fail.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import shlex
+import tarfile
+import threading
+import subprocess as sub
+
+import numpy as np
+
+try:
+    # This one might fail
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from ligmos import utils
+from .. import yvette
+
+
+class CountingReader():
+    """
+    Thin wrapper around a pipe that keeps track of how many bytes came
+    through it, so we know what actually went over the wire.
+    """
+    def __init__(self, pipe):
+        self.pipe = pipe
+        self.nbytes = 0
+
+    def read(self, size=-1):
+        data = self.pipe.read(size)
+        self.nbytes += len(data)
+        return data
+
+
+def needsTransfer(fstats, srcdir, destdir):
+    """Figure out which of the remote files aren't already here.
+
+    A file is needed if it doesn't exist locally, or if its size or
+    (integer) modification time differ from the remote copy.
+
+    Args:
+        fstats (:obj:`dict`)
+            Remote file stats, as returned by
+            :func:`dataservants.yvette.filehashing.getFileStats`.
+        srcdir (:obj:`str`)
+            Remote directory that the files in ``fstats`` live under.
+        destdir (:obj:`str`)
+            Local directory that ``srcdir`` is copied *into*.
+
+    Returns:
+        needed (:obj:`list`)
+            List of remote paths that need to be transferred.
+    """
+    srcdir = os.path.normpath(srcdir)
+    localdir = os.path.join(destdir, os.path.basename(srcdir))
+
+    needed = []
+    for rfile in fstats:
+        lfile = os.path.join(localdir, os.path.relpath(rfile, srcdir))
+        rsize, rmtime = fstats[rfile]
+        try:
+            st = os.stat(lfile)
+            if st.st_size != rsize or int(st.st_mtime) != int(rmtime):
+                needed.append(rfile)
+        except OSError:
+            needed.append(rfile)
+
+    return needed
+
+
+def chooseTransport(fstats, needed, minfiles=500, maxmedian=2**20):
+    """Pick a transport for a directory based on its files.
+
+    Lots of small files means rsync spends its time on per-file round
+    trips, so stream them as one tar instead. Anything else goes to rsync,
+    which is better at big files and partial updates.
+
+    Args:
+        fstats (:obj:`dict`)
+            Remote file stats, as returned by
+            :func:`dataservants.yvette.filehashing.getFileStats`.
+        needed (:obj:`list`)
+            List of remote paths that need to be transferred.
+        minfiles (:obj:`int`, optional)
+            Minimum number of needed files to consider tar. Defaults to 500.
+        maxmedian (:obj:`int`, optional)
+            Maximum median size (bytes) of the needed files to consider tar.
+            Defaults to 2**20 (1 MiB).
+
+    Returns:
+        transport (:obj:`str`)
+            Either 'tar' or 'rsync'.
+    """
+    if len(needed) < minfiles:
+        return 'rsync'
+
+    median = np.median([fstats[each][0] for each in needed])
+    if median > maxmedian:
+        return 'rsync'
+
+    return 'tar'
+
+
+def rStringTarPipe(baseYcmd, srcdir, filetype, htype='xx64', zstd=False):
+    """
+    Remote command that (incrementally) updates Yvette's manifest and then
+    sends it, followed by the list of files given on STDIN, as a tar stream.
+    """
+    srcdir = os.path.normpath(srcdir)
+    parent, bdir = os.path.split(srcdir)
+    hfname = "%s/AListofHashes.%s" % (bdir, htype)
+
+    fcmd = "%s -p %s --filetype %s --hashtype %s > /dev/null 2>&1; " % \
+           (baseYcmd, shlex.quote(srcdir), shlex.quote(filetype), htype)
+    fcmd += "cd %s && " % (shlex.quote(parent))
+    fcmd += "(echo %s; cat) | tar -cf - --no-recursion -T -" % \
+            (shlex.quote(hfname))
+    if zstd is True:
+        fcmd += " | zstd -q -c -1"
+
+    return fcmd
+
+
+def sshCommand(iobj, fcmd):
+    """
+    ssh command line that runs fcmd on the instrument host.
+    """
+    return ['ssh', '-o', 'BatchMode=yes', '-p', str(iobj.port),
+            "%s@%s" % (iobj.user, iobj.host), fcmd]
+
+
+def remoteZstd(iobj, timeout=30., debug=False):
+    """
+    True if the instrument host has zstd to compress the tar stream with.
+    Only asked once per host; the answer is kept on iobj, unless ssh
+    itself didn't work, in which case we'll ask again next time.
+    """
+    known = getattr(iobj, 'remoteZstd', None)
+    if known is not None:
+        return known
+
+    sshcmd = sshCommand(iobj, "command -v zstd")
+    try:
+        ans = sub.run(sshcmd, stdin=sub.DEVNULL, stdout=sub.DEVNULL,
+                      stderr=sub.DEVNULL, timeout=timeout)
+    except (OSError, sub.TimeoutExpired) as err:
+        print("--> Couldn't check for zstd on %s: %s" % (iobj.host, str(err)))
+        return False
+
+    # ssh's own failures come back as 255
+    if ans.returncode == 255:
+        print("--> Couldn't check for zstd on %s" % (iobj.host))
+        return False
+
+    iobj.remoteZstd = ans.returncode == 0
+    if debug is True or iobj.remoteZstd is False:
+        print("--> zstd on %s: %s" % (iobj.host, iobj.remoteZstd))
+
+    return iobj.remoteZstd
+
+
+def subpTarPipe(iobj, baseYcmd, srcdir, files, destdir, htype='xx64',
+                zstd=False, timeout=600., debug=False):
+    """Transfer the given files as a single tar stream over SSH.
+
+    Each file is written to a temporary name, hashed as the data streams
+    by, and only moved into place if its hash matches the remote manifest.
+    Files that aren't in the manifest (or all of them, if there wasn't
+    one) can't be checked, so they're thrown away too and listed in
+    ``stats['unverified']`` for the caller to get some other way.
+
+    Args:
+        iobj (:class:`ligmos.utils.classes.dataTarget`)
+            Class containing instrument machine target information.
+        baseYcmd (:obj:`str`)
+            String describing how to properly start Yvette on the target.
+        srcdir (:obj:`str`)
+            Remote directory being transferred.
+        files (:obj:`list`)
+            List of remote paths (under ``srcdir``) to transfer.
+        destdir (:obj:`str`)
+            Local directory that ``srcdir`` is copied *into*.
+        htype (:obj:`str`, optional)
+            Hashing function type. Defaults to 'xx64'.
+        zstd (:obj:`bool`, optional)
+            Compress the stream with zstd. Only honored if the zstandard
+            module is available here and zstd is on the remote host.
+            Defaults to False.
+        timeout (:obj:`float`, optional)
+            Seconds before the transfer is killed. None or <= 0 means
+            no timeout. Defaults to 600.
+        debug (:obj:`bool`, optional)
+            Bool to trigger additional debugging outputs. Defaults to False.
+
+    Returns:
+        retcode (:obj:`int`)
+            0 on success, same convention as
+            :func:`dataservants.wadsworth.rsyncer.subpRsync` otherwise.
+        stats (:obj:`dict` or :obj:`str`)
+            Transfer stats in the same style as the rsync ones, or an
+            error string if things went sideways.
+    """
+    if zstd is True and zstandard is None:
+        print("--> zstandard unavailable; sending uncompressed tar")
+        zstd = False
+    elif zstd is True and remoteZstd(iobj, debug=debug) is False:
+        print("--> No zstd on %s; sending uncompressed tar" % (iobj.host))
+        zstd = False
+
+    srcdir = os.path.normpath(srcdir)
+    parent = os.path.dirname(srcdir)
+    bdir = os.path.basename(srcdir)
+    # Where Yvette's manifest gets unpacked; never clobber our own one!
+    rhfname = "%s/AListofHashes.%s" % (bdir, htype)
+    yhfname = os.path.join(destdir, bdir, "RemoteListofHashes.%s" % (htype))
+
+    fcmd = rStringTarPipe(baseYcmd, srcdir, iobj.filemask,
+                          htype=htype, zstd=zstd)
+    sshcmd = sshCommand(iobj, fcmd)
+    if debug is True:
+        print(" ".join(sshcmd))
+
+    try:
+        proc = sub.Popen(sshcmd, stdin=sub.PIPE, stdout=sub.PIPE,
+                         stderr=sub.PIPE)
+    except FileNotFoundError as err:
+        print("ssh command not found!")
+        return -9999, err.strerror
+
+    # Hand over the file list in the background so a big list can't
+    #   deadlock against the tar stream coming back
+    flist = "\n".join([os.path.relpath(f, parent) for f in files]) + "\n"
+
+    def feeder():
+        try:
+            proc.stdin.write(flist.encode("utf-8"))
+            proc.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+    threading.Thread(target=feeder, daemon=True).start()
+
+    errbuf = []
+    errreader = threading.Thread(target=lambda: errbuf.append(
+                                 proc.stderr.read()), daemon=True)
+    errreader.start()
+
+    killer = None
+    if timeout is not None and timeout > 0:
+        killer = threading.Timer(timeout, proc.kill)
+        killer.start()
+
+    wire = CountingReader(proc.stdout)
+    if zstd is True:
+        stream = zstandard.ZstdDecompressor().stream_reader(wire)
+    else:
+        stream = wire
+
+    stats = {'nfiles': {'nreg': 0, 'ndir': 0}, 'nregxfered': 0.,
+             'totxfersize': 0., 'nfailed': 0., 'totrecv': 0.,
+             'digests': {}}
+    rhashes = None
+    failed = []
+    unverified = []
+    try:
+        with tarfile.open(fileobj=stream, mode='r|') as tar:
+            for member in tar:
+                if member.isdir():
+                    os.makedirs(os.path.join(destdir, member.name),
+                                exist_ok=True)
+                    continue
+                elif member.isfile() is False:
+                    continue
+
+                # Guard against anything trying to escape the destination
+                lfile = os.path.normpath(os.path.join(destdir, member.name))
+                if lfile.startswith(os.path.normpath(destdir) + os.sep) is \
+                   False:
+                    print("--> Skipping suspicious member %s" % (member.name))
+                    continue
+
+                fobj = tar.extractfile(member)
+                if member.name == rhfname:
+                    # Yvette's manifest always comes first in the stream
+                    os.makedirs(os.path.dirname(yhfname), exist_ok=True)
+                    with open(yhfname, 'wb') as hf:
+                        hf.write(fobj.read())
+                    rhashes = utils.hashes.readHashFile(yhfname,
+                                                        basenamed=True,
+                                                        debug=debug)
+                    continue
+
+                good, digest = receiveMember(fobj, member, lfile, rhashes,
+                                             htype=htype)
+                stats['nfiles']['nreg'] += 1
+                if good is True:
+                    relpath = os.path.relpath(member.name, bdir)
+                    stats['digests'].update({relpath: digest})
+                    stats['nregxfered'] += 1
+                    stats['totxfersize'] += member.size
+                elif good is None:
+                    unverified.append(os.path.join(parent, member.name))
+                else:
+                    stats['nfailed'] += 1
+                    failed.append(member.name)
+                    print("--> %s failed its hash check!" % (member.name))
+    except (tarfile.TarError, OSError) as err:
+        proc.kill()
+        print(str(err))
+        return -999, "tar stream from %s failed: %s" % (iobj.host, str(err))
+    finally:
+        if killer is not None:
+            killer.cancel()
+        proc.wait()
+        errreader.join()
+
+    stats['totrecv'] = float(wire.nbytes)
+    stats['totsize'] = stats['totxfersize']
+    # Everything in a tar stream is literal data; there's no delta here
+    stats['literaldata'] = stats['totxfersize']
+    stats['failed'] = failed
+    stats['unverified'] = unverified
+
+    if proc.returncode < 0:
+        return -99, "tar stream from %s timed out" % (iobj.host)
+    elif proc.returncode != 0:
+        errstr = b''.join([e for e in errbuf if e is not None])
+        if debug is True:
+            print(errstr.decode("utf-8", errors='replace'))
+        if proc.returncode == 127:
+            # The remote shell couldn't find something in the pipeline
+            if zstd is True:
+                # It was there when we asked, but go without from now on
+                iobj.remoteZstd = False
+                return -999, "zstd not found on %s" % (iobj.host)
+            return -9999, "tar not found on %s" % (iobj.host)
+        return -999, "tar stream returned code %d" % (proc.returncode)
+
+    return 0, stats
+
+
+def receiveMember(fobj, member, lfile, rhashes, htype='xx64',
+                  bsize=2**22):
+    """
+    Write a single tar member to disk, hashing it on the way through, and
+    only move it into its final place if the hash matches the manifest.
+
+    Returns (good, digest), where good is None if the member isn't in
+    the manifest (or there's no manifest) and so couldn't be checked.
+    """
+    hasher = yvette.filehashing.newHasher(htype)
+    tmpfile = os.path.join(os.path.dirname(lfile),
+                           ".%s.part" % (os.path.basename(lfile)))
+    os.makedirs(os.path.dirname(lfile), exist_ok=True)
+
+    with open(tmpfile, 'wb') as out:
+        for chunk in iter(lambda: fobj.read(bsize), b''):
+            hasher.update(chunk)
+            out.write(chunk)
+
+    digest = hasher.hexdigest()
+    try:
+        good = rhashes[os.path.basename(lfile)] == digest
+    except (KeyError, TypeError):
+        # Not in the manifest (or no manifest at all) so we can't vouch
+        #   for it; it'll have to come some other way
+        print("--> %s isn't in the remote manifest!" % (member.name))
+        os.remove(tmpfile)
+        return None, digest
+
+    if good is True:
+        os.replace(tmpfile, lfile)
+        os.utime(lfile, (member.mtime, member.mtime))
+    else:
+        os.remove(tmpfile)
+
+    return good, digest
@@ -16,13 +16,158 @@ to some extra processing logic to make sure things are all ok.
 
 from __future__ import division, print_function, absolute_import
 
+import os
+import time
 import datetime as dt
 
 from ligmos import utils
 from .. import yvette
+from . import journal
+from . import landing
+from . import planner
+from . import replicate
+from . import rsyncer
+from . import scheduler
+from . import sftpengine
+from . import compression
+from . import estimator
+from . import tarpipe
 
 
-def buttleData(eSSH, baseYcmd, args, iobj):
+def transferPacket(iobj, srcdir, stats, telapsed, retcode,
+                   transport='rsync', compress=None, gain=None, ts=None):
+    """Make an InfluxDB packet describing a single directory transfer.
+
+    Args:
+        iobj (:class:`ligmos.utils.classes.dataTarget`)
+            Class containing instrument machine target information.
+        srcdir (:obj:`str`)
+            Remote directory that was transferred.
+        stats (:obj:`dict`)
+            Transfer statistics, as returned by
+            :func:`dataservants.wadsworth.rsyncer.parseRsyncStats`.
+        telapsed (:obj:`float`)
+            Wall clock duration of the transfer, in seconds.
+        retcode (:obj:`int`)
+            Return code of the transfer; 0 means success.
+        transport (:obj:`str`, optional)
+            Name of the transport that was used. Defaults to 'rsync'.
+        compress (:obj:`str`, optional)
+            Compression choice that was used, if known. Defaults to None.
+        gain (:obj:`float`, optional)
+            Effective throughput relative to the uncompressed link speed,
+            if known. Defaults to None.
+        ts (:class:`datetime.datetime`, optional)
+            Timestamp for the packet. Defaults to None, which lets
+            InfluxDB stamp it on ingestion.
+
+    Returns:
+        packet (:obj:`list` of :obj:`dicts`)
+            Dictionary in the style of an InfluxDB data packet.
+
+            .. code-block:: python
+
+                packet = [{'measurement': 'TransferStats',
+                           'tags': {'host': 'rc1',
+                                    'directory': '20180305a',
+                                    'transport': 'rsync'},
+                           'time': None,
+                           'fields': {'retcode': 0,
+                                      'duration': 12.5,
+                                      'nfiles': 120,
+                                      'nxfered': 12,
+                                      'totsize': 3435973836.8,
+                                      'xfersize': 419430400.0,
+                                      'literalratio': 1.0,
+                                      'effectiveMBps': 32.0,
+                                      'wireMBps': 31.9}}]
+    """
+    meas = ['TransferStats']
+    tags = {'host': iobj.host,
+            'directory': os.path.basename(os.path.normpath(srcdir)),
+            'transport': transport}
+    if compress is not None:
+        tags.update({'compression': compress})
+
+    fields = {'retcode': retcode, 'duration': float(telapsed)}
+    if gain is not None:
+        fields.update({'compressionGain': gain})
+
+    # A failed transfer (or a weird rsync) won't have any stats at all
+    if isinstance(stats, dict) and stats != {}:
+        nfiles = stats.get('nfiles', {})
+        if isinstance(nfiles, dict):
+            fields.update({'nfiles': nfiles.get('nreg', 0)})
+
+        dbmap = {'nxfered': 'nregxfered',
+                 'totsize': 'totsize',
+                 'xfersize': 'totxfersize',
+                 'literal': 'literaldata',
+                 'matched': 'matchdata',
+                 'flisttime': 'flisttime',
+                 'bytesSent': 'totsent',
+                 'bytesRecv': 'totrecv',
+                 'nfailed': 'nfailed'}
+        for each in dbmap:
+            val = stats.get(dbmap[each], None)
+            if isinstance(val, float):
+                fields.update({each: val})
+
+        # Fraction of the transferred data that actually had to go over
+        #   the wire rather than being matched against what was here
+        literal = fields.get('literal', 0.)
+        matched = fields.get('matched', 0.)
+        if literal + matched > 0:
+            fields.update({'literalratio': literal/(literal + matched)})
+
+        if telapsed > 0:
+            fields.update({'effectiveMBps':
+                           fields.get('xfersize', 0.)/telapsed/2.**20})
+            fields.update({'wireMBps':
+                           fields.get('bytesRecv', 0.)/telapsed/2.**20})
+
+    packet = utils.packetizer.makeInfluxPacket(meas=meas,
+                                               ts=ts,
+                                               tags=tags,
+                                               fields=fields)
+
+    return packet
+
+
+def progressReporter(iobj, srcdir, db=None, interval=10.):
+    """Make a callback for live rsync --info=progress2 updates.
+
+    The returned function is handed to
+    :func:`dataservants.wadsworth.rsyncer.subpRsync` and will store a
+    TransferProgress packet at most every ``interval`` seconds so we
+    don't hammer the database during a long transfer.
+    """
+    meas = ['TransferProgress']
+    tags = {'host': iobj.host,
+            'directory': os.path.basename(os.path.normpath(srcdir))}
+    last = {'time': None}
+
+    def reporter(prog):
+        now = dt.datetime.utcnow()
+        if last['time'] is not None:
+            if (now - last['time']).total_seconds() < interval:
+                return
+        last['time'] = now
+
+        print("--> %s: %d%% at %.2f MiB/s" % (tags['directory'],
+                                              prog['percent'],
+                                              prog['rate']/2.**20))
+        if db is not None:
+            packet = utils.packetizer.makeInfluxPacket(meas=meas,
+                                                       ts=now,
+                                                       tags=tags,
+                                                       fields=prog)
+            db.singleCommit(packet, table=iobj.tablename, close=True)
+
+    return reporter
+
+
+def buttleData(eSSH, baseYcmd, args, iobj, db=None):
     """
     """
     # For debugging alarms
@@ -52,13 +197,609 @@ def buttleData(eSSH, baseYcmd, args, iobj):
     # Actually get the dir list on Yvette's machine
     ans, _ = utils.common.instAction(getNew)
 
-    # rsync each directory, one by one so we can gather the stats
-    for each in ans['DirsNew'][1]:
-        # Now to start the checking process, multi-stage
-        print("--> rsyncing remote %s:%s to local %s" % (iobj.host,
-                                                         each, iobj.destdir))
+    # The journal tells us what got done last time, even if we were killed
+    jrnl = journal.TransferJournal(args.journal)
+
+    jobs = gatherJobs(eSSH, baseYcmd, args, iobj, jrnl, ans['DirsNew'][1])
+
+    # Fit the work into the time we have left, most important first
+    telapsed = (dt.datetime.utcnow() - startt).total_seconds()
+    scheduled, deferred = planJobs(args, iobj, jrnl, jobs,
+                                   args.budget - telapsed)
+
+    started = [job.srcdir for job in scheduled]
+    for job in deferred:
+        if job.srcdir not in started:
+            print("--> Deferring %s to the next loop" % (job.srcdir))
+        # Ones that were cut off mid-transfer stay that way, so they
+        #   still go first next time
+        if job.resumed is True:
+            continue
+        state, _ = jrnl.dirState(iobj.host, job.srcdir)
+        if state != journal.TRANSFERRING:
+            jrnl.markDir(iobj.host, job.srcdir, journal.PENDING,
+                         fprint=job.fprint)
+
+    # Transfer each directory, one by one so we can gather the stats
+    for job in scheduled:
+        # Never let a transfer run past the time we were given
+        telapsed = (dt.datetime.utcnow() - startt).total_seconds()
+        remaining = args.budget - telapsed
+        if remaining <= 0:
+            print("--> Out of time; leaving %s for next loop" % (job.srcdir))
+            continue
+        buttleDirectory(eSSH, baseYcmd, args, iobj, job, db=db, jrnl=jrnl,
+                        timeout=remaining)
+
+
+def gatherJobs(eSSH, baseYcmd, args, iobj, jrnl, dirs):
+    """
+    Get a (cheap, stat-only) look at each directory so we know what's
+    actually needed, and turn the ones that aren't already done into jobs.
+    """
+    jobs = []
+    unfinished = jrnl.unfinishedDirs(iobj.host)
+    now = time.time()
+    for i, each in enumerate(dirs):
+        # Don't hammer away at one that keeps failing
+        retry = jrnl.retryAfter(iobj.host, each,
+                                backoff=60.*args.failBackoff)
+        if retry > now:
+            print("--> %s:%s keeps failing; not retrying for %d s" %
+                  (iobj.host, each, retry - now))
+            continue
+
+        fstats = getListing(eSSH, baseYcmd, args, iobj, each)
+        fprint = journal.fingerprint(fstats)
+        if jrnl.isFinished(iobj.host, each, fprint) is True:
+            print("--> %s:%s already verified; skipping" % (iobj.host, each))
+            # Nothing to transfer, but the mirrors might still be behind
+            catchUpMirrors(args, iobj, jrnl, each)
+            continue
+
+        needed = None
+        if fstats is not None:
+            needed = tarpipe.needsTransfer(fstats, each, iobj.destdir)
+        job = scheduler.TransferJob(each, fstats=fstats, needed=needed,
+                                    fprint=fprint, order=i)
+        # Only the ones cut off mid-transfer jump the queue
+        job.resumed = each in unfinished
+        jobs.append(job)
+
+    return jobs
+
+
+def planJobs(args, iobj, jrnl, jobs, budget):
+    """
+    Pack the jobs into the budget (seconds) using the host's estimator,
+    returning the scheduled and deferred jobs as from
+    :func:`dataservants.wadsworth.scheduler.packJobs`.
+    """
+    est = estimator.hostEstimator(iobj.host, jrnl=jrnl)
+    policy = getattr(iobj, 'priority', 'newest')
+    if policy not in scheduler.policies:
+        print("--> Unknown priority %s; using newest" % (policy))
+        policy = 'newest'
+
+    return scheduler.packJobs(jobs, budget, est=est, policy=policy)
+
+
+def planTransfers(eSSH, baseYcmd, args, iobj, db=None):
+    """
+    Work out what buttleData would transfer, in what order, and how long
+    it should take, without transferring anything. The steps end up in
+    :data:`dataservants.wadsworth.planner.timeline`.
+    """
+    # Rename to control line length
+    yR = yvette.remote
+
+    getNew = utils.common.processDescription(func=yR.commandYvetteSimple,
+                                             name='GetNewDirs',
+                                             timedelay=3.,
+                                             maxtime=60.,
+                                             needSSH=True,
+                                             args=[eSSH, baseYcmd, args,
+                                                   iobj, 'findnew'],
+                                             kwargs={'debug': args.debug})
+    ans, _ = utils.common.instAction(getNew)
+
+    jrnl = journal.TransferJournal(args.journal)
+    jobs = gatherJobs(eSSH, baseYcmd, args, iobj, jrnl, ans['DirsNew'][1])
+    scheduled, deferred = planJobs(args, iobj, jrnl, jobs, args.budget)
+
+    started = []
+    for job in scheduled:
+        note = ""
+        if job.files is not None:
+            note = "(%d of %d needed files fit)" % (len(job.files),
+                                                   len(job.needed))
+        elif job.fstats is None:
+            note = "(no listing; can't tell)"
+        nfiles = len(job.files if job.files is not None else job.needed or [])
+        planner.addStep(iobj.host, job.srcdir, 'transfer', nfiles=nfiles,
+                        nbytes=job.nbytes or 0, est=job.estimate, note=note)
+        started.append(job.srcdir)
+
+    for job in deferred:
+        if job.srcdir not in started:
+            planner.addStep(iobj.host, job.srcdir, 'transfer',
+                            nfiles=len(job.needed or []),
+                            nbytes=job.nbytes or 0, est=job.estimate,
+                            scheduled=False)
+
+    return scheduled, deferred
+
+
+def getListing(eSSH, baseYcmd, args, iobj, srcdir):
+    """Ask Yvette for a stat-only listing of a remote directory.
+
+    Returns:
+        fstats (:obj:`dict`)
+            Remote file stats, as returned by
+            :func:`dataservants.yvette.filehashing.getFileStats`, or None
+            if Yvette didn't answer sensibly.
+    """
+    # Quick hack, same as Mandos, to point Yvette at the specific directory
+    oiobjsrc = iobj.srcdir
+    iobj.srcdir = srcdir
+    ans = yvette.remote.commandYvetteSimple(eSSH, baseYcmd, args, iobj,
+                                            'listing', debug=args.debug)
+    iobj.srcdir = oiobjsrc
+
+    try:
+        fstats = ans['FileStats']
+    except (KeyError, TypeError):
+        print("--> No file listing from Yvette for %s" % (srcdir))
+        fstats = None
+
+    return fstats
+
+
+def pickTransport(args, iobj, srcdir, fstats):
+    """Decide how a given remote directory should be transferred.
+
+    Compares the remote listing against what's already here, then picks
+    either rsync or a bulk tar stream depending on how many (and how small)
+    the needed files are.
+
+    Returns:
+        transport (:obj:`str`)
+            Either 'rsync' or 'tar'.
+        needed (:obj:`list`)
+            Remote paths that need transferring, or None if unknown.
+    """
+    if fstats is None:
+        return 'rsync', None
+
+    needed = tarpipe.needsTransfer(fstats, srcdir, iobj.destdir)
+    if args.transport == 'auto':
+        transport = tarpipe.chooseTransport(fstats, needed,
+                                            minfiles=args.tarMinFiles,
+                                            maxmedian=args.tarMaxSize*2**10)
+    else:
+        transport = args.transport
+
+    if transport == 'tar' and getattr(iobj, 'tarBroken', False) is True:
+        transport = 'rsync'
+    if transport == 'rsync' and getattr(iobj, 'rsyncBroken', False) is True:
+        transport = 'sftp'
+
+    print("--> %d of %d files needed; using %s" % (len(needed), len(fstats),
+                                                   transport))
+
+    return transport, needed
+
+
+def journalResults(jrnl, iobj, srcdir, fstats, fprint, ret, stats):
+    """Record how a directory transfer went in the journal.
+
+    A directory only counts as verified if every file in Yvette's listing
+    is now here with the right size and modification time, and nothing
+    failed a hash check on the way in.
+    """
+    if ret != 0:
+        jrnl.markDir(iobj.host, srcdir, journal.FAILED, fprint=fprint)
+        return
+    elif fstats is None:
+        # Without Yvette's listing there's nothing to check it against
+        jrnl.markDir(iobj.host, srcdir, journal.DONE, fprint=fprint)
+        return
+
+    digests = {}
+    nfailed = 0
+    if isinstance(stats, dict):
+        digests = stats.get('digests', {})
+        nfailed = stats.get('nfailed', 0)
+
+    missing = tarpipe.needsTransfer(fstats, srcdir, iobj.destdir)
+    rdir = os.path.normpath(srcdir)
+    entries = []
+    for rfile in fstats:
+        if rfile in missing:
+            continue
+        relpath = os.path.relpath(rfile, rdir)
+        entries.append((relpath, fstats[rfile][0], fstats[rfile][1],
+                        digests.get(relpath, None), journal.VERIFIED))
+    jrnl.markFiles(iobj.host, srcdir, entries)
+
+    if missing == [] and nfailed == 0:
+        state = journal.VERIFIED
+    else:
+        print("--> %d files still missing from %s" % (len(missing), srcdir))
+        state = journal.DONE
+
+    nbytes = sum([fstats[each][0] for each in fstats])
+    jrnl.markDir(iobj.host, srcdir, state, fprint=fprint,
+                 nfiles=len(fstats), nbytes=nbytes)
+
+
+def manifestLanded(eSSH, args, iobj, srcdir, transport, stats):
+    """Write the local manifest for the files that just landed.
+
+    The hashes were computed as the files arrived, so this is where the
+    destination copy gets verified against Yvette's manifest without
+    reading anything a second time. Anything that doesn't match is removed
+    so that it's transferred again next time around.
+
+    On the way out, ``stats['digests']`` is left as {relpath: digest} of
+    the good files for the journal.
+    """
+    localdir = os.path.join(iobj.destdir,
+                            os.path.basename(os.path.normpath(srcdir)))
+    digests = stats.get('digests', {})
+    if transport in ['tar', 'sftp']:
+        # These only keep (and give digests for) files that matched
+        #   Yvette's manifest; anything that wasn't in it is in
+        #   stats['unverified'] and was left for rsync
+        digests = dict([(os.path.join(localdir, each), digests[each])
+                        for each in digests])
+    elif digests != {}:
+        rhashes = landing.fetchRemoteManifest(eSSH, srcdir, localdir,
+                                              htype=args.hashtype,
+                                              debug=args.debug)
+        bad = landing.compareManifest(rhashes, digests,
+                                      htype=args.hashtype, debug=args.debug)
+        for lfile in bad:
+            print("--> %s failed its hash check!" % (lfile))
+            digests.pop(lfile)
+            os.remove(lfile)
+        stats['nfailed'] = stats.get('nfailed', 0) + len(bad)
+        stats['failed'] = stats.get('failed', []) + bad
+
+    landing.updateManifest(localdir, digests, htype=args.hashtype,
+                           debug=args.debug)
+    stats['digests'] = dict([(os.path.relpath(each, localdir),
+                              digests[each]) for each in digests])
+
+
+def replicateLanded(args, iobj, srcdir, stats, jrnl=None):
+    """
+    Copy the files that just landed (and passed their hash checks) out to
+    any secondary destinations configured for the instrument. A mirror
+    that missed some files last time gets everything the journal knows
+    about, not just what's new, so it catches up.
+    """
+    digests = stats.get('digests', {})
+    mirrors = replicate.mirrorDirs(iobj)
+    if mirrors == [] or digests == {}:
+        return
+
+    lagging = []
+    if jrnl is not None:
+        lagging = jrnl.laggingMirrors(iobj.host, srcdir)
+
+    for mirror in mirrors:
+        todo = digests
+        if mirror in lagging:
+            todo = jrnl.fileDigests(iobj.host, srcdir)
+            todo.update(digests)
+        replicateTo(args, iobj, srcdir, mirror, todo, jrnl=jrnl)
+
+
+def catchUpMirrors(args, iobj, jrnl, srcdir):
+    """
+    Replicate an already verified directory to any mirrors it didn't
+    fully make it to, since it won't be transferred (and so replicated)
+    again on its own.
+    """
+    lagging = jrnl.laggingMirrors(iobj.host, srcdir)
+    mirrors = [each for each in replicate.mirrorDirs(iobj)
+               if each in lagging]
+    if mirrors == []:
+        return
+
+    digests = jrnl.fileDigests(iobj.host, srcdir)
+    for mirror in mirrors:
+        print("--> Catching %s up on %s:%s" % (mirror, iobj.host, srcdir))
+        replicateTo(args, iobj, srcdir, mirror, digests, jrnl=jrnl)
+
+
+def replicateTo(args, iobj, srcdir, mirror, digests, jrnl=None):
+    """
+    Replicate the given files ({relpath: digest}) of a local directory
+    to one mirror, noting in the journal whether they all made it.
+    """
+    localdir = os.path.join(iobj.destdir,
+                            os.path.basename(os.path.normpath(srcdir)))
+    t1 = dt.datetime.utcnow()
+    rstats = replicate.replicateDir(localdir, mirror, digests,
+                                    htype=args.hashtype,
+                                    hardlink=args.mirrorHardlink,
+                                    debug=args.debug)
+    telapsed = (dt.datetime.utcnow() - t1).total_seconds()
+    print("--> Replicated %d files (%.1f MiB) to %s in %.1f s; %s" %
+          (rstats['ncopied'], rstats['nbytes']/2.**20, mirror,
+           telapsed, rstats['methods']))
+    if rstats['nfailed'] > 0:
+        print("--> %d files failed to replicate to %s!" %
+              (rstats['nfailed'], mirror))
+        state = journal.FAILED
+    else:
+        state = journal.VERIFIED
+
+    if jrnl is not None:
+        jrnl.markMirror(iobj.host, srcdir, mirror, state,
+                        nfailed=rstats['nfailed'])
+
+
+def rsyncBroken(ret, stats):
+    """
+    True if rsync failed in a way that means it's never going to work
+    for this host (as opposed to, say, a network hiccup).
+    """
+    if isinstance(stats, dict):
+        stats = stats.get('error', None)
+
+    if ret == -9999:
+        return True
+    elif ret == -999 and isinstance(stats, str):
+        errstr = stats.lower()
+        for each in ['command not found', 'protocol version mismatch',
+                     'no such file or directory: rsync']:
+            if each in errstr:
+                return True
+
+    return False
+
+
+def transferRsync(args, iobj, srcdir, comp, files=None, fstats=None,
+                  timeout=0, db=None):
+    """
+    Transfer a remote directory (or just the given files in it) with rsync,
+    hashing the files as they land.
+
+    Even if rsync fails or times out, the stats come back as a dict (with
+    the error string in ``stats['error']``) so that the files that did
+    land and got hashed aren't forgotten.
+    """
+    rsyncargs = compression.rsyncArgs(comp)
+    rsyncsrc = "%s@%s:%s" % (iobj.user, iobj.host, srcdir)
+    rsyncdest = iobj.destdir
+    flist = None
+    if files is not None:
+        # Just this piece of the directory, so hand rsync the list
+        flist = rsyncer.filesFrom(files, srcdir)
+        rsyncargs = rsyncargs + ['--files-from=%s' % (flist)]
+        rsyncsrc = "%s/" % (rsyncsrc.rstrip("/"))
+        rsyncdest = os.path.join(iobj.destdir,
+                                 os.path.basename(os.path.normpath(srcdir)))
+    # We make our own manifest as things land, so don't let Yvette's
+    #   one come along and pretend to be ours
+    rsyncargs = rsyncargs + ['--exclude=AListofHashes.*']
+    print(rsyncsrc)
+    prog = progressReporter(iobj, srcdir, db=db)
+
+    # What each file should look like once it's landed, so it's not
+    #   hashed until it does
+    expected = None
+    if fstats is not None:
+        rdir = os.path.normpath(srcdir)
+        localdir = os.path.join(iobj.destdir, os.path.basename(rdir))
+        expected = dict([(os.path.join(localdir,
+                                       os.path.relpath(each, rdir)),
+                          fstats[each]) for each in fstats])
+    hasher = landing.LandingHasher(rsyncdest, iobj.filemask,
+                                   htype=args.hashtype,
+                                   expected=expected,
+                                   debug=args.debug)
+    ret, stats = rsyncer.subpRsync(rsyncsrc, rsyncdest,
+                                   args=rsyncargs,
+                                   timeout=timeout, progress=prog,
+                                   landed=hasher.landed,
+                                   debug=args.debug)
+    digests = hasher.finish()
+    if flist is not None:
+        os.remove(flist)
+    if isinstance(stats, dict) is False:
+        stats = {'error': stats}
+    stats['digests'] = digests
+
+    return ret, stats
+
+
+def rsyncUnverified(args, iobj, srcdir, comp, fstats, stats, timeout=0,
+                    t1=None, db=None):
+    """
+    The tar stream and SFTP can only vouch for the files in Yvette's
+    manifest, and leave the rest behind; get those with rsync instead, and
+    fold how that went into their stats.
+    """
+    unverified = stats['unverified']
+    if getattr(iobj, 'rsyncBroken', False) is True:
+        print("--> %d files from %s couldn't be verified, and rsync is "
+              "unusable; leaving them for now" % (len(unverified), srcdir))
+        return 0, stats
+
+    print("--> %d files from %s couldn't be verified; using rsync for them" %
+          (len(unverified), srcdir))
+    remaining = timeout
+    if timeout is not None and timeout > 0 and t1 is not None:
+        remaining -= (dt.datetime.utcnow() - t1).total_seconds()
+        # <= 0 would mean no timeout at all, which isn't the idea
+        remaining = max(remaining, 1.)
+    ret, rstats = transferRsync(args, iobj, srcdir, comp, files=unverified,
+                                fstats=fstats, timeout=remaining, db=db)
+
+    # They weren't in Yvette's manifest, so there's nothing more to check
+    #   them against; just put them in with the others
+    localdir = os.path.join(iobj.destdir,
+                            os.path.basename(os.path.normpath(srcdir)))
+    for lfile in rstats['digests']:
+        stats['digests'].update({os.path.relpath(lfile, localdir):
+                                 rstats['digests'][lfile]})
+    for each in ['nregxfered', 'totxfersize', 'totrecv', 'literaldata',
+                 'totsize']:
+        if isinstance(rstats.get(each, None), float):
+            stats[each] = stats.get(each, 0.) + rstats[each]
+    if ret != 0:
+        stats['error'] = rstats.get('error', None)
+
+    return ret, stats
+
+
+def transferSftp(eSSH, baseYcmd, args, iobj, srcdir, files, fstats,
+                 timeout=0):
+    """
+    Transfer the given files from a remote directory with the built-in
+    SFTP engine, after making sure Yvette's manifest is up to date so the
+    files can be checked as they arrive.
+    """
+    if files is None:
+        return -999, "no listing for %s, so can't use SFTP" % (srcdir)
+
+    # Quick hack, same as Mandos, to point Yvette at the specific directory
+    oiobjsrc = iobj.srcdir
+    iobj.srcdir = srcdir
+    yvette.remote.commandYvetteSimple(eSSH, baseYcmd, args, iobj, 'pack',
+                                      debug=args.debug)
+    iobj.srcdir = oiobjsrc
+
+    localdir = os.path.join(iobj.destdir,
+                            os.path.basename(os.path.normpath(srcdir)))
+    os.makedirs(localdir, exist_ok=True)
+    rhashes = landing.fetchRemoteManifest(eSSH, srcdir, localdir,
+                                          htype=args.hashtype,
+                                          debug=args.debug)
+
+    ret, stats = sftpengine.sftpTransfer(eSSH, srcdir, files, fstats,
+                                         iobj.destdir, rhashes=rhashes,
+                                         htype=args.hashtype,
+                                         nworkers=args.sftpWorkers,
+                                         timeout=timeout, debug=args.debug)
+
+    return ret, stats
+
+
+def buttleDirectory(eSSH, baseYcmd, args, iobj, job, db=None,
+                    jrnl=None, timeout=0):
+    """Transfer a single remote directory (or piece of one) and record how
+    it went.
+
+    Args:
+        job (:class:`dataservants.wadsworth.scheduler.TransferJob`)
+            The directory to transfer. If ``job.files`` is set only that
+            subset of the needed files is transferred.
+
+    Returns:
+        ret (:obj:`int`)
+            Return code of the transfer; 0 means success.
+        stats (:obj:`dict` or :obj:`str`)
+            Transfer statistics, or an error string on failure.
+    """
+    srcdir = job.srcdir
+    fstats = job.fstats
+    fprint = job.fprint
+    if jrnl is not None:
+        # Committed right away, so if we die mid-transfer we'll know
+        jrnl.markDir(iobj.host, srcdir, journal.TRANSFERRING, fprint=fprint)
+
+    # Now to start the checking process, multi-stage
+    print("--> Transferring remote %s:%s to local %s" % (iobj.host,
+                                                         srcdir,
+                                                         iobj.destdir))
+
+    transport, needed = pickTransport(args, iobj, srcdir, fstats)
+    if job.files is not None:
+        needed = job.files
+    comp = compression.currentChoice(eSSH, baseYcmd, args, iobj, srcdir,
+                                     db=db)
+
+    t1 = dt.datetime.utcnow()
+    if transport == 'tar':
+        zstd = args.tarZstd or comp != 'none'
+        ret, stats = tarpipe.subpTarPipe(iobj, baseYcmd, srcdir, needed,
+                                         iobj.destdir, htype=args.hashtype,
+                                         zstd=zstd, timeout=timeout,
+                                         debug=args.debug)
+        if ret == -9999:
+            # Same idea as rsyncBroken; it'll be picked up by rsync (or
+            #   SFTP) next time around instead
+            print("--> tar unusable for %s; not using it again" %
+                  (iobj.host))
+            iobj.tarBroken = True
+        elif ret == 0 and stats['unverified'] != []:
+            ret, stats = rsyncUnverified(args, iobj, srcdir, comp, fstats,
+                                         stats, timeout=timeout, t1=t1,
+                                         db=db)
+    elif transport == 'sftp':
+        ret, stats = transferSftp(eSSH, baseYcmd, args, iobj, srcdir,
+                                  needed, fstats, timeout=timeout)
+        if ret == 0 and stats['unverified'] != []:
+            ret, stats = rsyncUnverified(args, iobj, srcdir, comp, fstats,
+                                         stats, timeout=timeout, t1=t1,
+                                         db=db)
+    else:
+        ret, stats = transferRsync(args, iobj, srcdir, comp,
+                                   files=job.files, fstats=fstats,
+                                   timeout=timeout, db=db)
+        if rsyncBroken(ret, stats) is True and needed is not None:
+            # Don't bother trying rsync on this host again
+            print("--> rsync unusable for %s; falling back to SFTP" %
+                  (iobj.host))
+            iobj.rsyncBroken = True
+            transport = 'sftp'
+            remaining = timeout
+            if timeout is not None and timeout > 0:
+                remaining -= (dt.datetime.utcnow() - t1).total_seconds()
+                # <= 0 would mean no timeout at all, which isn't the idea
+                remaining = max(remaining, 1.)
+            ret, stats = transferSftp(eSSH, baseYcmd, args, iobj, srcdir,
+                                      needed, fstats, timeout=remaining)
+    telapsed = (dt.datetime.utcnow() - t1).total_seconds()
+    if ret != 0:
+        errstr = stats
+        if isinstance(stats, dict):
+            errstr = stats.get('error', None)
+        print("--> %s failed (%d): %s" % (transport, ret, errstr))
+
+    # Whatever made it here got hashed on the way in, even if the transfer
+    #   as a whole didn't finish
+    if isinstance(stats, dict):
+        manifestLanded(eSSH, args, iobj, srcdir, transport, stats)
+        replicateLanded(args, iobj, srcdir, stats, jrnl=jrnl)
+
+    if jrnl is not None:
+        journalResults(jrnl, iobj, srcdir, fstats, fprint, ret, stats)
+        nbytes = None
+        if isinstance(stats, dict):
+            nbytes = stats.get('totxfersize', None)
+        jrnl.recordTransfer(iobj.host, srcdir, transport, comp,
+                            len(needed) if needed is not None else None,
+                            nbytes, telapsed, ret)
+
+    # The tar stream decides its own compression, so only learn from rsync
+    gain = None
+    if transport == 'rsync':
+        gain = compression.updateState(iobj, comp, ret, stats, telapsed,
+                                       db=db)
+
+    packet = transferPacket(iobj, srcdir, stats, telapsed, ret,
+                            transport=transport, compress=comp, gain=gain,
+                            ts=dt.datetime.utcnow())
+    print(packet)
+    if db is not None:
+        # Actually commit the packet. singleCommit opens it,
+        #   writes the packet, and then optionally closes it.
+        db.singleCommit(packet, table=iobj.tablename, close=True)
 
-        rsyncsrc = "%s@%s:%s" % (iobj.user, iobj.host, each)
-        print(rsyncsrc)
-        ret = utils.rsyncer.subpRsync(rsyncsrc, iobj.destdir, timeout=0)
-        print(ret)
+    return ret, stats
@@ -1,3 +1,5 @@
+from . import compress
+from . import cleaning
 from . import filehashing
 from . import parseargs
 from . import remote
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Yvette's side of actually deleting data that's safely archived.
+
+Mandos decides what can go, but nothing should be deleted just because
+someone ran ``Yvette.py --clean`` by hand. So Mandos sends a batch of
+directories, each with the root digest of the manifest it compared
+(:func:`dataservants.yvette.filehashing.manifestRoot`), signed with an
+HMAC key that both sides have a copy of. Yvette refuses anything that
+isn't signed, is stale, or points outside the data directory. Before
+touching a directory she checks that:
+
+    * Her manifest still has the same root that Mandos compared
+    * The data files on disk are exactly the ones in that manifest
+    * None of them have been modified since the manifest was written
+
+Only then are the manifest's files (and the manifest itself) unlinked,
+directory by directory with unlinkat() and at a limited rate so the
+instrument's disks aren't hammered while it might be observing. Anything
+else in there is left alone, along with the directories holding it.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+
+from ligmos import utils
+from . import filehashing
+
+
+def loadKey(keyfile):
+    """
+    Read the shared signing key, or None if it's not there.
+    """
+    try:
+        with open(os.path.expanduser(keyfile), 'rb') as kf:
+            key = kf.read().strip()
+    except (IOError, OSError):
+        return None
+
+    if key == b'':
+        return None
+
+    return key
+
+
+def signPayload(key, payload):
+    """
+    HMAC-SHA256 (hex) of an encoded batch payload.
+    """
+    return hmac.new(key, payload, hashlib.sha256).hexdigest()
+
+
+def packBatch(key, basedir, dirs, htype='xx64', filetype="*.fits"):
+    """Make a signed batch of directories for Yvette to delete.
+
+    Args:
+        key (:obj:`bytes`)
+            Shared signing key.
+        basedir (:obj:`str`)
+            Data directory on the remote host; everything in the batch must
+            be underneath it.
+        dirs (:obj:`list`)
+            List of [directory, manifest root] pairs.
+        htype (:obj:`str`, optional)
+            Hashing function type of the manifests. Defaults to 'xx64'.
+        filetype (:obj:`str`, optional)
+            Wildcard string to match data files. Defaults to "*.fits".
+
+    Returns:
+        batch (:obj:`str`)
+            URL-safe base64 encoded JSON payload, fit for a command line.
+        signature (:obj:`str`)
+            Hex HMAC of ``batch``.
+    """
+    payload = {'basedir': basedir, 'htype': htype, 'filetype': filetype,
+               'issued': time.time(),
+               'dirs': [{'dir': d, 'root': r} for d, r in dirs]}
+    batch = base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8"))
+
+    return batch.decode("ascii"), signPayload(key, batch)
+
+
+def unpackBatch(key, batch, signature, maxage=3600.):
+    """
+    Check the signature and age of a batch and return its payload, or
+    raise ValueError if it shouldn't be trusted.
+    """
+    if key is None:
+        raise ValueError("no signing key")
+
+    batch = batch.encode("ascii")
+    if hmac.compare_digest(signPayload(key, batch), signature) is False:
+        raise ValueError("bad signature")
+
+    payload = json.loads(base64.urlsafe_b64decode(batch).decode("utf-8"))
+    if abs(time.time() - payload['issued']) > maxage:
+        raise ValueError("batch is stale")
+
+    return payload
+
+
+def insideDir(basedir, tdir):
+    """
+    True if tdir is really (i.e. after symlinks) underneath basedir, and
+    isn't basedir itself.
+    """
+    rbase = os.path.realpath(os.path.expanduser(basedir))
+    rdir = os.path.realpath(os.path.expanduser(tdir))
+
+    return rdir != rbase and rdir.startswith(rbase + os.sep)
+
+
+def recheckDir(tdir, root, htype='xx64', filetype="*.fits", debug=False):
+    """Make sure a directory is still exactly what Mandos compared.
+
+    Returns:
+        hashes (:obj:`dict`)
+            The (basenamed) manifest, if everything checks out.
+        reason (:obj:`str`)
+            Why not, if it doesn't; otherwise None.
+    """
+    hfname = os.path.join(tdir, "AListofHashes.%s" % (htype))
+    if os.path.exists(hfname) is False:
+        return None, "no manifest"
+
+    hashes = utils.hashes.readHashFile(hfname, basenamed=True, debug=debug)
+    if root is None or filehashing.manifestRoot(hashes) != root:
+        return None, "manifest root changed"
+
+    fstats = filehashing.getFileStats(tdir, filetype=filetype, debug=debug)
+    ondisk = set([os.path.basename(each) for each in fstats])
+    if ondisk != set(hashes.keys()):
+        return None, "files changed since verification"
+
+    hmtime = os.stat(hfname).st_mtime
+    for each in fstats:
+        if fstats[each][1] > hmtime:
+            return None, "%s modified after it was hashed" % (each)
+
+    return hashes, None
+
+
+def throttledRemove(tdir, removable, filetype="*.fits", rate=500):
+    """Unlink the given files under a directory, then any emptied dirs.
+
+    The manifests (and the directories themselves) only go once every
+    other file is gone; if anything was kept, they stay so that it can
+    still be verified and cleaned up later.
+
+    Args:
+        tdir (:obj:`str`)
+            Directory to clear out.
+        removable (:obj:`set`)
+            Basenames of the files that may be removed. Anything else
+            (or anything not matching filetype) is kept.
+        filetype (:obj:`str`, optional)
+            Wildcard string(s), comma separated, to match data files.
+            Defaults to "*.fits".
+        rate (:obj:`int`, optional)
+            Most files to unlink per second; 0 means no limit.
+
+    Returns:
+        stats (:obj:`dict`)
+            Number of files removed and kept, and bytes freed.
+    """
+    stats = {'nremoved': 0, 'nkept': 0, 'bytesfreed': 0}
+    manifests = []
+    t0 = time.time()
+    for dirpath, dirnames, filenames in os.walk(tdir, topdown=False):
+        dfd = os.open(dirpath, os.O_RDONLY)
+        try:
+            for fname in filenames:
+                if fname.startswith("AListofHashes.") or \
+                   fname.startswith("RemoteListofHashes."):
+                    # Only once we know nothing else is staying
+                    manifests.append(os.path.join(dirpath, fname))
+                    continue
+                if fname not in removable or \
+                   filehashing.matchesMask(fname, filetype) is False:
+                    stats['nkept'] += 1
+                    continue
+
+                st = os.lstat(fname, dir_fd=dfd)
+                os.unlink(fname, dir_fd=dfd)
+                stats['nremoved'] += 1
+                # Blocks actually allocated, which is what we get back
+                stats['bytesfreed'] += getattr(st, 'st_blocks',
+                                               st.st_size//512)*512
+
+                # Keep it to (at most) rate files per second
+                if rate > 0:
+                    ahead = stats['nremoved']/rate - (time.time() - t0)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        finally:
+            os.close(dfd)
+
+    # Anything left behind still needs its manifest to be checked against
+    if stats['nkept'] > 0:
+        return stats
+
+    for each in manifests:
+        st = os.lstat(each)
+        os.unlink(each)
+        stats['bytesfreed'] += getattr(st, 'st_blocks', st.st_size//512)*512
+
+    for dirpath, dirnames, _ in os.walk(tdir, topdown=False):
+        for dname in dirnames:
+            try:
+                os.rmdir(os.path.join(dirpath, dname))
+            except OSError:
+                # Not empty (or a symlink) so it stays
+                pass
+
+    try:
+        os.rmdir(tdir)
+    except OSError:
+        pass
+
+    return stats
+
+
+def cleanBatch(args, debug=False):
+    """Delete a signed batch of directories, after checking each again.
+
+    Args:
+        args (:class:`argparse.Namespace`)
+            Class containing parsed arguments, returned from
+            :func:`dataservants.yvette.parseargs.parseArguments`.
+        debug (:obj:`bool`, optional)
+            Bool to trigger additional debugging outputs. Defaults to False.
+
+    Returns:
+        results (:obj:`dict`)
+            Per directory results and the total bytes freed, or an error.
+    """
+    key = loadKey(args.keyfile)
+    try:
+        payload = unpackBatch(key, args.batch, args.signature)
+    except (ValueError, TypeError, KeyError, AttributeError) as err:
+        return {"Error": "batch refused: %s" % (str(err))}
+
+    basedir = payload['basedir']
+    rbase = os.path.realpath(os.path.expanduser(basedir))
+    if rbase != os.path.realpath(os.path.expanduser(args.dir)):
+        return {"Error": "batch is for %s, not %s" % (basedir, args.dir)}
+
+    results = {}
+    freed = 0
+    for each in payload['dirs']:
+        tdir = each['dir']
+        res = {'deleted': False, 'reason': None, 'nremoved': 0,
+               'nkept': 0, 'bytesfreed': 0}
+        if insideDir(basedir, tdir) is False or \
+           os.path.isdir(tdir) is False:
+            res['reason'] = "not a directory under %s" % (basedir)
+        else:
+            hashes, res['reason'] = recheckDir(tdir, each['root'],
+                                               htype=payload['htype'],
+                                               filetype=payload['filetype'],
+                                               debug=debug)
+            if hashes is not None:
+                stats = throttledRemove(tdir, set(hashes.keys()),
+                                        filetype=payload['filetype'],
+                                        rate=args.cleanRate)
+                res.update(stats)
+                freed += stats['bytesfreed']
+                if stats['nkept'] == 0:
+                    res['deleted'] = True
+                else:
+                    res['reason'] = "%d files kept" % (stats['nkept'])
+
+        results.update({tdir: res})
+
+    return {"Cleaned": results, "BytesFreed": freed}
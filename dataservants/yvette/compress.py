@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Yvette's logic to see how well an instrument's data compresses.
+
+Wadsworth uses this to decide whether compressing transfers is worth it.
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import zlib
+import time
+
+try:
+    # This one might fail
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from ligmos import utils
+
+
+def timedCompress(func, chunks):
+    """
+    Compress each chunk with func, returning the total compressed size and
+    the time it took in seconds.
+    """
+    csize = 0
+    t1 = time.perf_counter()
+    for each in chunks:
+        csize += len(func(each))
+    telapsed = time.perf_counter() - t1
+
+    return csize, telapsed
+
+
+def sampleCompressibility(mdir, filetype="*.fits", nfiles=8, nbytes=2**22,
+                          debug=False):
+    """Compress a sample of files to see how compressible they are.
+
+    Reads up to ``nbytes`` from each of up to ``nfiles`` files, spread
+    evenly through the (sorted) list of files, and compresses them both
+    the way rsync -z does (zlib) and with a fast compressor (zstd level 1
+    if available, otherwise zlib level 1).
+
+    Args:
+        mdir (:obj:`str`)
+            Directory to look for files
+        filetype (:obj:`str`, optional)
+            Wildcard string to match files. Defaults to "*.fits".
+        nfiles (:obj:`int`, optional)
+            Maximum number of files to sample. Defaults to 8.
+        nbytes (:obj:`int`, optional)
+            Maximum number of bytes to read from each file. Defaults to
+            2**22 (4 MiB).
+        debug (:obj:`bool`, optional)
+            Bool to trigger additional debugging outputs. Defaults to False.
+
+    Returns:
+        samp (:obj:`dict`)
+            Compression ratios (compressed/raw) and compressor speeds
+            (MiB/s of raw data) for each method.
+
+            .. code-block:: python
+
+                samp = {'nsampled': 8, 'rawbytes': 33554432,
+                        'zlibRatio': 0.98, 'zlibMBps': 21.3,
+                        'fastRatio': 0.99, 'fastMBps': 410.2,
+                        'fastCodec': 'zstd'}
+    """
+    ff = sorted(utils.files.recursiveSearcher(mdir, fileext=filetype))
+    if ff == []:
+        return {}
+
+    # Spread the sample out so we don't just get the first few calibrations
+    step = max(1, len(ff)//nfiles)
+    chunks = []
+    for each in ff[::step][:nfiles]:
+        try:
+            with open(each, 'rb') as f:
+                chunks.append(f.read(nbytes))
+        except (IOError, OSError) as err:
+            if debug is True:
+                print(str(err))
+
+    rawbytes = sum([len(c) for c in chunks])
+    if rawbytes == 0:
+        return {}
+
+    # rsync -z is zlib at its default level
+    zsize, ztime = timedCompress(zlib.compress, chunks)
+
+    if zstandard is not None:
+        fastCodec = 'zstd'
+        fcomp = zstandard.ZstdCompressor(level=1).compress
+    else:
+        fastCodec = 'zlib1'
+
+        def fcomp(data):
+            return zlib.compress(data, 1)
+    fsize, ftime = timedCompress(fcomp, chunks)
+
+    # Guard against silly fast timings on tiny samples
+    ztime = max(ztime, 1e-6)
+    ftime = max(ftime, 1e-6)
+
+    samp = {'nsampled': len(chunks),
+            'rawbytes': rawbytes,
+            'zlibRatio': zsize/rawbytes,
+            'zlibMBps': rawbytes/ztime/2.**20,
+            'fastRatio': fsize/rawbytes,
+            'fastMBps': rawbytes/ftime/2.**20,
+            'fastCodec': fastCodec}
+
+    if debug is True:
+        print(samp)
+
+    return samp
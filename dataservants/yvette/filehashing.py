@@ -15,10 +15,19 @@ Actual hashing functions can be found in :mod:`dataservants.utils.hashes`.
 
 from __future__ import division, print_function, absolute_import
 
+import os
+import fnmatch
+import hashlib
 import datetime as dt
 from os.path import basename, getsize
 from collections import OrderedDict
 
+try:
+    # This one might fail
+    import xxhash
+except ImportError:
+    xxhash = None
+
 import numpy as np
 
 from ligmos import utils
@@ -95,6 +104,114 @@ def getListFilesSizes(mdir, filetype="*.fits", debug=False):
     return ff, sizes
 
 
+def matchesMask(fname, filemask):
+    """
+    True if the file's name matches any of the (comma separated) wildcards
+    in the instrument's filemask.
+    """
+    bname = os.path.basename(fname)
+    for pat in filemask.split(","):
+        if fnmatch.fnmatch(bname, pat.strip()):
+            return True
+
+    return False
+
+
+def getFileStats(mdir, filetype="*.fits", debug=False):
+    """Get the size and modification time of each file matching filetype.
+
+    This is a cheap, stat-only look at a directory so that the caller can
+    figure out what actually needs to be done before reading any data.
+
+    Args:
+        mdir (:obj:`str`)
+            Directory to look for files
+        filetype (:obj:`str`, optional)
+            Wildcard string to match files. Defaults to "*.fits".
+        debug (:obj:`bool`, optional)
+            Bool to trigger additional debugging outputs. Defaults to False.
+
+    Returns:
+        fstats (:obj:`dict`)
+            Dictionary of [size in bytes, mtime] for each file, keyed to
+            the full path of the file.
+
+            .. code-block:: python
+
+                fstats = {'/mnt/lemi/lois/20140619/lmi.0001.fits':
+                          [16781760, 1403244535.0]}
+    """
+    fstats = {}
+    ff = utils.files.recursiveSearcher(mdir, fileext=filetype)
+    for each in ff:
+        try:
+            st = os.stat(each)
+        except OSError as err:
+            # Files can vanish between the search and the stat
+            if debug is True:
+                print(str(err))
+            continue
+        fstats.update({each: [st.st_size, st.st_mtime]})
+
+    if debug is True:
+        print("Found %d files in %s" % (len(fstats), mdir))
+
+    return fstats
+
+
+def newHasher(htype='xx64'):
+    """Get an empty hash object of the given type to feed data into.
+
+    This is the streaming equivalent of :func:`ligmos.utils.hashes.hashfunc`
+    for when the data isn't sitting in a file yet.
+
+    Args:
+        htype (:obj:`str`, optional)
+            Hashing function type. See the list of allowed values in
+            :func:`dataservants.yvette.parseargs.setup_arguments`
+
+    Returns:
+        hasher (:obj:`object`)
+            Hash object with ``update()`` and ``hexdigest()`` methods.
+    """
+    if htype == 'xx64':
+        if xxhash is None:
+            raise ValueError("XX64 hash unavailable!")
+        hasher = xxhash.xxh64()
+    else:
+        hasher = hashlib.new(htype)
+
+    return hasher
+
+
+def manifestRoot(hashes):
+    """Single digest summarizing an entire manifest.
+
+    Built from the sorted (basename, hash) pairs, so it doesn't care about
+    the order of the manifest or where the directory lives; two copies of
+    the same data (say, on the instrument host and in the archive) have
+    the same root.
+
+    Args:
+        hashes (:obj:`dict`)
+            Dictionary of file hashes, as from
+            :func:`ligmos.utils.hashes.readHashFile` or :func:`makeManifest`.
+
+    Returns:
+        root (:obj:`str`)
+            SHA256 hex digest of the manifest, or None if it was empty.
+    """
+    if hashes is None or hashes == {}:
+        return None
+
+    pairs = sorted([(basename(each), hashes[each]) for each in hashes])
+    root = hashlib.sha256()
+    for fname, fhash in pairs:
+        root.update(("%s,%s\n" % (fname, fhash)).encode("utf-8"))
+
+    return root.hexdigest()
+
+
 def checkMismatches(flist, htype='xx64', bsize=2**25, debug=False):
     """
     """
@@ -226,7 +343,7 @@ def makeManifest(mdir, htype='xx64', bsize=2**25,
 
 
 def verifyFiles(mdir, htype='xx64', bsize=2**25,
-                filetype="*.fits", debug=False):
+                filetype="*.fits", offset=0, nfiles=0, debug=False):
     """Verify file hashes against those in a given list.
 
     Given a directory, recursively look for all files matching filetype
@@ -236,6 +353,10 @@ def verifyFiles(mdir, htype='xx64', bsize=2**25,
     allow for mounting/storage path differences.  A list of files in the given
     directory that fail the check is returned.
 
+    To keep each call bounded in time, only a chunk of the (name sorted)
+    files can be checked at once by giving ``offset`` and ``nfiles``; the
+    caller can then work its way through a big directory over several calls.
+
     .. warning::
         The hash file name is hardcoded to
         ``AListofHashes`` with extension ``htype``. The code won't search
@@ -254,13 +375,27 @@ def verifyFiles(mdir, htype='xx64', bsize=2**25,
             33554432 bits (a.k.a. 4 MiB).
         filetype (:obj:`str`)
             Wildcard string to match files. Defaults to "*.fits".
+        offset (:obj:`int`, optional)
+            Index of the first file (in name order) to check. Defaults to 0.
+        nfiles (:obj:`int`, optional)
+            Number of files to check, starting at ``offset``. 0 means all
+            of the rest of them. Defaults to 0.
         debug (:obj:`bool`)
             Bool to trigger additional debugging outputs. Defaults to False.
 
     Returns:
+        nfound (:obj:`int`)
+            Number of files matching ``filetype`` in the whole directory
+        fpmissing (:obj:`list`)
+            Files that are in the hash file but not the directory; only
+            looked for in the first chunk (``offset`` == 0)
+        nohash (:obj:`list`)
+            Files in the checked chunk that aren't in the hash file
         mismatch (:obj:`list`)
-            List of files in the given directory ``mdir`` that do not match
-            the hashfile found in that same ``mdir``
+            Files in the checked chunk that do not match the hashfile
+            found in that same ``mdir``
+        nchecked (:obj:`int`)
+            Number of files that were actually checked
     """
     # Set up return values
     nfound = 0
@@ -273,10 +408,17 @@ def verifyFiles(mdir, htype='xx64', bsize=2**25,
 
     # Record the number of files found matching given filetype
     if ff is None:
-        return nfound, fpmissing, nohash, mismatch
+        return nfound, fpmissing, nohash, mismatch, 0
     else:
         nfound = len(ff)
 
+    # Just the chunk we were asked to do this time
+    ff = sorted(ff)
+    if nfiles > 0:
+        chunk = ff[offset:offset + nfiles]
+    else:
+        chunk = ff[offset:]
+
     # Read in the existing hash file
     hfname = mdir + "/AListofHashes." + htype
 
@@ -289,20 +431,24 @@ def verifyFiles(mdir, htype='xx64', bsize=2**25,
     if debug is True:
         print("%d files in hashfile %s" % (len(existingFiles), hfname))
 
-    # Calculate the new hashes by just calling the other hash logic.
-    #   Big difference is that the keys are relative to the given dir, not
+    # Calculate the new hashes for the chunk. Big difference from the
+    #   hash file is that the keys are relative to the given dir, not
     #   as a full mounting path. This makes comparisons way easier.
     newKeys = {}
-    newKeys = makeManifest(mdir, htype=htype, bsize=bsize,
-                           filetype=filetype, forcerecheck=True,
-                           fullpath=False, debug=debug)
+    for each in chunk:
+        hs = utils.hashes.hashfunc(each, htype=htype, bsize=bsize,
+                                   debug=debug)
+        newKeys.update({basename(each): hs.hexdigest()})
 
     # Now compare the new against the old file list. Strip out path info again.
     inDR = [basename(each) for each in ff]
 
     # Highlight files that were in the hash file but aren't in the directory
-    #   then get the filename from the hashfile but now is missing
-    missing = list(set(existingFiles) - set(inDR))
+    #   then get the filename from the hashfile but now is missing. It's
+    #   a whole-directory thing, so only bother for the first chunk.
+    missing = []
+    if offset == 0:
+        missing = list(set(existingFiles) - set(inDR))
 
     # TODO: Clean this up with a fancy list comprehension
     for s in missing:
@@ -320,7 +466,7 @@ def verifyFiles(mdir, htype='xx64', bsize=2**25,
     for it in existingHashes.items():
         relExisting.update({basename(it[0]): [it[0], it[1]]})
 
-    for tf in ff:
+    for tf in chunk:
         testfile = basename(tf)
         try:
             if newKeys[testfile] != relExisting[testfile][1]:
@@ -338,5 +484,6 @@ def verifyFiles(mdir, htype='xx64', bsize=2**25,
         print({"MissingButHashed": fpmissing})
         print({"FoundButUnHashed": nohash})
         print({"FailedHashCheck": mismatch})
+        print({"NFilesChecked": len(chunk)})
 
-    return nfound, fpmissing, nohash, mismatch
+    return nfound, fpmissing, nohash, mismatch, len(chunk)
@@ -59,6 +59,34 @@ def setup_arguments(prog=None):
                         help='Type of hash to use for file integrity checks',
                         default="xx64")
 
+    vostr = 'Index of the first file (by name) to verify'
+    parser.add_argument('--offset', type=int,
+                        help=vostr,
+                        default=0, nargs="?")
+
+    vnstr = 'Number of files to verify starting at offset; 0 means all'
+    parser.add_argument('--nfiles', type=int,
+                        help=vnstr,
+                        default=0, nargs="?")
+
+    cbstr = 'Signed batch of directories to clean (from Mandos)'
+    parser.add_argument('--batch', type=str,
+                        help=cbstr,
+                        default=None)
+
+    parser.add_argument('--signature', type=str,
+                        help='HMAC signature of the batch',
+                        default=None)
+
+    kfstr = 'Key shared with Mandos for signing clean batches'
+    parser.add_argument('--keyfile', type=str,
+                        help=kfstr,
+                        default="~/.yvette_clean.key")
+
+    parser.add_argument('--cleanRate', type=int,
+                        help='Most files to delete per second; 0 for no limit',
+                        default=500, nargs="?")
+
     parser.add_argument('--debug', action='store_true',
                         help='Print extra debugging messages while running',
                         default=False)
@@ -80,6 +108,14 @@ def setup_arguments(prog=None):
                         help='Look for data directories older than rangeOld',
                         default=False)
 
+    parser.add_argument('--listing', action='store_true',
+                        help='List size and mtime of files matching filetype',
+                        default=False)
+
+    parser.add_argument('--compressibility', action='store_true',
+                        help='Check how well a sample of the files compress',
+                        default=False)
+
     parser.add_argument('--checkProcess', type=str,
                         help='Return stats for given process name',
                         default=None)
@@ -92,7 +128,7 @@ def setup_arguments(prog=None):
     grp1 = parser.add_mutually_exclusive_group(required=False)
 
     grp1.add_argument('-c', '--clean', action='store_true',
-                      help='Check for directories that can be deleted',
+                      help='Delete a signed batch of archived directories',
                       default=False)
 
     hstr = 'Create data manifests for filetypes with hashtype'
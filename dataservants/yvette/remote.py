@@ -23,8 +23,33 @@ import datetime as dt
 from ligmos import utils
 
 
-def rStringVerify(baseYcmd, ldir, filetype):
+def rStringVerify(baseYcmd, ldir, filetype, offset=0, nfiles=0):
     fcmd = "%s --verify %s --filetype %s" % (baseYcmd, ldir, filetype)
+    if offset > 0 or nfiles > 0:
+        fcmd += " --offset %d --nfiles %d" % (offset, nfiles)
+    return fcmd
+
+
+def rStringListing(baseYcmd, ldir, filetype):
+    fcmd = "%s --listing %s --filetype %s" % (baseYcmd, ldir, filetype)
+    return fcmd
+
+
+def rStringCompress(baseYcmd, ldir, filetype):
+    fcmd = "%s --compressibility %s --filetype %s" % (baseYcmd, ldir,
+                                                      filetype)
+    return fcmd
+
+
+def rStringPack(baseYcmd, ldir, filetype, htype='xx64'):
+    fcmd = "%s -p %s --filetype %s --hashtype %s" % (baseYcmd, ldir,
+                                                     filetype, htype)
+    return fcmd
+
+
+def rStringClean(baseYcmd, bdir, batch, signature, rate=500):
+    fcmd = "%s --clean %s --batch %s --signature %s --cleanRate %d" % \
+        (baseYcmd, bdir, batch, signature, rate)
     return fcmd
 
 
@@ -82,7 +107,23 @@ def commandYvetteSimple(eSSH, baseYcmd, args, iobj, cmd, debug=False):
         fcmd = rStringLookOld(baseYcmd, iobj.srcdir, iobj.dirmask,
                               newage=args.rangeOld, oldage=args.oldest)
     elif cmd == 'verify':
-        fcmd = rStringVerify(baseYcmd, iobj.srcdir, iobj.filemask)
+        # Same sort of quick hack as srcdir, to only verify a chunk
+        fcmd = rStringVerify(baseYcmd, iobj.srcdir, iobj.filemask,
+                             offset=getattr(iobj, 'verifyOffset', 0),
+                             nfiles=getattr(iobj, 'verifyNFiles', 0))
+    elif cmd == 'listing':
+        fcmd = rStringListing(baseYcmd, iobj.srcdir, iobj.filemask)
+    elif cmd == 'compressibility':
+        fcmd = rStringCompress(baseYcmd, iobj.srcdir, iobj.filemask)
+    elif cmd == 'clean':
+        # Same sort of quick hack again, for the signed batch
+        fcmd = rStringClean(baseYcmd, iobj.srcdir,
+                            getattr(iobj, 'cleanBatch', ''),
+                            getattr(iobj, 'cleanSignature', ''),
+                            rate=getattr(args, 'cleanRate', 500))
+    elif cmd == 'pack':
+        fcmd = rStringPack(baseYcmd, iobj.srcdir, iobj.filemask,
+                           htype=args.hashtype)
     else:
         print("Command unknown! Ignoring.")
         return None
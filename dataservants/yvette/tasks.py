@@ -16,13 +16,31 @@ Further description.
 from __future__ import division, print_function, absolute_import
 
 from ligmos import utils
+from . import cleaning
 from . import filehashing
 
 
 def cleanActions(args, hfname, debug=False):
+    """Logic needed to delete a signed batch of archived directories.
+
+    Args:
+        args (:class:`argparse.Namespace`)
+            Class containing parsed arguments, returned from
+            :func:`dataservants.yvette.parseargs.parseArguments`.
+        hfname (:obj:`str`)
+            String containing the (hardcoded) hash filename. Unused, since
+            each directory in the batch has its own.
+        debug (:obj:`bool`, optional)
+            Bool to trigger additional debugging outputs. Defaults to False.
+
+    Returns:
+        cleaned (:obj:`dict`)
+            See :func:`dataservants.yvette.cleaning.cleanBatch`.
     """
-    """
-    pass
+    if args.batch is None or args.signature is None:
+        return {"Error": "nothing to clean; need --batch and --signature"}
+
+    return cleaning.cleanBatch(args, debug=debug)
 
 
 def packActions(args, hfname, debug=False):
@@ -73,7 +91,7 @@ def verificationActions(args, hfname, debug=False):
 
     Returns:
         broken (:obj:`list`)
-            A list of 4 elements:
+            A list of 5 elements:
                 0) Number of files matching args.filetype found in directory
                 1) List of files missing in the directory, but are in the
                    hash file
@@ -81,10 +99,14 @@ def verificationActions(args, hfname, debug=False):
                    has file
                 3) List of files existing in both the directory and the hash
                    file, but with mismatched hashes
+                4) Number of files actually checked (see args.offset and
+                   args.nfiles)
     """
     # Verification step
     broken = filehashing.verifyFiles(args.dir, filetype=args.filetype,
-                                     htype=args.hashtype, debug=debug)
+                                     htype=args.hashtype,
+                                     offset=args.offset, nfiles=args.nfiles,
+                                     debug=debug)
 
     # If norepack is False and there's files to repack...then do it
     if args.norepack is False and broken[2] != []:
@@ -96,7 +118,9 @@ def verificationActions(args, hfname, debug=False):
         if hfcheck is True:
             # Verify one more time to see if we got them all
             broken = filehashing.verifyFiles(args.dir, filetype=args.filetype,
-                                             htype=args.hashtype, debug=debug)
+                                             htype=args.hashtype,
+                                             offset=args.offset,
+                                             nfiles=args.nfiles, debug=debug)
 
     # Return the results, whatever they are. Ideally
     #   unhashed files and missing files are [] but sometimes
@@ -30,6 +30,7 @@ except ImportError:
 from ligmos import utils
 from . import tasks
 from . import parseargs
+from . import compress
 from . import filehashing
 
 
@@ -145,10 +146,22 @@ def beginTidying(noprint=False):
 
                 rjson.update({"DirsOld": (len(odirs), odirs)})
 
+            if args.listing is True:
+                fstats = filehashing.getFileStats(vdir,
+                                                  filetype=args.filetype,
+                                                  debug=args.debug)
+                rjson.update({"FileStats": fstats})
+
+            if args.compressibility is True:
+                samp = compress.sampleCompressibility(vdir,
+                                                      filetype=args.filetype,
+                                                      debug=args.debug)
+                rjson.update({"Compressibility": samp})
+
             # Check for EXCLUSIONARY actions (there can be only one)
             if args.clean is True:
-                # TODO: Write the cleaning logic
-                pass
+                cleaned = tasks.cleanActions(args, hfname, debug=args.debug)
+                rjson.update(cleaned)
 
             if args.pack is True:
                 # Create a manifest dict
@@ -162,7 +175,9 @@ def beginTidying(noprint=False):
                     rjson.update({"HashChecks": {"NFilesFound": broken[0],
                                                  "MissingFiles": broken[1],
                                                  "UnhashedFiles": broken[2],
-                                                 "DifferentFiles": broken[3]}})
+                                                 "DifferentFiles": broken[3],
+                                                 "NFilesChecked": broken[4],
+                                                 "Offset": args.offset}})
                 else:
                     rjson.update({"HashChecks": "PROBLEMS"})
 
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+#  Created on 19 Oct 2026
+#
+#  @author: rhamilton
+
+"""Microbenchmark of the old recursive flatten vs. the cached FlatLayout.
+
+Feed it some captured TCSTcsStatusSV messages (one XML message per file,
+e.g. dumped by a ParrotSubscriber) and it decodes each one with the
+topic's schema from ligmos, then times turning the result into Influx
+fields both ways and checks that they agree::
+
+    python toymodels/flattenBench.py /path/to/captured/TCSTcsStatusSV*.xml
+"""
+
+from __future__ import division, print_function, absolute_import
+
+import sys
+import glob
+import timeit
+
+from dataservants.iago import parser_general as pg
+from dataservants.iago import schemas
+
+
+def oldFlatFields(xmlp):
+    """
+    How parserFlatPacket used to do it.
+    """
+    fields = {}
+    for each in xmlp.keys():
+        val = xmlp[each]
+        if isinstance(val, dict):
+            fields.update(pg.flatten(val, parent_key=each))
+        else:
+            fields.update({each: val})
+
+    return fields
+
+
+def loadPackets(files, topic):
+    """
+    Decode the captured messages with the topic's schema (any version).
+    """
+    schema = schemas.registry.get()[topic]
+    packets = []
+    for each in files:
+        with open(each, 'r') as xmlf:
+            msg = xmlf.read()
+        best, xmlp = pg.decodePacket(topic, schema, msg)
+        if xmlp is None:
+            print("Skipping %s; didn't decode" % (each))
+            continue
+        packets.append((best, xmlp))
+
+    return packets
+
+
+def main():
+    """
+    """
+    topic = 'TCS.TCSSharedVariables.TCSHighLevelStatusSV.TCSTcsStatusSV'
+    files = []
+    for each in sys.argv[1:]:
+        files.extend(sorted(glob.glob(each)))
+    if files == []:
+        print(__doc__)
+        return
+
+    packets = loadPackets(files, topic)
+    if packets == []:
+        return
+    nfields = len(oldFlatFields(packets[0][1]))
+    print("%d packets, %d fields in the first" % (len(packets), nfields))
+
+    for best, xmlp in packets:
+        layout = pg.layoutFor(topic, best)
+        if oldFlatFields(xmlp) != pg.flatFields(xmlp, layout=layout):
+            print("MISMATCH!")
+            return
+
+    def runOld():
+        for _, xmlp in packets:
+            oldFlatFields(xmlp)
+
+    def runNew():
+        for best, xmlp in packets:
+            pg.flatFields(xmlp, layout=pg.layoutFor(topic, best))
+
+    nloops = max(1, 20000//len(packets))
+    told = min(timeit.repeat(runOld, number=nloops, repeat=5))
+    tnew = min(timeit.repeat(runNew, number=nloops, repeat=5))
+    npkts = nloops*len(packets)
+    print("old flatten: %.2f us/packet" % (1e6*told/npkts))
+    print("FlatLayout:  %.2f us/packet" % (1e6*tnew/npkts))
+    print("speedup:     %.2fx" % (told/tnew))
+
+
+if __name__ == "__main__":
+    main()